@@ -1,7 +1,12 @@
+import time
+_importStart = time.perf_counter()
 import bdDetect
+from logHandler import log
 from brailleDisplayDrivers.lib.CadenceDisplayDriverWithImage import CadenceDisplayDriverWithImage, TestCadenceDisplayDriver
 from brailleDisplayDrivers.lib.MainCadenceDisplayDriver import MainCadenceDisplayDriver
 
+log.info(f"Cadence driver imported in {(time.perf_counter() - _importStart) * 1000:.1f}ms")
+
 # is driver enabled?
 def isSupportEnabled() -> bool:
 	return bdDetect.driverIsEnabledForAutoDetection(CadenceDisplayDriverWithImage.name)
@@ -1,16 +1,27 @@
 import ctypes.wintypes
 from logHandler import log
 import api
-from screenBitmap import ScreenBitmap
 import threading
+import time
+import math
 import ctypes
 from enum import Enum
 import queueHandler
-from brailleDisplayDrivers.lib.MainCadenceDisplayDriver import MainCadenceDisplayDriver, MiniKey, imageToCells, DevSide, MiniKeyInputGesture, DOT_KEYS
+import braille
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+from brailleDisplayDrivers.lib.MainCadenceDisplayDriver import MainCadenceDisplayDriver, MiniKey, DevSide, MiniKeyInputGesture, DOT_KEYS
+from brailleDisplayDrivers.lib.DotImage import imageToCells, DOT_ASPECT_RATIO
 from brailleDisplayDrivers.lib.Sliders import Slider, CombinedSlider, PanSlider
 
-user32 = ctypes.windll.user32
-gdi32 = ctypes.windll.gdi32
+# modules only image mode uses are imported when it is first used (see ensureImageState)
+if TYPE_CHECKING:
+	from brailleDisplayDrivers.lib.LatencyProbe import LatencyTrace
+	from brailleDisplayDrivers.lib.Capture import CaptureBackend
+	from brailleDisplayDrivers.lib.FrameHistory import FrameHistory
+	from brailleDisplayDrivers.lib.Stabilizer import DotStabilizer
+	from brailleDisplayDrivers.lib.Raster import DotCanvas
+	from brailleDisplayDrivers.lib.SharedFramebuffer import SharedFramebuffer
 
 # a cardinal direction
 class Direction(Enum):
@@ -26,9 +37,53 @@ defaultZoomRate = 1.25
 zoomRateRate = 1.5
 bwThresholdOutOf = 100
 defaultBwThresholdRate = 7
-DOT_ASPECT_RATIO = 3.3 / 2.6
+# images are written at most this often, so a busy image doesn't flood the devices
+IMAGE_MIN_INTERVAL = 0.05
+# continuous motion while a pan or zoom key is held
+# seconds a key has to be held before motion starts, and the frame clock of the motion
+HOLD_DELAY = 0.3
+MOTION_FRAME_INTERVAL = IMAGE_MIN_INTERVAL
+# slider steps per second when motion starts, the rate is increased (see Slider.increaseRate) every ramp interval while held
+MOTION_STEPS_PER_SECOND = 4
+MOTION_RAMP_INTERVAL = 0.5
+MOTION_MAX_RAMPS = 4
+# captures during motion cover this many view widths and heights, so the following frames can be cut from them
+OVERSCAN = 3
+# the location of the navigator object is reused until NVDA reports a change, but never for longer than this
+NAVIGATOR_CACHE_MAX_AGE = 2
+# number of objects whose nearest located ancestor is remembered
+MAX_LOCATED_OBJECTS = 32
+# number of objects whose last image and view are kept, to be shown at once when they are revisited
+IMAGE_CACHE_SIZE = 16
+# temporal hysteresis of image dots (see Stabilizer): values within this distance of the threshold (out of bwThresholdOutOf) keep their dot,
+# and a dot only changes after this many consecutive frames agree (1 changes at once)
+# off unless turned on with setImageStabilization, so images look the same as without it
+IMAGE_DEAD_BAND = 0
+IMAGE_STABLE_FRAMES = 1
+# auto-crop: objects are captured at most this many pixels wide or high to find their content,
+# pixels within the tolerance (out of 255 per channel) of the background don't count as content,
+# and the margin (in capture pixels) is kept around the content
+AUTO_CROP_SIZE = 256
+AUTO_CROP_TOLERANCE = 24
+AUTO_CROP_MARGIN = 2
+# bookmarks are captured again in the background, taking at most this share of the time, and waiting at least the pause between captures
+BOOKMARK_CPU_BUDGET = 0.05
+BOOKMARK_MIN_PAUSE = 0.5
+THREAD_PRIORITY_LOWEST = -2
+# seconds the framebuffer thread waits for a frame before checking whether it should stop
+FRAMEBUFFER_WAIT = 0.5
+
+# the rectangle of the screen a view shows (the rectangle actuallyDisplayImage captures)
+def viewRect(centerX: float, centerY: float, zoomX: float, zoomY: float) -> tuple[float, float, float, float]:
+	return (centerX - 1 / zoomX, -centerY - 1 / zoomY, 2 / zoomX, 2 / zoomY)
+
+# the inner pan key of a unit (pan right on a left unit, pan left on a right unit) is ctrl in image mode
+def isCtrlKey(key: tuple[MiniKey, tuple[int, DevSide]]) -> bool:
+	return (key[0] == MiniKey.PanRight and key[1][1] == DevSide.Left) or (key[0] == MiniKey.PanLeft and key[1][1] == DevSide.Right)
 
 def getScreenResolution():
+	user32 = ctypes.windll.user32
+	gdi32 = ctypes.windll.gdi32
 	screen = user32.GetDC(0)
 	width = gdi32.GetDeviceCaps(screen, 8)  # HORZRES
 	height = gdi32.GetDeviceCaps(screen, 10)  # VERTRES
@@ -36,33 +91,6 @@ def getScreenResolution():
 	user32.ReleaseDC(0, screen)
 	return (width, height)
 
-# winGDI bitmap to boolean 2d array
-def bitmapToImage(bitmap, width: int, height: int, bwThreshold: float, bwReversed: bool, colorMode: int) -> list[list[bool]]:
-	imageOut: list[list[bool]] = []
-	for y in range(height):
-		row: list[bool] = []
-		for x in range(width):
-			rgb = bitmap[y][x]
-			r = rgb.rgbRed
-			g = rgb.rgbBlue
-			b = rgb.rgbGreen
-			if colorMode == 0:
-				val = 0.299*r + 0.587*g + 0.114*b
-			elif colorMode == 1:
-				val = r
-			elif colorMode == 2:
-				val = g
-			elif colorMode == 3:
-				val = b
-			threshold = bwThreshold / bwThresholdOutOf * 255
-			if bwReversed:
-				valBool = val < threshold
-			else:
-				valBool = val > threshold
-			row.append(valBool)
-		imageOut.append(row)
-	return imageOut
-
 # a timer that repeatedly runs a function every n seconds
 # https://stackoverflow.com/questions/12435211/threading-timer-repeat-function-every-n-seconds
 class RunInterval(threading.Thread):
@@ -84,30 +112,146 @@ class RunInterval(threading.Thread):
 				log.error(f"{e}")
 				pass
 
+# a pan or zoom key being held
+class Motion():
+	def __init__(self, key: MiniKey, slider: Slider | CombinedSlider, increase: bool):
+		self.key = key
+		self.slider = slider
+		self.increase = increase
+		self.startTime = time.perf_counter()
+		self.lastTime = self.startTime
+		# number of times the slider rate was increased (undone when the key is released)
+		self.ramps = 0
+		self.moved = False
+		self.timer: RunInterval | None = None
+
+# an over-scanned capture, in screen pixels
+class OverscanCache():
+	def __init__(self, left: float, top: float, pixelWidth: float, pixelHeight: float, image: list[list[bool]]):
+		self.left = left
+		self.top = top
+		# screen pixels covered by a single dot
+		self.pixelWidth = pixelWidth
+		self.pixelHeight = pixelHeight
+		self.image = image
+
+# a named region of the screen with the view it is shown with
+# its image is captured again in the background (see runBookmarkWarmer), so jumping to it shows a recent image at once
+class Bookmark():
+	def __init__(self, name: str, rect: tuple, centerX: float, centerY: float, zoomX: float, zoomY: float, bwThreshold: float, bwReversed: bool, colorMode: int):
+		self.name = name
+		# the rectangle image mode was fitted to
+		self.rect = rect
+		self.centerX = centerX
+		self.centerY = centerY
+		self.zoomX = zoomX
+		self.zoomY = zoomY
+		self.bwThreshold = bwThreshold
+		self.bwReversed = bwReversed
+		self.colorMode = colorMode
+		# (size of the image region in dots, cells) of the latest capture, replaced as a whole so readers never see a mismatch
+		self.warm: tuple[tuple[int, int], bytes] | None = None
+		self.warmTime = 0.0
+
+# the object shown in image mode and its location, found from the navigator (or focus) object
+class NavigatorCache():
+	def __init__(self, source, obj, location, time: float):
+		self.source = source
+		self.obj = obj
+		self.location = location
+		self.time = time
+		self.windowHandle = getattr(obj, "windowHandle", None)
+
+# last image shown for an object and the view it was shown with
+class ImageCacheEntry():
+	def __init__(self, cells: list[int], size: tuple[int, int], centerX: float, centerY: float, zoomX: float, zoomY: float, bwThreshold: float):
+		self.cells = cells
+		# size of the image region in dots (the cells can only be shown on the same size)
+		self.size = size
+		self.centerX = centerX
+		self.centerY = centerY
+		self.zoomX = zoomX
+		self.zoomY = zoomY
+		self.bwThreshold = bwThreshold
+
 # Extends the driver to support image mode
 class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 	displayingImage: bool
 	lastDisplayedNonImage: list[int] | None
 	imageTimer: RunInterval | None
+	# set up with the rest of the image state (see ensureImageState)
+	frameHistory: "FrameHistory"
+	stabilizer: "DotStabilizer"
 
 	lastLeft: int
 	lastTop: int
 	lastFitWidth: int
 	lastFitHeight: int
 
+	regionMinIntervals = {"image": IMAGE_MIN_INTERVAL}
+
 	def __init__(self, port):
 		# initialize properties
 		self.displayingImage = False
 		self.lastDisplayedNonImage = None
 		self.imageTimer = None
+		self.motion: Motion | None = None
+		self.motionLock = threading.RLock()
+		self.overscanCache: OverscanCache | None = None
+		self.overscanPending = False
+		self.navigatorCache: NavigatorCache | None = None
+		# nearest ancestor with a location of recently shown objects, by id (the object is kept so the id stays valid)
+		self.locatedObjects: dict[int, tuple] = {}
+		# where image mode captures the screen from (see Capture), GDI unless set with setCaptureBackend
+		self.captureBackend: "CaptureBackend | None" = None
+		# last captured rectangle and settings with the resulting image, reused while the backend reports no changes
+		self.lastCapture: tuple | None = None
+		# images of recently shown objects by (window, location), least recently shown first
+		self.imageCache: OrderedDict[tuple, ImageCacheEntry] = OrderedDict()
+		# image of the history being shown while stepping through it (None while showing the live image)
+		self.historySeq: int | None = None
+		# shared memory an external program draws the image from instead of the screen (see SharedFramebuffer)
+		self.framebuffer: "SharedFramebuffer | None" = None
+		self.framebufferThread: threading.Thread | None = None
+		# dots drawn over every image (such as a focus rectangle), ignored if it isn't the size of the image region
+		self.imageOverlay: "DotCanvas | None" = None
+		# named regions to jump to, and the one jumped to last
+		self.bookmarks: dict[str, Bookmark] = {}
+		self.currentBookmark: str | None = None
+		self.bookmarkWarmer: threading.Thread | None = None
+		self.bookmarkStop = threading.Event()
 		self.lastLeft = -1
 		self.lastTop = -1
 		self.lastFitWidth = -1
 		self.lastFitHeight = -1
+		self.imageStateInitialized = False
+		self.bwReversed = True
+		self.colorMode = 0
+		self.correctAspectRatio = True
+		self.followFocus = True
+		# fit the view to the content of objects rather than their whole location
+		self.autoCrop = False
+		# content rectangles found by auto-crop by object rectangle, least recently used first
+		self.contentRects: OrderedDict[tuple, tuple] = OrderedDict()
+		# show the image on the top half of the layout and text on the bottom half
+		self.splitView = False
+
+		super().__init__(port)
+
+	# set up image view state (deferred until image mode is first used, to keep startup fast)
+	def ensureImageState(self):
+		if self.imageStateInitialized:
+			return
+
+		from brailleDisplayDrivers.lib.FrameHistory import FrameHistory
+		from brailleDisplayDrivers.lib.Stabilizer import DotStabilizer
+		# recently shown images
+		self.frameHistory = FrameHistory()
+		# keeps dots near the threshold from flickering between refreshes of the same view
+		self.stabilizer = DotStabilizer(IMAGE_DEAD_BAND / bwThresholdOutOf * 255, IMAGE_STABLE_FRAMES)
 
 		screenWidth, screenHeight = getScreenResolution()
 
-		# initialize more properties
 		self.zoomX = Slider(-1,
 			defaultZoomRate,
 			zoomRateRate,
@@ -152,28 +296,79 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 			0,
 			bwThresholdOutOf,
 			True)
-		self.bwReversed = True
-		self.colorMode = 0
-		self.correctAspectRatio = True
-		self.followFocus = True
-		
-		super().__init__(port)
+		self.imageStateInitialized = True
 
-	def display(self, cells: list[int], isImage = False):
+	# images are built by the driver, which notes the layout version before building them (see Regions.Frame)
+	# trace is the latency trace of the key report that caused the image (see LatencyProbe)
+	def display(self, cells: list[int], isImage = False, layoutVersion: int | None = None, trace: "LatencyTrace | None" = None):
+		if layoutVersion is None:
+			layoutVersion = self.layoutVersion
 		if not isImage:
 			self.lastDisplayedNonImage = cells
-		if isImage == self.displayingImage:
-			super().display(cells)
+		else:
+			# built for an older layout, the next refresh builds it for the current one
+			if layoutVersion != self.layoutVersion:
+				return
+			overlay = self.imageOverlay
+			if overlay is not None and (overlay.width, overlay.height) == (self.getDisplayWidth(), self.getDisplayHeight()):
+				cells = overlay.overlayCells(cells)
+			self.frameHistory.record(bytes(cells), self.getDisplayWidth() // 2, self.getDisplayHeight() // 4, (self.centerX.get(), self.centerY.get(), self.zoomX.get(), self.zoomY.get()))
+			# live images keep being captured and recorded while an older one is shown
+			if self.historySeq is not None:
+				return
+		self.updateRegion("image" if isImage else "text", cells, layoutVersion, trace)
+
+	# show an older (back) or newer image from the history, without capturing
+	# stepping forward past the newest image returns to the live image
+	def stepHistory(self, back: bool):
+		layoutVersion = self.layoutVersion
+		latest = self.frameHistory.latest()
+		if latest is None:
+			return
+		seq = self.historySeq if self.historySeq is not None else latest.seq
+		numCols = self.getDisplayWidth() // 2
+		numRows = self.getDisplayHeight() // 4
+		frame = self.frameHistory.before(seq, numCols, numRows) if back else self.frameHistory.after(seq, numCols, numRows)
+		if frame is None or frame.seq == latest.seq:
+			if not back:
+				self.leaveHistory()
+			return
+		self.historySeq = frame.seq
+		log.info(f"history image {frame.seq} from {time.time() - frame.time:.1f}s ago")
+		self.updateRegion("image", frame.cells, layoutVersion)
+
+	# show the live image again (the refresh timer kept running, so the newest image is current)
+	def leaveHistory(self):
+		if self.historySeq is None:
+			return
+		self.historySeq = None
+		layoutVersion = self.layoutVersion
+		latest = self.frameHistory.latest()
+		if latest is not None:
+			self.updateRegion("image", latest.cells, layoutVersion)
+
+	def getRegionSources(self) -> list[str]:
+		if not self.displayingImage:
+			return ["text"]
+		if self.splitView:
+			return ["image", "text"]
+		return ["image"]
 
 	# toggle between text and image mode
 	def doToggleImage(self):
+		self.ensureImageState()
 		self.displayingImage = not self.displayingImage
+		self.historySeq = None
+		self.updateRegions()
 		if self.displayingImage:
+			if self.splitView:
+				self.restoreNonImage()
 			self.displayImage()
 			if self.imageTimer is None:
 				self.imageTimer = RunInterval(self.displayImage, 0.5)
 				self.imageTimer.start()
 		else:
+			self.stopMotion()
 			self.restoreNonImage()
 			if self.imageTimer is not None:
 				self.imageTimer.cancel()
@@ -181,38 +376,48 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 
 	# draw image mode (screencapture of current navigator object)
 	def displayImage(self, resetView = False):
+		# carry the latency trace of the key report that caused this (if any) over to the main thread
+		trace = self.latencyTracker.take() if self.latencyTracker is not None else None
+		if trace is not None:
+			trace.mark("displayImage")
 		queueHandler.queueFunction(
 			queueHandler.eventQueue,
-			lambda : self.actuallyDisplayImage(resetView),
+			lambda : self.actuallyDisplayImage(resetView, trace),
 			_immediate=True,
 		)
-	def actuallyDisplayImage(self, resetView = False):
+	def actuallyDisplayImage(self, resetView = False, trace: "LatencyTrace | None" = None):
+		if trace is not None:
+			trace.mark("queueHandler")
+		if self.framebuffer is not None:
+			self.showFramebuffer()
+			return
+		layoutVersion = self.layoutVersion
+		imageKey = None
 		if not self.followFocus and self.lastLeft != -1 and self.lastTop != -1 and self.lastFitWidth != -1 and self.lastFitHeight != -1:
 			(left, top, width, height) = (self.lastLeft, self.lastTop, self.lastFitWidth, self.lastFitHeight)
 		else:
-			obj = api.getNavigatorObject()
-			if obj is None:
-				log.info("no navigator object, switching to focus object")
-				obj = api.getFocusObject()
-				if obj is None:
-					log.error("no focus object")
-					self.doToggleImage()
-					return
-			while obj is not None and obj.location is None:
-				log.warn("object has no location, trying parent")
-				obj = obj.parent
-			if obj is None:
-				log.error("no location for object when displaying image")
+			location = self.getNavigatorLocation()
+			if location is None:
 				self.doToggleImage()
 				return
-			location = obj.location
 			(left, top, width, height) = location
+			imageKey = (self.navigatorCache.windowHandle, left, top, width, height)
 		log.info(f"######## screenshot {left} {top} {width} {height}")
 		if width <= 0 or height <= 0:
 			log.error("invalid object location")
 			self.doToggleImage()
 			return
 		if resetView or left != self.lastLeft or top != self.lastTop or self.lastFitWidth != width or self.lastFitHeight != height:
+			cached = self.imageCache.get(imageKey) if imageKey is not None and not resetView else None
+			if cached is not None and cached.size == (self.getDisplayWidth(), self.getDisplayHeight()):
+				# show the object as it was last seen right away, and capture it again once queued events are handled
+				self.imageCache.move_to_end(imageKey)
+				self.restoreImageView(cached, left, top, width, height)
+				if trace is not None:
+					trace.mark("capture")
+				self.display(cached.cells, True, layoutVersion, trace)
+				self.displayImage()
+				return
 			self.reset(left, top, width, height)
 		screenWidth = self.getDisplayWidth()
 		screenHeight = self.getDisplayHeight()
@@ -222,21 +427,299 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 		bottomRightX = self.screenXToVirtual(self.getDisplayWidth(), self.getDisplayWidth())
 		bottomRightY = -self.screenYToVirtual(self.getDisplayHeight(), self.getDisplayHeight())
 
-		bitmapHolder = ScreenBitmap(screenWidth, screenHeight)
-		# TODO don't round here
-		bitmapBuffer = bitmapHolder.captureImage(round(topLeftX), round(topLeftY), round(bottomRightX - topLeftX), round(bottomRightY - topLeftY))
-		boolImage = bitmapToImage(bitmapBuffer, screenWidth, screenHeight, self.bwThreshold.get(), self.bwReversed, self.colorMode)
+		if self.motion is not None:
+			# capture around the view, so frames while the key is held can be cut from this capture
+			viewWidth = bottomRightX - topLeftX
+			viewHeight = bottomRightY - topLeftY
+			captureLeft = topLeftX - viewWidth * (OVERSCAN - 1) / 2
+			captureTop = topLeftY - viewHeight * (OVERSCAN - 1) / 2
+			overscanImage = self.captureImage(captureLeft, captureTop, viewWidth * OVERSCAN, viewHeight * OVERSCAN, screenWidth * OVERSCAN, screenHeight * OVERSCAN)
+			self.overscanCache = OverscanCache(round(captureLeft), round(captureTop), round(viewWidth * OVERSCAN) / (screenWidth * OVERSCAN), round(viewHeight * OVERSCAN) / (screenHeight * OVERSCAN), overscanImage)
+			boolImage = self.cutOverscan(self.overscanCache)
+		else:
+			self.overscanCache = None
+			boolImage = None
+		# capture just the view without motion, or if rounding the capture to pixels left the view outside of it (at the edges of the screen)
+		if boolImage is None:
+			boolImage = self.captureImage(topLeftX, topLeftY, bottomRightX - topLeftX, bottomRightY - topLeftY, screenWidth, screenHeight)
+		self.overscanPending = False
 		cells = imageToCells(boolImage)
-		self.display(cells, True)
+		if trace is not None:
+			trace.mark("capture")
+		self.display(cells, True, layoutVersion, trace)
+		if imageKey is not None:
+			self.storeImageView(imageKey, cells)
+
+	# remember the image and view of an object
+	def storeImageView(self, imageKey: tuple, cells: list[int]):
+		self.imageCache[imageKey] = ImageCacheEntry(
+			cells,
+			(self.getDisplayWidth(), self.getDisplayHeight()),
+			self.centerX.get(),
+			self.centerY.get(),
+			self.zoomX.get(),
+			self.zoomY.get(),
+			self.bwThreshold.get(),
+		)
+		self.imageCache.move_to_end(imageKey)
+		while len(self.imageCache) > IMAGE_CACHE_SIZE:
+			self.imageCache.popitem(last=False)
+
+	# go back to the view an object was last shown with
+	def restoreImageView(self, cached: ImageCacheEntry, left, top, width, height):
+		self.centerX.set(cached.centerX)
+		self.centerY.set(cached.centerY)
+		self.zoomX.set(cached.zoomX)
+		self.zoomY.set(cached.zoomY)
+		self.bwThreshold.set(cached.bwThreshold)
+		self.lastLeft = left
+		self.lastTop = top
+		self.lastFitWidth = width
+		self.lastFitHeight = height
+
+	# toggle showing image and text at the same time (turns image mode on if needed)
+	# layouts with a single row of tablets only show the image
+	def toggleSplitView(self):
+		if not self.displayingImage:
+			self.splitView = True
+			self.doToggleImage()
+			return
+		self.splitView = not self.splitView
+		self.updateRegions()
+		self.repaintRegions(True)
+
+	def updateRegions(self):
+		super().updateRegions()
+		# tell the producer drawing through the framebuffer about the new size
+		if self.framebuffer is not None:
+			self.framebuffer.setSize(self.getDisplayWidth(), self.getDisplayHeight())
+
+	# draw every region again after they changed
+	def repaintRegions(self, resetView = False):
+		if self.getRegion("image") is not None:
+			self.displayImage(resetView)
+		if self.getRegion("text") is not None:
+			self.restoreNonImage()
+
+	# location of the navigator object (or its nearest ancestor with a location)
+	# locations are cross-process calls, so they are reused until invalidateNavigatorCache is called
+	def getNavigatorLocation(self):
+		source = api.getNavigatorObject()
+		if source is None:
+			log.info("no navigator object, switching to focus object")
+			source = api.getFocusObject()
+			if source is None:
+				log.error("no focus object")
+				return None
+		now = time.perf_counter()
+		cache = self.navigatorCache
+		if cache is not None and cache.source is source and now - cache.time < NAVIGATOR_CACHE_MAX_AGE:
+			return cache.location
+		obj, location = self.findLocatedObject(source)
+		if obj is None:
+			log.error("no location for object when displaying image")
+			return None
+		self.navigatorCache = NavigatorCache(source, obj, location, now)
+		return location
+
+	# nearest object with a location, starting at obj and walking up its parents
+	# returns (object, location), the walk is remembered per object
+	def findLocatedObject(self, obj):
+		located = self.locatedObjects.get(id(obj))
+		if located is not None and located[0] is obj:
+			location = located[1].location
+			if location is not None:
+				return (located[1], location)
+		source = obj
+		location = obj.location
+		while obj is not None and location is None:
+			log.warn("object has no location, trying parent")
+			obj = obj.parent
+			location = obj.location if obj is not None else None
+		if obj is not None:
+			if len(self.locatedObjects) >= MAX_LOCATED_OBJECTS:
+				self.locatedObjects.clear()
+			self.locatedObjects[id(source)] = (source, obj)
+		return (obj, location)
+
+	# forget the cached navigator location (called by CadencePlugin on focus, navigator and location changes)
+	# if obj is given, the cache is only dropped if it is about that object
+	def invalidateNavigatorCache(self, obj = None):
+		cache = self.navigatorCache
+		if cache is None:
+			return
+		if obj is None or obj is cache.source or obj is cache.obj:
+			self.navigatorCache = None
+
+	# use another capture backend (such as Capture.SyntheticCaptureBackend for testing)
+	def setCaptureBackend(self, backend: "CaptureBackend | None"):
+		previous = self.captureBackend
+		self.captureBackend = backend
+		self.lastCapture = None
+		if previous is not None and previous is not backend:
+			previous.close()
+
+	# tune the temporal hysteresis of image dots, a dead band of 0 and 1 frame turn it off
+	# deadBand is out of bwThresholdOutOf like the threshold
+	def setImageStabilization(self, deadBand: float, minFrames: int):
+		self.ensureImageState()
+		from brailleDisplayDrivers.lib.Stabilizer import DotStabilizer
+		self.stabilizer = DotStabilizer(deadBand / bwThresholdOutOf * 255, max(1, minFrames))
+		self.lastCapture = None
+
+	# let an external program draw the image through shared memory (turns image mode on if needed)
+	# the name defaults to SharedFramebuffer.DEFAULT_FRAMEBUFFER_NAME
+	def startFramebuffer(self, name: str | None = None):
+		self.stopFramebuffer()
+		self.ensureImageState()
+		from brailleDisplayDrivers.lib.SharedFramebuffer import SharedFramebuffer, DEFAULT_FRAMEBUFFER_NAME
+		if name is None:
+			name = DEFAULT_FRAMEBUFFER_NAME
+		framebuffer = SharedFramebuffer(name)
+		framebuffer.setSize(self.getDisplayWidth(), self.getDisplayHeight())
+		self.framebuffer = framebuffer
+		self.framebufferThread = threading.Thread(target=self.runFramebuffer, args=(framebuffer,), daemon=True)
+		self.framebufferThread.start()
+		log.info(f"framebuffer {name} started")
+		if not self.displayingImage:
+			self.doToggleImage()
+
+	# go back to capturing the screen
+	def stopFramebuffer(self, repaint = True):
+		framebuffer = self.framebuffer
+		if framebuffer is None:
+			return
+		self.framebuffer = None
+		if self.framebufferThread is not None:
+			self.framebufferThread.join(FRAMEBUFFER_WAIT * 2)
+			self.framebufferThread = None
+		framebuffer.close()
+		log.info(f"framebuffer {framebuffer.name} stopped")
+		if repaint and self.displayingImage:
+			self.displayImage(True)
+
+	# show frames as the producer publishes them, straight from this thread (updateRegion takes the devices lock)
+	def runFramebuffer(self, framebuffer: "SharedFramebuffer"):
+		while self.framebuffer is framebuffer:
+			if framebuffer.waitForFrame(FRAMEBUFFER_WAIT) and self.framebuffer is framebuffer:
+				self.showFramebuffer()
+
+	# show the newest frame of the framebuffer, force shows it again even if it was already shown
+	def showFramebuffer(self, force = False):
+		framebuffer = self.framebuffer
+		if framebuffer is None or not self.displayingImage:
+			return
+		layoutVersion = self.layoutVersion
+		region = self.getRegion("image")
+		cells = framebuffer.readCells(force or (region is not None and region.cells is None))
+		if cells is not None:
+			self.display(cells, True, layoutVersion)
+
+	# capture part of the screen, scaled to a number of dots
+	def captureImage(self, left: float, top: float, width: float, height: float, dotsWidth: int, dotsHeight: int) -> list[list[bool]]:
+		from brailleDisplayDrivers.lib.Capture import GdiCaptureBackend, frameToImage
+		if self.captureBackend is None:
+			self.captureBackend = GdiCaptureBackend()
+		# TODO don't round here
+		rect = (round(left), round(top), round(width), round(height), dotsWidth, dotsHeight)
+		frame = self.captureBackend.capture(*rect)
+		key = (rect, self.bwThreshold.get(), self.bwReversed, self.colorMode)
+		# nothing changed since the last capture of the same rectangle
+		if frame.changedRegions is not None and len(frame.changedRegions) == 0 and self.lastCapture is not None and self.lastCapture[0] == key:
+			return self.lastCapture[1]
+		image = frameToImage(frame, self.bwThreshold.get() / bwThresholdOutOf * 255, self.bwReversed, self.colorMode, self.stabilizer, key)
+		self.lastCapture = (key, image)
+		return image
+
+	# the current view cut from an over-scanned capture (None if the view isn't inside the capture)
+	def cutOverscan(self, cache: OverscanCache) -> list[list[bool]] | None:
+		width = self.getDisplayWidth()
+		height = self.getDisplayHeight()
+		left = self.screenXToVirtual(0, width)
+		top = -self.screenYToVirtual(0, height)
+		dotWidth = (self.screenXToVirtual(width, width) - left) / width
+		dotHeight = (-self.screenYToVirtual(height, height) - top) / height
+		xs = [math.floor((left + (x + 0.5) * dotWidth - cache.left) / cache.pixelWidth) for x in range(width)]
+		ys = [math.floor((top + (y + 0.5) * dotHeight - cache.top) / cache.pixelHeight) for y in range(height)]
+		if xs[0] < 0 or ys[0] < 0 or xs[-1] >= len(cache.image[0]) or ys[-1] >= len(cache.image):
+			return None
+		return [[cache.image[y][x] for x in xs] for y in ys]
+
+	# start continuous motion of a slider, if the key is still held after HOLD_DELAY
+	def startMotion(self, key: MiniKey, slider: Slider | CombinedSlider, increase: bool):
+		with self.motionLock:
+			if self.motion is not None and self.motion.key == key:
+				return
+			self.stopMotion()
+			self.motion = Motion(key, slider, increase)
+			self.motion.timer = RunInterval(self.motionTick, MOTION_FRAME_INTERVAL)
+			self.motion.timer.start()
+
+	# stop continuous motion, returns whether anything moved
+	def stopMotion(self) -> bool:
+		with self.motionLock:
+			motion = self.motion
+			if motion is None:
+				return False
+			self.motion = None
+			motion.timer.cancel()
+			for i in range(motion.ramps):
+				motion.slider.decreaseRate()
+			self.overscanCache = None
+		# draw the final view from a fresh capture
+		if motion.moved:
+			self.displayImage()
+		return motion.moved
+
+	# a frame of continuous motion (called by the motion timer)
+	def motionTick(self):
+		with self.motionLock:
+			motion = self.motion
+			if motion is None:
+				return
+			now = time.perf_counter()
+			elapsed = now - motion.lastTime
+			motion.lastTime = now
+			held = now - motion.startTime - HOLD_DELAY
+			if held < 0:
+				return
+			while motion.ramps < min(MOTION_MAX_RAMPS, int(held / MOTION_RAMP_INTERVAL)):
+				motion.slider.increaseRate()
+				motion.ramps += 1
+			motion.slider.step(min(elapsed, held) * MOTION_STEPS_PER_SECOND * (1 if motion.increase else -1))
+			motion.moved = True
+			layoutVersion = self.layoutVersion
+			cache = self.overscanCache
+			image = self.cutOverscan(cache) if cache is not None else None
+		if image is not None:
+			self.display(imageToCells(image), True, layoutVersion)
+		elif not self.overscanPending:
+			# the view left the capture, capture again around it
+			self.overscanPending = True
+			self.displayImage()
 
 	# restore text mode by drawing text
+	# text NVDA wrote for another size is dropped, NVDA is asked to write it again for the current size
 	def restoreNonImage(self):
-		if self.lastDisplayedNonImage is not None:
-			self.display(self.lastDisplayedNonImage)
+		cells = self.lastDisplayedNonImage
+		if cells is None:
+			return
+		region = self.getRegion("text")
+		if region is None or len(cells) == region.numCells:
+			self.display(cells)
+		else:
+			queueHandler.queueFunction(queueHandler.eventQueue, braille.handler.update)
 
 	# cleanup on exit (called by NVDA)
 	def terminate(self):
 		try:
+			self.stopMotion()
+			self.bookmarkStop.set()
+			if self.bookmarkWarmer is not None:
+				self.bookmarkWarmer.join(1)
+				self.bookmarkWarmer = None
+			self.stopFramebuffer(False)
+			self.setCaptureBackend(None)
 			super().terminate()
 		finally:
 			if self.imageTimer is not None:
@@ -246,13 +729,24 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 			for device in self.devices:
 				device.terminate()
 
-	# helper functions for screen size
+	# helper functions for screen size (of the image region)
 	def getDisplayWidth(self):
-		return self.numCols * 2
+		return self.layout.numCols * 2
 	def getDisplayHeight(self):
-		return self.numRows * 4
-	# reset image view
+		region = self.getRegion("image")
+		return (region.numRows if region is not None else self.layout.numRows) * 4
+	# reset image view to a rectangle of the screen (or the content inside it, with auto-crop)
 	def reset(self, left, top, toDrawWidth, toDrawHeight):
+		if self.autoCrop:
+			self.fitView(*self.findContentRect(left, top, toDrawWidth, toDrawHeight))
+		else:
+			self.fitView(left, top, toDrawWidth, toDrawHeight)
+		self.lastLeft = left
+		self.lastTop = top
+		self.lastFitWidth = toDrawWidth
+		self.lastFitHeight = toDrawHeight
+	# center and zoom the view on a rectangle of the screen
+	def fitView(self, left, top, toDrawWidth, toDrawHeight):
 		self.centerX.set(left + toDrawWidth / 2)
 		self.centerY.set(-(top + toDrawHeight / 2))
 		fullZoom = min(2 / toDrawWidth, 2 / toDrawHeight / self.getTargetAspectRatio(self.correctAspectRatio))
@@ -260,10 +754,34 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 		zoom = max(halfZoom, fullZoom)
 		self.zoomX.set(zoom)
 		self.zoomY.set(zoom * self.getTargetAspectRatio(self.correctAspectRatio))
-		self.lastLeft = left
-		self.lastTop = top
-		self.lastFitWidth = toDrawWidth
-		self.lastFitHeight = toDrawHeight
+	# the part of a rectangle of the screen that isn't background, found once per rectangle from a small capture
+	def findContentRect(self, left, top, width, height) -> tuple:
+		rect = (left, top, width, height)
+		contentRect = self.contentRects.get(rect)
+		if contentRect is None:
+			contentRect = rect
+			scale = min(1, AUTO_CROP_SIZE / max(width, height))
+			captureWidth = max(1, round(width * scale))
+			captureHeight = max(1, round(height * scale))
+			from brailleDisplayDrivers.lib.Capture import GdiCaptureBackend, findContentBox
+			if self.captureBackend is None:
+				self.captureBackend = GdiCaptureBackend()
+			frame = self.captureBackend.capture(round(left), round(top), round(width), round(height), captureWidth, captureHeight)
+			box = findContentBox(frame, AUTO_CROP_TOLERANCE)
+			if box is not None:
+				boxLeft = max(0, box[0] - AUTO_CROP_MARGIN)
+				boxTop = max(0, box[1] - AUTO_CROP_MARGIN)
+				boxRight = min(captureWidth, box[0] + box[2] + AUTO_CROP_MARGIN)
+				boxBottom = min(captureHeight, box[1] + box[3] + AUTO_CROP_MARGIN)
+				pixelWidth = width / captureWidth
+				pixelHeight = height / captureHeight
+				contentRect = (left + boxLeft * pixelWidth, top + boxTop * pixelHeight, (boxRight - boxLeft) * pixelWidth, (boxBottom - boxTop) * pixelHeight)
+			log.info(f"auto-crop {rect} to {contentRect}")
+		self.contentRects[rect] = contentRect
+		self.contentRects.move_to_end(rect)
+		while len(self.contentRects) > IMAGE_CACHE_SIZE:
+			self.contentRects.popitem(last=False)
+		return contentRect
 	# helper functions for image mode - see NavigatibleCanvas in CadenceOS
 	def virtualXToScreen(self, actualX, graphWidth):
 		return (actualX - self.centerX.get()) * self.zoomX.get() * ((graphWidth) / 2) + (graphWidth) / 2
@@ -280,6 +798,7 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 	# pan image
 	def pan(self, direction: Direction):
 		log.info("pan")
+		self.markLatency("pan")
 		if direction == Direction.Up:
 			self.centerY.increase()
 		elif direction == Direction.Down:
@@ -292,6 +811,7 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 	# zoom image
 	def zoom(self, zoomIn: bool):
 		log.info("zoom")
+		self.markLatency("zoom")
 		if zoomIn:
 			self.combinedZoom.increase()
 		else:
@@ -368,17 +888,135 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 		zoomX = zoomY / self.getTargetAspectRatio(self.correctAspectRatio)
 		self.zoomX.set(zoomX)
 		self.displayImage()
+	def toggleAutoCrop(self):
+		self.autoCrop = not self.autoCrop
+		log.info(f"AUTO CROP {self.autoCrop}")
+		if self.displayingImage:
+			self.displayImage(True)
 	def toggleFollowFocus(self):
 		self.followFocus = not self.followFocus
 		log.info(f"FOLLOW FOCUS {self.followFocus}")
 
+	# remember the current view under a name
+	def setBookmark(self, name: str):
+		if not self.displayingImage:
+			log.info("bookmarks can only be set in image mode")
+			return
+		bookmark = Bookmark(
+			name,
+			(self.lastLeft, self.lastTop, self.lastFitWidth, self.lastFitHeight),
+			self.centerX.get(),
+			self.centerY.get(),
+			self.zoomX.get(),
+			self.zoomY.get(),
+			self.bwThreshold.get(),
+			self.bwReversed,
+			self.colorMode,
+		)
+		region = self.getRegion("image")
+		if region is not None and region.cells is not None:
+			bookmark.warm = ((self.getDisplayWidth(), self.getDisplayHeight()), region.cells)
+			bookmark.warmTime = time.perf_counter()
+		self.bookmarks[name] = bookmark
+		self.currentBookmark = name
+		log.info(f"bookmark {name} set to {bookmark.rect}")
+		if self.bookmarkWarmer is None:
+			self.bookmarkStop.clear()
+			self.bookmarkWarmer = threading.Thread(target=self.runBookmarkWarmer, name="CadenceBookmarks", daemon=True)
+			self.bookmarkWarmer.start()
+
+	def removeBookmark(self, name: str):
+		self.bookmarks.pop(name, None)
+		if self.currentBookmark == name:
+			self.currentBookmark = None
+
+	# show a bookmarked view (turns image mode on if needed and stops following the focus)
+	# the image captured in the background is shown at once and replaced by a new capture as soon as it is taken
+	def gotoBookmark(self, name: str):
+		bookmark = self.bookmarks.get(name)
+		if bookmark is None:
+			log.info(f"no bookmark {name}")
+			return
+		self.ensureImageState()
+		self.stopMotion()
+		self.currentBookmark = name
+		self.followFocus = False
+		self.centerX.set(bookmark.centerX)
+		self.centerY.set(bookmark.centerY)
+		self.zoomX.set(bookmark.zoomX)
+		self.zoomY.set(bookmark.zoomY)
+		self.bwThreshold.set(bookmark.bwThreshold)
+		self.bwReversed = bookmark.bwReversed
+		self.colorMode = bookmark.colorMode
+		(self.lastLeft, self.lastTop, self.lastFitWidth, self.lastFitHeight) = bookmark.rect
+		if not self.displayingImage:
+			self.doToggleImage()
+		self.historySeq = None
+		layoutVersion = self.layoutVersion
+		warm = bookmark.warm
+		if warm is not None and warm[0] == (self.getDisplayWidth(), self.getDisplayHeight()):
+			log.info(f"bookmark {name} from {time.perf_counter() - bookmark.warmTime:.1f}s ago")
+			self.display(warm[1], True, layoutVersion)
+		self.displayImage()
+
+	# jump to the bookmark after the current one
+	def nextBookmark(self):
+		names = list(self.bookmarks)
+		if len(names) == 0:
+			log.info("no bookmarks")
+			return
+		index = names.index(self.currentBookmark) + 1 if self.currentBookmark in names else 0
+		self.gotoBookmark(names[index % len(names)])
+
+	# capture a bookmarked view at the size of the image region
+	def warmBookmark(self, bookmark: Bookmark):
+		from brailleDisplayDrivers.lib.Capture import GdiCaptureBackend, frameToImage
+		backend = self.captureBackend.copy() if self.captureBackend is not None else GdiCaptureBackend()
+		size = (self.getDisplayWidth(), self.getDisplayHeight())
+		left, top, width, height = viewRect(bookmark.centerX, bookmark.centerY, bookmark.zoomX, bookmark.zoomY)
+		frame = backend.capture(round(left), round(top), round(width), round(height), *size)
+		image = frameToImage(frame, bookmark.bwThreshold / bwThresholdOutOf * 255, bookmark.bwReversed, bookmark.colorMode)
+		bookmark.warm = (size, bytes(imageToCells(image)))
+		bookmark.warmTime = time.perf_counter()
+
+	# keep bookmarks warm at low priority, pausing after every capture so capturing stays within BOOKMARK_CPU_BUDGET
+	def runBookmarkWarmer(self):
+		kernel32 = ctypes.windll.kernel32
+		kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_LOWEST)
+		while not self.bookmarkStop.is_set():
+			if len(self.bookmarks) == 0:
+				self.bookmarkStop.wait(BOOKMARK_MIN_PAUSE)
+			for bookmark in list(self.bookmarks.values()):
+				if self.bookmarkStop.is_set():
+					return
+				start = time.perf_counter()
+				try:
+					self.warmBookmark(bookmark)
+				except Exception as e:
+					log.error(f"capturing bookmark {bookmark.name} failed: {e}")
+				spent = time.perf_counter() - start
+				self.bookmarkStop.wait(max(spent / BOOKMARK_CPU_BUDGET - spent, BOOKMARK_MIN_PAUSE))
+
+	# measure key-to-pin latency in image mode by injecting D-pad presses into the first device
+	# runs in the background and logs the latency report when done
+	def measureKeyLatency(self, iterations: int = 50):
+		if not self.displayingImage:
+			self.doToggleImage()
+		from brailleDisplayDrivers.lib.LatencyProbe import runLatencyHarness
+		def run():
+			tracker = runLatencyHarness(self, [[MiniKey.DPadUp], [MiniKey.DPadDown]], iterations=iterations)
+			log.info(tracker.report())
+		threading.Thread(target=run, daemon=True).start()
+
 	# run after changing device positions to update screens
 	def afterDevicePositionsChanged(self):
 		super().afterDevicePositionsChanged()
-		if self.displayingImage:
-			self.displayImage(True)
-		else:
-			self.restoreNonImage()
+		self.repaintRegions(True)
+
+	# run after devices were added or removed, keeping the image view
+	def afterDevicesChanged(self):
+		super().afterDevicesChanged()
+		self.repaintRegions()
 
 	# handle keys
 	def handleKeys(self, liveKeysWithPosition: list[tuple[MiniKey, tuple[int, DevSide]]], composedKeysWithPosition: list[tuple[MiniKey, tuple[int, DevSide]]], gesture: MiniKeyInputGesture | None):
@@ -393,16 +1031,31 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 			super().handleKeys(liveKeysWithPosition, composedKeysWithPosition, gesture)
 
 		if self.displayingImage:
+			# continuous motion lasts as long as its key is the only one held
+			motionMoved = False
+			if self.motion is not None and liveKeys != [self.motion.key]:
+				motionMoved = self.stopMotion()
+			# any other key returns from the history to the live image
+			if self.historySeq is not None and len(liveKeys) > 0 and liveKeys != [MiniKey.Row1] and liveKeys != [MiniKey.Row2]:
+				self.leaveHistory()
 			if len(liveKeys) == 1 and len(composedKeys) == 0:
-				# pan - arrow keys
+				# pan - arrow keys (keep panning while held)
 				if MiniKey.DPadUp in liveKeys:
 					self.pan(Direction.Up)
+					self.startMotion(MiniKey.DPadUp, self.centerY, True)
 				elif MiniKey.DPadDown in liveKeys:
 					self.pan(Direction.Down)
+					self.startMotion(MiniKey.DPadDown, self.centerY, False)
 				elif MiniKey.DPadLeft in liveKeys:
 					self.pan(Direction.Left)
+					self.startMotion(MiniKey.DPadLeft, self.centerX, False)
 				elif MiniKey.DPadRight in liveKeys:
 					self.pan(Direction.Right)
+					self.startMotion(MiniKey.DPadRight, self.centerX, True)
+				# keep zooming while pan right / left is held (not while it is held as ctrl, waiting for an arrow)
+				elif MiniKey.PanRight in liveKeys or MiniKey.PanLeft in liveKeys:
+					if not isCtrlKey(liveKeysWithPosition[0]):
+						self.startMotion(liveKeys[0], self.combinedZoom, MiniKey.PanRight in liveKeys)
 				# toggle follow focus
 				elif MiniKey.DPadCenter in liveKeys:
 					self.toggleFollowFocus()
@@ -429,7 +1082,7 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 					elif MiniKey.DPadRight in liveKeys:
 						self.panEdgeRight()
 				# increase threshold - ctrl + up, decrease threshold - ctrl + down
-				if any([(key[0] == MiniKey.PanRight and key[1][1] == DevSide.Left) or (key[0] == MiniKey.PanLeft and key[1][1] == DevSide.Right) for key in liveKeysWithPosition]):
+				if any([isCtrlKey(key) for key in liveKeysWithPosition]):
 					if MiniKey.DPadUp in liveKeys:
 						self.changeThreshold(True)
 					elif MiniKey.DPadDown in liveKeys:
@@ -441,17 +1094,24 @@ class CadenceDisplayDriverWithImage(MainCadenceDisplayDriver):
 				if MiniKey.Space in liveKeys and MiniKey.DPadCenter in liveKeys:
 					self.toggleAspectRatio()
 			elif len(liveKeys) == 0 and len(composedKeys) == 1:
-				# zoom in - pan right, zoom out - pan left
+				# zoom in - pan right, zoom out - pan left (unless the key was held to zoom continuously)
 				if MiniKey.PanRight in composedKeys:
-					self.zoom(True)
+					if not motionMoved:
+						self.zoom(True)
 				elif MiniKey.PanLeft in composedKeys:
-					self.zoom(False)
+					if not motionMoved:
+						self.zoom(False)
 				# reverse threshold - row3
 				elif MiniKey.Row3 in composedKeys:
 					self.reverseThreshold()
 				# cycle color mode - row4
 				elif MiniKey.Row4 in composedKeys:
 					self.cycleColorMode()
+				# older image - row1, newer image - row2
+				elif MiniKey.Row1 in composedKeys:
+					self.stepHistory(True)
+				elif MiniKey.Row2 in composedKeys:
+					self.stepHistory(False)
 
 
 class TestCadenceDisplayDriver(MainCadenceDisplayDriver):
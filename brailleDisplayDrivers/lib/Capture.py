@@ -0,0 +1,293 @@
+import abc
+import argparse
+import math
+import struct
+import time
+from brailleDisplayDrivers.lib.Stabilizer import DotStabilizer
+
+# screen capture backends for image mode
+# a backend captures a rectangle of the screen scaled to a number of dots and returns BGRA pixels
+# GdiCaptureBackend reads the real screen, SyntheticCaptureBackend serves a fixed image or generated pattern,
+# so the image pipeline can be benchmarked and checked without a screen (see __main__)
+
+# a captured frame, BGRA pixels row by row
+class CapturedFrame():
+	def __init__(self, width: int, height: int, pixels: bytes, changedRegions: list[tuple[int, int, int, int]] | None = None):
+		self.width = width
+		self.height = height
+		self.pixels = pixels
+		# (left, top, width, height) of the parts that changed since the previous capture of the same rectangle
+		# None if unknown, empty if nothing changed
+		self.changedRegions = changedRegions
+
+# a backend missing capture or copy can't be created
+class CaptureBackend(abc.ABC):
+	name = ""
+
+	# capture a rectangle of the screen (in screen pixels), scaled to width x height
+	@abc.abstractmethod
+	def capture(self, left: int, top: int, width: int, height: int, outWidth: int, outHeight: int) -> CapturedFrame:
+		pass
+
+	# a backend capturing the same screen with its own state, for capturing from another thread
+	@abc.abstractmethod
+	def copy(self) -> "CaptureBackend":
+		pass
+
+	def close(self):
+		pass
+
+# remembers the previous capture, to report whether anything changed
+class ChangeTracker():
+	def __init__(self):
+		self.lastKey: tuple | None = None
+		self.lastPixels: bytes | None = None
+
+	def changedRegions(self, key: tuple, pixels: bytes, width: int, height: int) -> list[tuple[int, int, int, int]] | None:
+		if key != self.lastKey:
+			regions = None
+		elif pixels == self.lastPixels:
+			regions = []
+		else:
+			regions = [(0, 0, width, height)]
+		self.lastKey = key
+		self.lastPixels = pixels
+		return regions
+
+# the screen through GDI (NVDA's ScreenBitmap)
+class GdiCaptureBackend(CaptureBackend):
+	name = "gdi"
+
+	def __init__(self):
+		self.changes = ChangeTracker()
+
+	def copy(self) -> "GdiCaptureBackend":
+		return GdiCaptureBackend()
+
+	def capture(self, left: int, top: int, width: int, height: int, outWidth: int, outHeight: int) -> CapturedFrame:
+		from screenBitmap import ScreenBitmap
+		bitmapHolder = ScreenBitmap(outWidth, outHeight)
+		pixels = bytes(bitmapHolder.captureImage(left, top, width, height))
+		return CapturedFrame(outWidth, outHeight, pixels, self.changes.changedRegions((left, top, width, height, outWidth, outHeight), pixels, outWidth, outHeight))
+
+# a virtual screen held in memory
+class SyntheticCaptureBackend(CaptureBackend):
+	name = "synthetic"
+
+	def __init__(self, screenWidth: int, screenHeight: int, pixels: bytes):
+		self.changes = ChangeTracker()
+		self.setScreen(screenWidth, screenHeight, pixels)
+
+	# replace the content of the virtual screen
+	def setScreen(self, screenWidth: int, screenHeight: int, pixels: bytes):
+		if len(pixels) != screenWidth * screenHeight * 4:
+			raise ValueError(f"expected {screenWidth * screenHeight * 4} bytes of pixels, got {len(pixels)}")
+		self.screenWidth = screenWidth
+		self.screenHeight = screenHeight
+		self.pixels = pixels
+
+	# shares the screen pixels, which are never changed in place
+	def copy(self) -> "SyntheticCaptureBackend":
+		return SyntheticCaptureBackend(self.screenWidth, self.screenHeight, self.pixels)
+
+	@classmethod
+	def fromPattern(cls, pattern: str, screenWidth: int, screenHeight: int) -> "SyntheticCaptureBackend":
+		return cls(screenWidth, screenHeight, generatePattern(pattern, screenWidth, screenHeight))
+
+	@classmethod
+	def fromFile(cls, path: str) -> "SyntheticCaptureBackend":
+		return cls(*readImageFile(path))
+
+	# nearest neighbour scaling like StretchBlt, pixels outside the screen are black
+	def capture(self, left: int, top: int, width: int, height: int, outWidth: int, outHeight: int) -> CapturedFrame:
+		blackRow = bytes(outWidth * 4)
+		xs = [math.floor(left + (x + 0.5) * width / outWidth) for x in range(outWidth)]
+		out = bytearray()
+		for y in range(outHeight):
+			sourceY = math.floor(top + (y + 0.5) * height / outHeight)
+			if sourceY < 0 or sourceY >= self.screenHeight:
+				out += blackRow
+				continue
+			rowStart = sourceY * self.screenWidth * 4
+			for sourceX in xs:
+				if 0 <= sourceX < self.screenWidth:
+					out += self.pixels[rowStart + sourceX * 4:rowStart + sourceX * 4 + 4]
+				else:
+					out += b"\0\0\0\0"
+		pixels = bytes(out)
+		return CapturedFrame(outWidth, outHeight, pixels, self.changes.changedRegions((left, top, width, height, outWidth, outHeight), pixels, outWidth, outHeight))
+
+PATTERNS = ["checkerboard", "gradient", "circles"]
+
+# a test pattern as BGRA pixels
+def generatePattern(pattern: str, width: int, height: int) -> bytes:
+	out = bytearray(width * height * 4)
+	for y in range(height):
+		for x in range(width):
+			if pattern == "checkerboard":
+				value = 255 if (x // 16 + y // 16) % 2 == 0 else 0
+			elif pattern == "gradient":
+				value = x * 255 // max(1, width - 1)
+			elif pattern == "circles":
+				distance = math.hypot(x - width / 2, y - height / 2)
+				value = 255 if int(distance) // 24 % 2 == 0 else 0
+			else:
+				raise ValueError(f"unknown pattern {pattern}, expected one of {PATTERNS}")
+			i = (y * width + x) * 4
+			out[i:i + 4] = bytes([value, value, value, 255])
+	return bytes(out)
+
+# read a binary PPM (P6) or an uncompressed 24/32-bit BMP as (width, height, BGRA pixels)
+def readImageFile(path: str) -> tuple[int, int, bytes]:
+	with open(path, "rb") as f:
+		data = f.read()
+	if data[:2] == b"P6":
+		fields: list[bytes] = []
+		offset = 2
+		while len(fields) < 3:
+			while data[offset:offset + 1].isspace():
+				offset += 1
+			if data[offset:offset + 1] == b"#":
+				offset = data.index(b"\n", offset)
+				continue
+			end = offset
+			while not data[end:end + 1].isspace():
+				end += 1
+			fields.append(data[offset:end])
+			offset = end
+		width, height, maxValue = (int(field) for field in fields)
+		if maxValue != 255:
+			raise ValueError("only 8-bit PPM files are supported")
+		rgb = data[offset + 1:offset + 1 + width * height * 3]
+		out = bytearray(width * height * 4)
+		out[0::4] = rgb[2::3]
+		out[1::4] = rgb[1::3]
+		out[2::4] = rgb[0::3]
+		out[3::4] = b"\xff" * (width * height)
+		return (width, height, bytes(out))
+	if data[:2] == b"BM":
+		pixelOffset = struct.unpack_from("<I", data, 10)[0]
+		width, height, planes, bitCount, compression = struct.unpack_from("<iiHHI", data, 18)
+		if bitCount not in (24, 32) or compression not in (0, 3):
+			raise ValueError("only uncompressed 24/32-bit BMP files are supported")
+		bytesPerPixel = bitCount // 8
+		rowSize = (width * bytesPerPixel + 3) // 4 * 4
+		# rows are stored bottom-up unless the height is negative
+		bottomUp = height > 0
+		height = abs(height)
+		out = bytearray(width * height * 4)
+		for y in range(height):
+			rowStart = pixelOffset + (height - 1 - y if bottomUp else y) * rowSize
+			row = data[rowStart:rowStart + width * bytesPerPixel]
+			outStart = y * width * 4
+			for channel in range(3):
+				out[outStart + channel:outStart + width * 4:4] = row[channel::bytesPerPixel]
+			out[outStart + 3:outStart + width * 4:4] = b"\xff" * width
+		return (width, height, bytes(out))
+	raise ValueError(f"{path} is not a PPM or BMP file")
+
+# table turning channel values into 1 where they differ from the background value by more than the tolerance, 0 elsewhere
+def buildDifferenceTable(background: int, tolerance: int) -> bytes:
+	return bytes(1 if abs(value - background) > tolerance else 0 for value in range(256))
+
+# bounding box (left, top, width, height in frame pixels) of everything that differs from the background, None if nothing does
+# the background is the most common color of the four corners
+# works on whole rows and columns at once: channels are compared with bytes.translate, combined by or-ing them as big integers,
+# rows are tested with a single comparison and columns by or-ing all rows together
+def findContentBox(frame: CapturedFrame, tolerance: int = 24) -> tuple[int, int, int, int] | None:
+	width = frame.width
+	height = frame.height
+	pixels = frame.pixels
+	if width == 0 or height == 0:
+		return None
+	corners = [pixels[i:i + 3] for i in (0, (width - 1) * 4, (height - 1) * width * 4, (height * width - 1) * 4)]
+	background = max(corners, key=corners.count)
+	mask = 0
+	for channel in range(3):
+		mask |= int.from_bytes(pixels[channel::4].translate(buildDifferenceTable(background[channel], tolerance)), "little")
+	if mask == 0:
+		return None
+	mask = mask.to_bytes(width * height, "little")
+	emptyRow = bytes(width)
+	rows = [y for y in range(height) if mask[y * width:(y + 1) * width] != emptyRow]
+	columns = 0
+	for y in rows:
+		columns |= int.from_bytes(mask[y * width:(y + 1) * width], "little")
+	columns = columns.to_bytes(width, "little")
+	left = width - len(columns.lstrip(b"\0"))
+	right = len(columns.rstrip(b"\0"))
+	return (left, rows[0], right - left, rows[-1] + 1 - rows[0])
+
+# pixels to a boolean 2d array (one entry per dot)
+# threshold is out of 255, colorMode: 0 grayscale, 1 red, 2 green, 3 blue
+# an active stabilizer smooths dots over consecutive frames of the same view (identified by stabilizerKey)
+def frameToImage(frame: CapturedFrame, threshold: float, reversed: bool, colorMode: int, stabilizer: DotStabilizer | None = None, stabilizerKey: tuple = ()) -> list[list[bool]]:
+	pixels = frame.pixels
+	if stabilizer is not None and stabilizer.isActive():
+		stabilizer.begin(stabilizerKey, frame.width * frame.height)
+	else:
+		stabilizer = None
+	imageOut: list[list[bool]] = []
+	for y in range(frame.height):
+		row: list[bool] = []
+		for x in range(frame.width):
+			i = (y * frame.width + x) * 4
+			r = pixels[i + 2]
+			# green and blue are read from each other's bytes, as image mode always has
+			g = pixels[i]
+			b = pixels[i + 1]
+			if colorMode == 0:
+				val = 0.299*r + 0.587*g + 0.114*b
+			elif colorMode == 1:
+				val = r
+			elif colorMode == 2:
+				val = g
+			elif colorMode == 3:
+				val = b
+			if reversed:
+				valBool = val < threshold
+			else:
+				valBool = val > threshold
+			if stabilizer is not None:
+				valBool = stabilizer.decide(i // 4, val, threshold, valBool)
+			row.append(valBool)
+		imageOut.append(row)
+	return imageOut
+
+if __name__ == "__main__":
+	from brailleDisplayDrivers.lib.DotImage import imageToCells
+	from brailleDisplayDrivers.lib.FrameRecorder import cellsToText
+	parser = argparse.ArgumentParser(description="run the image mode pipeline on a synthetic screen (run from the add-on root with python -m)")
+	source = parser.add_mutually_exclusive_group()
+	source.add_argument("--pattern", default="checkerboard", choices=PATTERNS)
+	source.add_argument("--file", help="PPM or BMP image used as the screen")
+	parser.add_argument("--screen", default="1920x1080", help="size of generated patterns")
+	parser.add_argument("--cols", type=int, default=24, help="cells per row of the braille screen")
+	parser.add_argument("--rows", type=int, default=8, help="rows of the braille screen")
+	parser.add_argument("--threshold", type=float, default=50, help="black and white threshold out of 100")
+	parser.add_argument("--iterations", type=int, default=20)
+	parser.add_argument("--print", action="store_true", help="print the resulting cells")
+	args = parser.parse_args()
+	if args.file is not None:
+		backend = SyntheticCaptureBackend.fromFile(args.file)
+	else:
+		screenWidth, screenHeight = (int(n) for n in args.screen.split("x"))
+		backend = SyntheticCaptureBackend.fromPattern(args.pattern, screenWidth, screenHeight)
+	dotsWidth = args.cols * 2
+	dotsHeight = args.rows * 4
+	stageTimes = {"capture": 0.0, "threshold": 0.0, "cells": 0.0}
+	for i in range(args.iterations):
+		start = time.perf_counter()
+		frame = backend.capture(0, 0, backend.screenWidth, backend.screenHeight, dotsWidth, dotsHeight)
+		captured = time.perf_counter()
+		image = frameToImage(frame, args.threshold / 100 * 255, True, 0)
+		thresholded = time.perf_counter()
+		cells = imageToCells(image)
+		done = time.perf_counter()
+		stageTimes["capture"] += captured - start
+		stageTimes["threshold"] += thresholded - captured
+		stageTimes["cells"] += done - thresholded
+	for stage, total in stageTimes.items():
+		print(f"{stage}: {total / args.iterations * 1000:.3f}ms")
+	if args.print:
+		print(cellsToText(bytes(cells), args.cols))
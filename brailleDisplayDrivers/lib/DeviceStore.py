@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+
+# persistent per-device information, stored as json in the NVDA configuration directory
+# NVDA's modules are imported where they are needed, so the store itself can be used (and tested) without NVDA
+STORE_VERSION = 1
+STORE_FILE_NAME = "cadendum.json"
+# maximum number of entries kept per section (oldest are dropped first)
+MAX_SECTION_ENTRIES = 64
+
+class DeviceStore():
+	def __init__(self, path: str):
+		self.path = path
+		self.lock = threading.Lock()
+		self.sections: dict[str, dict] = {}
+		self.load()
+
+	def load(self):
+		try:
+			with open(self.path, "r", encoding="utf-8") as f:
+				data = json.load(f)
+		except FileNotFoundError:
+			return
+		except Exception as e:
+			from logHandler import log
+			log.error(f"unable to read device store {self.path}: {e}")
+			return
+		if not isinstance(data, dict) or data.get("version") != STORE_VERSION or not isinstance(data.get("sections"), dict):
+			from logHandler import log
+			log.info(f"ignoring device store {self.path} with unknown version")
+			return
+		self.sections = {name: section for name, section in data["sections"].items() if isinstance(section, dict)}
+
+	def save(self):
+		with self.lock:
+			data = json.dumps({"version": STORE_VERSION, "sections": self.sections}, indent="\t")
+		try:
+			tempPath = self.path + ".tmp"
+			with open(tempPath, "w", encoding="utf-8") as f:
+				f.write(data)
+			os.replace(tempPath, self.path)
+		except Exception as e:
+			from logHandler import log
+			log.error(f"unable to write device store {self.path}: {e}")
+
+	def get(self, section: str, key: str):
+		with self.lock:
+			return self.sections.get(section, {}).get(key)
+
+	# set an entry, returns whether anything changed (the store isn't saved automatically)
+	def set(self, section: str, key: str, value) -> bool:
+		with self.lock:
+			entries = self.sections.setdefault(section, {})
+			if entries.get(key) == value:
+				return False
+			entries.pop(key, None)
+			entries[key] = value
+			while len(entries) > MAX_SECTION_ENTRIES:
+				del entries[next(iter(entries))]
+			return True
+
+	def remove(self, section: str, key: str) -> bool:
+		with self.lock:
+			return self.sections.get(section, {}).pop(key, None) is not None
+
+_deviceStore: DeviceStore | None = None
+_deviceStoreLock = threading.Lock()
+
+# the shared store (loaded on first use)
+def getDeviceStore() -> DeviceStore:
+	global _deviceStore
+	with _deviceStoreLock:
+		if _deviceStore is None:
+			import globalVars
+			_deviceStore = DeviceStore(os.path.join(globalVars.appArgs.configPath, STORE_FILE_NAME))
+		return _deviceStore
@@ -0,0 +1,94 @@
+import math
+
+# conversions between boolean 2d arrays (one entry per dot) and braille cells
+
+# physical horizontal dot spacing divided by the vertical spacing of the tablets
+DOT_ASPECT_RATIO = 3.3 / 2.6
+
+# braille dot order
+brailleOffsets = [[0,0], [0,1], [0,2], [1,0], [1,1], [1,2], [0,3], [1,3]]
+
+# for debugging purposes
+def debugImage(image: list[list[bool]]) -> str:
+	return "\n".join(["".join(["#" if pix else " " for pix in row]) for row in image])
+
+# boolean 2d array to list of braille codes
+def imageToCells(image: list[list[bool]]) -> list[int]:
+	height = len(image)
+	width = len(image[0])
+	numCols = int(width / 2)
+	numRows = int(height / 4)
+	out: list[int] = []
+	for cellY in range(numRows):
+		for cellX in range(numCols):
+			cellOut = 0
+			for (pixI, offset) in enumerate(brailleOffsets):
+				sourceX = cellX * 2 + offset[0]
+				sourceY = cellY * 4 + offset[1]
+				valBool = image[sourceY][sourceX]
+				if valBool:
+					cellOut += 2**pixI
+			out.append(cellOut)
+	return out
+
+# for every dot of a cell, a table turning nonzero bytes into the bit of that dot
+DOT_BIT_TABLES = [bytes([0] + [1 << pixI] * 255) for pixI in range(len(brailleOffsets))]
+
+# dots as bytes (one per dot, row by row from offset, nonzero is raised) to braille cells
+# dots can be anything sliceable to bytes, like an mmap
+# every dot position is gathered for all cells at once with strided slices, so this stays fast for large screens
+def dotsToCells(dots, width: int, height: int, offset: int = 0) -> bytes:
+	numCols = width // 2
+	numRows = height // 4
+	out = 0
+	for pixI, (x, y) in enumerate(brailleOffsets):
+		plane = bytearray()
+		for cellY in range(numRows):
+			rowStart = offset + (cellY * 4 + y) * width + x
+			plane += dots[rowStart:rowStart + numCols * 2:2]
+		# each plane only sets its own bit, so or-ing them as big integers combines them
+		out |= int.from_bytes(plane.translate(DOT_BIT_TABLES[pixI]), "little")
+	return out.to_bytes(numCols * numRows, "little")
+
+# list of braille codes to boolean 2d array
+def cellsToImage(cells: list[int], numRows: int) -> list[list[bool]]:
+	numCols = int(len(cells) / numRows)
+	height = numRows * 4
+	width = numCols * 2
+	image: list[list[bool]] = [[False for x in range(width)] for y in range(height)]
+	for cellI, cell in enumerate(cells):
+		cellX = cellI % numCols
+		cellY = math.floor(cellI / numCols)
+		for (pixI, offset) in enumerate(brailleOffsets):
+			x = cellX * 2 + offset[0]
+			y = cellY * 4 + offset[1]
+			val = ((cell >> pixI) & 1) == 1
+			image[y][x] = val
+	return image
+
+# join two boolean 2d arrays horizontally
+def joinImagesHorizontally(imageLeft: list[list[bool]], imageRight: list[list[bool]]):
+	return [rowLeft + rowRight for (rowLeft, rowRight) in zip(imageLeft, imageRight)]
+
+# flip boolean 2d array 180 degrees
+def flipImage(image: list[list[bool]]) -> list[list[bool]]:
+	height = len(image)
+	width = len(image[0])
+	return [[image[height - y - 1][width - x - 1] for x in range(width)] for y in range(height)]
+
+# cell with its dots rotated 180 degrees, for every cell value
+def buildRotatedCells() -> bytes:
+	table = bytearray(256)
+	for cell in range(256):
+		rotated = 0
+		for pixI, (x, y) in enumerate(brailleOffsets):
+			if cell & (1 << pixI):
+				rotated |= 1 << brailleOffsets.index([1 - x, 3 - y])
+		table[cell] = rotated
+	return bytes(table)
+
+ROTATED_CELLS = buildRotatedCells()
+
+# number of dots (pins) that differ between two sets of cells of the same length
+def countChangedDots(a: bytes, b: bytes) -> int:
+	return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).bit_count()
@@ -0,0 +1,71 @@
+import struct
+import threading
+import time
+from collections import deque
+
+# the last images shown in image mode, so transient content (toasts, tooltips, progress) can be explored after it is gone
+# every frame is stored as a single bytes object: packed view metadata followed by the cells
+# the oldest frames are dropped once the total size is over the memory cap
+DEFAULT_HISTORY_BYTES = 256 * 1024
+
+# time, centerX, centerY, zoomX, zoomY, numCols, numRows
+frameHeaderStruct = struct.Struct("<dddddHH")
+
+# a decoded frame
+class HistoryFrame():
+	def __init__(self, seq: int, data: bytes):
+		self.seq = seq
+		self.time, self.centerX, self.centerY, self.zoomX, self.zoomY, self.numCols, self.numRows = frameHeaderStruct.unpack_from(data, 0)
+		self.cells = data[frameHeaderStruct.size:]
+
+class FrameHistory():
+	def __init__(self, maxBytes: int = DEFAULT_HISTORY_BYTES):
+		self.maxBytes = maxBytes
+		self.lock = threading.Lock()
+		# (seq, packed frame), oldest first
+		self.frames: deque[tuple[int, bytes]] = deque()
+		self.numBytes = 0
+		self.nextSeq = 0
+
+	def __len__(self):
+		return len(self.frames)
+
+	# add a frame, unless it has the same cells as the newest one
+	def record(self, cells: bytes, numCols: int, numRows: int, view: tuple[float, float, float, float]) -> bool:
+		with self.lock:
+			if len(self.frames) > 0 and self.frames[-1][1][frameHeaderStruct.size:] == cells:
+				return False
+			data = frameHeaderStruct.pack(time.time(), *view, numCols, numRows) + cells
+			self.frames.append((self.nextSeq, data))
+			self.nextSeq += 1
+			self.numBytes += len(data)
+			while self.numBytes > self.maxBytes and len(self.frames) > 1:
+				self.numBytes -= len(self.frames.popleft()[1])
+			return True
+
+	def latest(self) -> HistoryFrame | None:
+		with self.lock:
+			if len(self.frames) == 0:
+				return None
+			return HistoryFrame(*self.frames[-1])
+
+	# newest frame older than seq with the given size (None if there is none)
+	def before(self, seq: int, numCols: int, numRows: int) -> HistoryFrame | None:
+		with self.lock:
+			for frameSeq, data in reversed(self.frames):
+				if frameSeq < seq and frameHeaderStruct.unpack_from(data, 0)[5:] == (numCols, numRows):
+					return HistoryFrame(frameSeq, data)
+		return None
+
+	# oldest frame newer than seq with the given size (None if there is none)
+	def after(self, seq: int, numCols: int, numRows: int) -> HistoryFrame | None:
+		with self.lock:
+			for frameSeq, data in self.frames:
+				if frameSeq > seq and frameHeaderStruct.unpack_from(data, 0)[5:] == (numCols, numRows):
+					return HistoryFrame(frameSeq, data)
+		return None
+
+	def clear(self):
+		with self.lock:
+			self.frames.clear()
+			self.numBytes = 0
@@ -0,0 +1,284 @@
+import argparse
+import os
+import struct
+import threading
+import time
+from brailleDisplayDrivers.lib.DotImage import countChangedDots
+
+# ring-buffered recording of the cells written to every device, for offline analysis
+# the file is split into fixed size segments which are reused in a ring
+# every segment starts with a keyframe, the following frames only store runs of changed cells
+# so a frame can always be reconstructed from the start of its segment
+FRAME_MAGIC = b"CDFR"
+SEGMENT_MAGIC = b"SG"
+FRAME_VERSION = 1
+
+RECORD_END = 0
+RECORD_KEYFRAME = 1
+RECORD_DELTA = 2
+
+# known frame sources (stored as an index)
+FRAME_SOURCES = ["text", "image"]
+
+fileHeaderStruct = struct.Struct("<4sBHI")
+segmentHeaderStruct = struct.Struct("<2sI")
+frameHeaderStruct = struct.Struct("<BdBB")
+
+defaultSegmentSize = 64 * 1024
+defaultNumSegments = 64
+
+def writeVarint(out: bytearray, value: int):
+	while value >= 0x80:
+		out.append((value & 0x7F) | 0x80)
+		value >>= 7
+	out.append(value)
+
+def readVarint(data: bytes, offset: int) -> tuple[int, int]:
+	value = 0
+	shift = 0
+	while True:
+		byte = data[offset]
+		offset += 1
+		value |= (byte & 0x7F) << shift
+		if byte < 0x80:
+			return (value, offset)
+		shift += 7
+
+# a reconstructed frame
+class RecordedFrame():
+	def __init__(self, time: float, source: str, layout: bytes, devCells: list[bytes], changedCells: int, size: int):
+		self.time = time
+		self.source = source
+		self.layout = layout
+		self.devCells = devCells
+		# number of cells that differ from the previous frame and bytes used to store the frame
+		self.changedCells = changedCells
+		self.size = size
+
+# encode a frame, either as a keyframe or as runs of cells that differ from prevCells
+def encodeFrame(t: float, source: str, layout: bytes, devCells: list[bytes], prevCells: list[bytes] | None) -> bytes:
+	isKeyframe = prevCells is None
+	out = bytearray(frameHeaderStruct.pack(RECORD_KEYFRAME if isKeyframe else RECORD_DELTA, t, FRAME_SOURCES.index(source), len(layout)))
+	out += layout
+	out.append(len(devCells))
+	for devI, cells in enumerate(devCells):
+		if isKeyframe:
+			writeVarint(out, len(cells))
+			out += cells
+			continue
+		prev = prevCells[devI]
+		runs = bytearray()
+		numRuns = 0
+		i = 0
+		lastEnd = 0
+		while i < len(cells):
+			if cells[i] == prev[i]:
+				i += 1
+				continue
+			start = i
+			while i < len(cells) and cells[i] != prev[i]:
+				i += 1
+			writeVarint(runs, start - lastEnd)
+			writeVarint(runs, i - start)
+			runs += cells[start:i]
+			lastEnd = i
+			numRuns += 1
+		writeVarint(out, numRuns)
+		out += runs
+	return bytes(out)
+
+# records frames (called from MainCadenceDisplayDriver.display)
+class FrameRecorder():
+	def __init__(self, path: str, segmentSize: int = defaultSegmentSize, numSegments: int = defaultNumSegments):
+		self.path = path
+		self.lock = threading.Lock()
+		self.prevCells: list[bytes] | None = None
+		self.numFrames = 0
+		self.numBytes = 0
+		# continue an existing recording with the same geometry, otherwise start a new one
+		existing = readFileHeader(path) if os.path.exists(path) else None
+		if existing == (segmentSize, numSegments):
+			self.file = open(path, "r+b")
+			segments = readSegmentOrder(self.file, segmentSize, numSegments)
+			if len(segments) > 0:
+				self.seq, self.segmentI = segments[-1]
+			else:
+				self.seq, self.segmentI = (0, numSegments - 1)
+		else:
+			self.file = open(path, "w+b")
+			self.file.write(fileHeaderStruct.pack(FRAME_MAGIC, FRAME_VERSION, numSegments, segmentSize))
+			self.file.truncate(fileHeaderStruct.size + segmentSize * numSegments)
+			self.seq, self.segmentI = (0, numSegments - 1)
+		self.segmentSize = segmentSize
+		self.numSegments = numSegments
+		self.startNextSegment()
+
+	def segmentOffset(self, segmentI: int) -> int:
+		return fileHeaderStruct.size + segmentI * self.segmentSize
+
+	# move to the next segment in the ring, overwriting the oldest one
+	def startNextSegment(self):
+		self.segmentI = (self.segmentI + 1) % self.numSegments
+		self.seq += 1
+		self.file.seek(self.segmentOffset(self.segmentI))
+		self.file.write(segmentHeaderStruct.pack(SEGMENT_MAGIC, self.seq))
+		self.file.write(bytes(self.segmentSize - segmentHeaderStruct.size))
+		self.writeOffset = segmentHeaderStruct.size
+		self.prevCells = None
+
+	def record(self, source: str, layout: bytes, devCells: list[bytes]):
+		t = time.time()
+		with self.lock:
+			if self.file is None:
+				return
+			prevCells = self.prevCells
+			if prevCells is not None and [len(cells) for cells in prevCells] != [len(cells) for cells in devCells]:
+				prevCells = None
+			encoded = encodeFrame(t, source, layout, devCells, prevCells)
+			# keep a terminating zero byte at the end of every segment
+			if self.writeOffset + len(encoded) >= self.segmentSize:
+				self.startNextSegment()
+				encoded = encodeFrame(t, source, layout, devCells, None)
+				if len(encoded) >= self.segmentSize - segmentHeaderStruct.size:
+					raise ValueError(f"frame of {len(encoded)} bytes does not fit in a segment")
+			self.file.seek(self.segmentOffset(self.segmentI) + self.writeOffset)
+			self.file.write(encoded)
+			self.file.flush()
+			self.writeOffset += len(encoded)
+			self.prevCells = devCells
+			self.numFrames += 1
+			self.numBytes += len(encoded)
+
+	def close(self):
+		with self.lock:
+			if self.file is not None:
+				self.file.close()
+				self.file = None
+
+# returns (segmentSize, numSegments) or None if the file is not a frame recording
+def readFileHeader(path: str) -> tuple[int, int] | None:
+	with open(path, "rb") as f:
+		header = f.read(fileHeaderStruct.size)
+	if len(header) < fileHeaderStruct.size:
+		return None
+	magic, version, numSegments, segmentSize = fileHeaderStruct.unpack(header)
+	if magic != FRAME_MAGIC or version != FRAME_VERSION:
+		return None
+	return (segmentSize, numSegments)
+
+# list of (seq, segment index) for every used segment, oldest first
+def readSegmentOrder(f, segmentSize: int, numSegments: int) -> list[tuple[int, int]]:
+	segments: list[tuple[int, int]] = []
+	for segmentI in range(numSegments):
+		f.seek(fileHeaderStruct.size + segmentI * segmentSize)
+		magic, seq = segmentHeaderStruct.unpack(f.read(segmentHeaderStruct.size))
+		if magic == SEGMENT_MAGIC:
+			segments.append((seq, segmentI))
+	segments.sort()
+	return segments
+
+# decode every frame of a segment
+def readSegmentFrames(data: bytes) -> list[RecordedFrame]:
+	frames: list[RecordedFrame] = []
+	offset = segmentHeaderStruct.size
+	devCells: list[bytearray] = []
+	while offset < len(data) and data[offset] != RECORD_END:
+		start = offset
+		recordType, t, sourceI, layoutLength = frameHeaderStruct.unpack_from(data, offset)
+		offset += frameHeaderStruct.size
+		layout = data[offset:offset + layoutLength]
+		offset += layoutLength
+		numDevices = data[offset]
+		offset += 1
+		changedCells = 0
+		if recordType == RECORD_KEYFRAME:
+			devCells = []
+			for devI in range(numDevices):
+				length, offset = readVarint(data, offset)
+				devCells.append(bytearray(data[offset:offset + length]))
+				offset += length
+				changedCells += length
+		elif recordType == RECORD_DELTA:
+			for devI in range(numDevices):
+				numRuns, offset = readVarint(data, offset)
+				position = 0
+				for runI in range(numRuns):
+					skip, offset = readVarint(data, offset)
+					length, offset = readVarint(data, offset)
+					position += skip
+					devCells[devI][position:position + length] = data[offset:offset + length]
+					offset += length
+					position += length
+					changedCells += length
+		else:
+			raise ValueError(f"unknown record type {recordType}")
+		frames.append(RecordedFrame(t, FRAME_SOURCES[sourceI], layout, [bytes(cells) for cells in devCells], changedCells, offset - start))
+	return frames
+
+# reconstruct every frame still in the recording, oldest first
+def readFrames(path: str) -> list[RecordedFrame]:
+	header = readFileHeader(path)
+	if header is None:
+		raise ValueError(f"{path} is not a frame recording")
+	segmentSize, numSegments = header
+	frames: list[RecordedFrame] = []
+	with open(path, "rb") as f:
+		for seq, segmentI in readSegmentOrder(f, segmentSize, numSegments):
+			f.seek(fileHeaderStruct.size + segmentI * segmentSize)
+			frames += readSegmentFrames(f.read(segmentSize))
+	return frames
+
+# reconstruct a single frame (negative indexes count from the newest frame)
+def getFrame(path: str, index: int) -> RecordedFrame:
+	return readFrames(path)[index]
+
+# write rate statistics for a recording
+def frameStats(frames: list[RecordedFrame]) -> dict[str, float]:
+	if len(frames) == 0:
+		return {"frames": 0}
+	duration = frames[-1].time - frames[0].time
+	changedCells = sum(frame.changedCells for frame in frames[1:])
+	numBytes = sum(frame.size for frame in frames)
+	# pins raised or lowered between consecutive frames (devices that changed size count as fully changed)
+	changedPins = 0
+	for previous, frame in zip(frames, frames[1:]):
+		for devI, cells in enumerate(frame.devCells):
+			if devI < len(previous.devCells) and len(previous.devCells[devI]) == len(cells):
+				changedPins += countChangedDots(previous.devCells[devI], cells)
+			else:
+				changedPins += len(cells) * 8
+	stats = {
+		"frames": len(frames),
+		"duration": duration,
+		"bytesPerFrame": numBytes / len(frames),
+		"changedCellsPerFrame": changedCells / max(1, len(frames) - 1),
+		"changedPinsPerFrame": changedPins / max(1, len(frames) - 1),
+	}
+	if duration > 0:
+		stats["framesPerSecond"] = (len(frames) - 1) / duration
+		stats["changedCellsPerSecond"] = changedCells / duration
+		stats["changedPinsPerSecond"] = changedPins / duration
+	for source in FRAME_SOURCES:
+		stats[f"{source}Frames"] = len([frame for frame in frames if frame.source == source])
+	return stats
+
+# draw cells as unicode braille
+def cellsToText(cells: bytes, numCols: int) -> str:
+	return "\n".join("".join(chr(0x2800 + cell) for cell in cells[i:i + numCols]) for i in range(0, len(cells), numCols))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="inspect a Cadence frame recording (run from the add-on root with python -m)")
+	parser.add_argument("path")
+	parser.add_argument("--frame", type=int, help="print a single frame (negative counts from the newest)")
+	parser.add_argument("--cols", type=int, default=12, help="cells per row when printing a frame")
+	args = parser.parse_args()
+	frames = readFrames(args.path)
+	if args.frame is not None:
+		frame = frames[args.frame]
+		print(f"{time.ctime(frame.time)} {frame.source} layout {frame.layout.hex()}")
+		for devI, cells in enumerate(frame.devCells):
+			print(f"device {devI}:")
+			print(cellsToText(cells, args.cols))
+	else:
+		for key, value in frameStats(frames).items():
+			print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,175 @@
+import struct
+import threading
+import time
+
+# binary trace of raw HID key reports, for reproducing key handling issues and benchmarking input decoding
+# file layout: header, then a stream of records
+#   header: magic + version
+#   layout record: type, microseconds since previous record, layout length, layout bytes
+#   report record: type, microseconds since previous record, device index, report length, report bytes
+TRACE_MAGIC = b"CDIT"
+TRACE_VERSION = 1
+
+RECORD_LAYOUT = 1
+RECORD_REPORT = 2
+
+headerStruct = struct.Struct("<4sB")
+recordStruct = struct.Struct("<BI")
+layoutStruct = struct.Struct("<B")
+reportStruct = struct.Struct("<BB")
+
+# largest representable gap between two records
+MAX_DELTA_US = 0xFFFFFFFF
+
+# a single decoded record
+class TraceRecord():
+	def __init__(self, time: float, devIndex: int | None, layout: bytes | None, data: bytes | None):
+		# seconds since start of trace
+		self.time = time
+		self.devIndex = devIndex
+		self.layout = layout
+		self.data = data
+
+	def isReport(self) -> bool:
+		return self.data is not None
+
+# records raw reports seen by MainCadenceDisplayDriver._hidOnReceive
+class InputTraceRecorder():
+	def __init__(self, path: str):
+		self.path = path
+		self.file = open(path, "wb")
+		self.file.write(headerStruct.pack(TRACE_MAGIC, TRACE_VERSION))
+		self.lock = threading.Lock()
+		self.lastTime = time.perf_counter()
+		self.lastLayout: bytes | None = None
+		self.numReports = 0
+
+	def _writeRecord(self, recordType: int, now: float, body: bytes, payload: bytes):
+		deltaUs = min(MAX_DELTA_US, max(0, round((now - self.lastTime) * 1000000)))
+		self.lastTime += deltaUs / 1000000
+		self.file.write(recordStruct.pack(recordType, deltaUs))
+		self.file.write(body)
+		self.file.write(payload)
+
+	# record one report (layout is only written when it changed since the last report)
+	def record(self, data: bytes, devIndex: int, layout: bytes):
+		now = time.perf_counter()
+		with self.lock:
+			if self.file is None:
+				return
+			if layout != self.lastLayout:
+				self._writeRecord(RECORD_LAYOUT, now, layoutStruct.pack(len(layout)), layout)
+				self.lastLayout = layout
+			self._writeRecord(RECORD_REPORT, now, reportStruct.pack(devIndex, len(data)), data)
+			self.numReports += 1
+
+	def close(self):
+		with self.lock:
+			if self.file is not None:
+				self.file.close()
+				self.file = None
+
+# read all records from a trace file
+def readInputTrace(path: str) -> list[TraceRecord]:
+	with open(path, "rb") as f:
+		content = f.read()
+	if len(content) < headerStruct.size:
+		raise ValueError("truncated input trace")
+	magic, version = headerStruct.unpack_from(content, 0)
+	if magic != TRACE_MAGIC or version != TRACE_VERSION:
+		raise ValueError(f"not an input trace (magic {magic}, version {version})")
+	records: list[TraceRecord] = []
+	offset = headerStruct.size
+	t = 0.0
+	while offset + recordStruct.size <= len(content):
+		recordType, deltaUs = recordStruct.unpack_from(content, offset)
+		offset += recordStruct.size
+		t += deltaUs / 1000000
+		if recordType == RECORD_LAYOUT:
+			(length,) = layoutStruct.unpack_from(content, offset)
+			offset += layoutStruct.size
+			records.append(TraceRecord(t, None, content[offset:offset + length], None))
+		elif recordType == RECORD_REPORT:
+			devIndex, length = reportStruct.unpack_from(content, offset)
+			offset += reportStruct.size
+			records.append(TraceRecord(t, devIndex, None, content[offset:offset + length]))
+		else:
+			raise ValueError(f"unknown record type {recordType} at {offset}")
+		offset += length
+	return records
+
+# percentile of already sorted values
+def percentile(sortedValues: list[float], fraction: float) -> float:
+	if len(sortedValues) == 0:
+		return 0
+	return sortedValues[min(len(sortedValues) - 1, int(fraction * len(sortedValues)))]
+
+# result of replaying a trace
+class ReplayResult():
+	def __init__(self):
+		# (trace time, gesture id) for every gesture that was produced
+		self.gestures: list[tuple[float, str]] = []
+		# seconds spent in _hidOnReceive for each report
+		self.decodeTimes: list[float] = []
+		self.layoutMismatches = 0
+		self.skippedReports = 0
+		self.wallTime = 0.0
+
+	def summary(self) -> str:
+		times = sorted(self.decodeTimes)
+		total = sum(times)
+		throughput = len(times) / total if total > 0 else 0
+		return (f"{len(times)} reports, {len(self.gestures)} gestures, "
+			f"decode mean {total / max(1, len(times)) * 1000:.3f}ms "
+			f"p50 {percentile(times, 0.5) * 1000:.3f}ms "
+			f"p99 {percentile(times, 0.99) * 1000:.3f}ms "
+			f"max {(times[-1] if times else 0) * 1000:.3f}ms, "
+			f"{throughput:.0f} reports/s, "
+			f"{self.layoutMismatches} layout mismatches, {self.skippedReports} skipped")
+
+# feed a recorded trace back into a driver
+# realtime: keep the recorded spacing between reports, otherwise replay as fast as possible
+# dispatch: also run the driver's own key handling (executing gestures / image mode actions)
+def replayInputTrace(driver, path: str, realtime: bool = False, dispatch: bool = False) -> ReplayResult:
+	records = readInputTrace(path)
+	result = ReplayResult()
+	originalHandleKeys = driver.handleKeys
+	# handleKeys may already be replaced on the driver instance (such as by tests), which is put back afterwards
+	instanceHandleKeys = driver.__dict__.get("handleKeys")
+	recorder = driver.inputTraceRecorder
+	currentTime = [0.0]
+
+	def collectKeys(liveKeys, composedKeys, gesture):
+		if gesture is not None:
+			result.gestures.append((currentTime[0], gesture.id))
+		if dispatch:
+			originalHandleKeys(liveKeys, composedKeys, gesture)
+
+	driver.inputTraceRecorder = None
+	driver.handleKeys = collectKeys
+	try:
+		start = time.perf_counter()
+		for record in records:
+			if not record.isReport():
+				if record.layout != driver.getLayoutSignature():
+					result.layoutMismatches += 1
+				continue
+			if record.devIndex >= len(driver.devices):
+				result.skippedReports += 1
+				continue
+			if realtime:
+				delay = record.time - (time.perf_counter() - start)
+				if delay > 0:
+					time.sleep(delay)
+			currentTime[0] = record.time
+			before = time.perf_counter()
+			driver._hidOnReceive(record.data, record.devIndex)
+			result.decodeTimes.append(time.perf_counter() - before)
+		result.wallTime = time.perf_counter() - start
+	finally:
+		if instanceHandleKeys is not None:
+			driver.handleKeys = instanceHandleKeys
+		elif "handleKeys" in driver.__dict__:
+			del driver.handleKeys
+		driver.inputTraceRecorder = recorder
+	return result
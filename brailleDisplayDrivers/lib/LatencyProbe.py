@@ -0,0 +1,111 @@
+import threading
+import time
+
+# measures the time from a key report arriving to the pins changing, split into stages
+# a trace is started for every key report in MainCadenceDisplayDriver._hidOnReceive and is
+# carried along the path handleKeys -> pan / zoom -> displayImage -> queueHandler -> capture -> device.display
+LATENCY_STAGES = ["report", "handleKeys", "pan", "zoom", "displayImage", "queueHandler", "capture", "device.display"]
+
+# timestamps of a single key report on its way to the pins
+class LatencyTrace():
+	def __init__(self):
+		self.stages: list[tuple[str, float]] = [("report", time.perf_counter())]
+
+	def mark(self, stage: str):
+		self.stages.append((stage, time.perf_counter()))
+
+	def start(self) -> float:
+		return self.stages[0][1]
+
+# percentile of already sorted values
+def percentile(sortedValues: list[float], fraction: float) -> float:
+	if len(sortedValues) == 0:
+		return 0
+	return sortedValues[min(len(sortedValues) - 1, int(fraction * len(sortedValues)))]
+
+# collects traces from the driver
+class LatencyTracker():
+	def __init__(self, maxTraces: int = 10000):
+		self.lock = threading.Lock()
+		self.local = threading.local()
+		self.maxTraces = maxTraces
+		self.completed: list[LatencyTrace] = []
+
+	# start a trace for a key report (on the thread that handles the report)
+	def begin(self) -> LatencyTrace:
+		trace = LatencyTrace()
+		self.local.trace = trace
+		return trace
+
+	# trace started on this thread that hasn't been handed over to the display path
+	def current(self) -> LatencyTrace | None:
+		return getattr(self.local, "trace", None)
+
+	def mark(self, stage: str):
+		trace = self.current()
+		if trace is not None:
+			trace.mark(stage)
+
+	# take the current trace so it can be carried to another thread (a later key report starts a new one)
+	def take(self) -> LatencyTrace | None:
+		trace = self.current()
+		self.local.trace = None
+		return trace
+
+	# the report didn't lead to a display update
+	def drop(self):
+		self.local.trace = None
+
+	# the pins have been written
+	def finish(self, trace: LatencyTrace):
+		trace.mark("device.display")
+		with self.lock:
+			if len(self.completed) < self.maxTraces:
+				self.completed.append(trace)
+
+	# latency from the key report to each stage, in seconds
+	def stageLatencies(self) -> dict[str, list[float]]:
+		with self.lock:
+			traces = list(self.completed)
+		latencies: dict[str, list[float]] = {}
+		for trace in traces:
+			for stage, t in trace.stages[1:]:
+				latencies.setdefault(stage, []).append(t - trace.start())
+		return latencies
+
+	def report(self) -> str:
+		latencies = self.stageLatencies()
+		lines = [f"{len(self.completed)} key-to-pin traces (ms since key report)"]
+		for stage in LATENCY_STAGES:
+			if stage not in latencies:
+				continue
+			values = sorted(latencies[stage])
+			lines.append(f"{stage:>15}: n {len(values):>5} "
+				f"p50 {percentile(values, 0.5) * 1000:8.2f} "
+				f"p90 {percentile(values, 0.9) * 1000:8.2f} "
+				f"p99 {percentile(values, 0.99) * 1000:8.2f} "
+				f"max {values[-1] * 1000:8.2f}")
+		return "\n".join(lines)
+
+# software stand-in for a user: inject key presses into a driver and wait for the pins to change
+# keySets: the keys to press in turn (each press is followed by a release)
+# must not run on NVDA's main thread, as image mode draws through the event queue
+def runLatencyHarness(driver, keySets: list, devIndex: int = 0, iterations: int = 50, interval: float = 0.3, timeout: float = 2) -> LatencyTracker:
+	tracker = LatencyTracker()
+	previousTracker = driver.latencyTracker
+	driver.latencyTracker = tracker
+	device = driver.devices[devIndex]
+	side = device.getSides()[0]
+	try:
+		for i in range(iterations):
+			keys = keySets[i % len(keySets)]
+			numCompleted = len(tracker.completed)
+			driver._hidOnReceive(driver.buildKeyReport(devIndex, [(key, side) for key in keys]), devIndex)
+			driver._hidOnReceive(driver.buildKeyReport(devIndex, []), devIndex)
+			deadline = time.perf_counter() + timeout
+			while len(tracker.completed) == numCompleted and time.perf_counter() < deadline:
+				time.sleep(0.001)
+			time.sleep(interval)
+	finally:
+		driver.latencyTracker = previousTracker
+	return tracker
@@ -8,34 +8,59 @@ from enum import Enum
 import math
 import braille
 import inputCore
-import itertools
 from bdDetect import HID_USAGE_PAGE_BRAILLE
 from hwIo import hid
 import hidpi
 import hwPortUtils
 import brailleInput
-
-user32 = ctypes.windll.user32
-gdi32 = ctypes.windll.gdi32
-hidDll = ctypes.windll.hid
-
-CM_Get_Parent = ctypes.windll.cfgmgr32.CM_Get_Parent
-CM_Get_Parent.argtypes = [ctypes.POINTER(hwPortUtils.DWORD), hwPortUtils.DWORD, ctypes.c_ulong]
-CM_Get_Parent.restype = hwPortUtils.DWORD
-
-SetupDiOpenDeviceInfoW = ctypes.windll.setupapi.SetupDiOpenDeviceInfoW 
-SetupDiOpenDeviceInfoW.argtypes = [hwPortUtils.HDEVINFO,
-	ctypes.wintypes.LPCWSTR,
-	hwPortUtils.HWND,
-	hwPortUtils.DWORD,
-	ctypes.POINTER(hwPortUtils.SP_DEVINFO_DATA)]
-SetupDiOpenDeviceInfoW.restype = ctypes.c_bool
+import functools
+import struct
+import time
+import threading
+import core
+from typing import TYPE_CHECKING
+from brailleDisplayDrivers.lib.TileLayout import TileLayout, Tile, findLayouts, routeCellsInto
+from brailleDisplayDrivers.lib.Regions import Region, Frame, splitRegions, findRegionDevices, findSpanDevices
+from brailleDisplayDrivers.lib.Transports import TransportLink
+from brailleDisplayDrivers.lib.DotImage import countChangedDots
+
+# the recording and measuring tools are only imported once they are started, these are for annotations
+if TYPE_CHECKING:
+	from brailleDisplayDrivers.lib.InputTrace import InputTraceRecorder
+	from brailleDisplayDrivers.lib.FrameRecorder import FrameRecorder
+	from brailleDisplayDrivers.lib.LatencyProbe import LatencyTracker, LatencyTrace
+
+# Windows functions, bound on first use rather than at import so loading the add-on stays cheap
+class WinApi():
+	def __init__(self):
+		self.hidDll = ctypes.windll.hid
+		self.kernel32 = ctypes.windll.kernel32
+
+		self.CM_Get_Parent = ctypes.windll.cfgmgr32.CM_Get_Parent
+		self.CM_Get_Parent.argtypes = [ctypes.POINTER(hwPortUtils.DWORD), hwPortUtils.DWORD, ctypes.c_ulong]
+		self.CM_Get_Parent.restype = hwPortUtils.DWORD
+
+		self.CM_Locate_DevNodeW = ctypes.windll.cfgmgr32.CM_Locate_DevNodeW
+		self.CM_Locate_DevNodeW.argtypes = [ctypes.POINTER(hwPortUtils.DWORD), ctypes.wintypes.LPCWSTR, ctypes.c_ulong]
+		self.CM_Locate_DevNodeW.restype = hwPortUtils.DWORD
+
+		self.SetupDiOpenDeviceInfoW = ctypes.windll.setupapi.SetupDiOpenDeviceInfoW
+		self.SetupDiOpenDeviceInfoW.argtypes = [hwPortUtils.HDEVINFO,
+			ctypes.wintypes.LPCWSTR,
+			hwPortUtils.HWND,
+			hwPortUtils.DWORD,
+			ctypes.POINTER(hwPortUtils.SP_DEVINFO_DATA)]
+		self.SetupDiOpenDeviceInfoW.restype = ctypes.c_bool
+
+@functools.cache
+def getWinApi() -> WinApi:
+	return WinApi()
 
 def getParent(child_dev_inst: hwPortUtils.SP_DEVINFO_DATA, g_hdi: hwPortUtils.HDEVINFO) -> hwPortUtils.SP_DEVINFO_DATA:
 	buf = ctypes.create_unicode_buffer(1024)
 
 	parent_dev_inst = hwPortUtils.DWORD()
-	ret = CM_Get_Parent(ctypes.byref(parent_dev_inst), child_dev_inst.DevInst, ctypes.c_ulong(0))
+	ret = getWinApi().CM_Get_Parent(ctypes.byref(parent_dev_inst), child_dev_inst.DevInst, ctypes.c_ulong(0))
 	if ret != 0:
 		raise ctypes.WinError(ctypes.get_last_error())
 
@@ -45,7 +70,7 @@ def getParent(child_dev_inst: hwPortUtils.SP_DEVINFO_DATA, g_hdi: hwPortUtils.HD
 	
 	parent_devinfo_data = hwPortUtils.SP_DEVINFO_DATA()
 	parent_devinfo_data.cbSize = ctypes.sizeof(hwPortUtils.SP_DEVINFO_DATA)
-	ret = SetupDiOpenDeviceInfoW(g_hdi, buf.value, None, 0, ctypes.byref(parent_devinfo_data))
+	ret = getWinApi().SetupDiOpenDeviceInfoW(g_hdi, buf.value, None, 0, ctypes.byref(parent_devinfo_data))
 	if not ret:
 		raise ctypes.WinError(ctypes.get_last_error())
 	
@@ -70,6 +95,72 @@ def getName(dev_inst: hwPortUtils.SP_DEVINFO_DATA, g_hdi: hwPortUtils.HDEVINFO)
 		return buf.value
 
 
+# find the name of a bluetooth device through SetupAPI (the grandparent of the HID device is named Cadence-L/R...)
+def findBluetoothDeviceName(devicePath: str) -> str | None:
+	for g_hdi, idd, devinfo, buf in hwPortUtils._listDevices(hwPortUtils._hidGuid, True):
+		if idd.DevicePath == devicePath:
+			log.info("Found device for isRight")
+			parent = getParent(devinfo, g_hdi)
+			parent2 = getParent(parent, g_hdi)
+			return getName(parent2, g_hdi)
+	return None
+
+# instance ID of the bluetooth device a HID device belongs to (its grandparent, the node named Cadence-L/R...)
+# it contains the bluetooth address, so it tells tablets apart even though they all report the same hardware ID
+# found through the device tree from the device path, without enumerating devices
+def findBluetoothDeviceInstance(devicePath: str) -> str | None:
+	# \\?\hid#<hardware id>#<instance>#{interface} is the interface of device HID\<hardware id>\<instance>
+	path = devicePath[4:] if devicePath.startswith("\\\\?\\") else devicePath
+	parts = path.split("#")
+	if len(parts) < 3:
+		return None
+	winApi = getWinApi()
+	devInst = hwPortUtils.DWORD()
+	if winApi.CM_Locate_DevNodeW(ctypes.byref(devInst), "\\".join(parts[:3]), 0) != 0:
+		return None
+	for i in range(2):
+		parent = hwPortUtils.DWORD()
+		if winApi.CM_Get_Parent(ctypes.byref(parent), devInst.value, ctypes.c_ulong(0)) != 0:
+			return None
+		devInst = parent
+	buf = ctypes.create_unicode_buffer(1024)
+	if hwPortUtils.CM_Get_Device_ID(devInst, buf, ctypes.sizeof(buf) - 1, 0) != 0:
+		return None
+	return buf.value
+
+# get (devName, isRight) for a device
+# bluetooth names are cached by device path, as resolving them through SetupAPI is slow
+# a cached name is only used if the path still belongs to the same bluetooth device (see findBluetoothDeviceInstance)
+def resolveDeviceName(port) -> tuple[str, bool]:
+	if "product" in port.deviceInfo and port.deviceInfo["product"].startswith("Cadence-"):
+		devName = port.deviceInfo["product"]
+		log.info(f"USB {devName}")
+		return (devName, devName.startswith("Cadence-R"))
+
+	from brailleDisplayDrivers.lib.DeviceStore import getDeviceStore
+	devicePath = port.deviceInfo["devicePath"]
+	hardwareID = port.deviceInfo.get("hardwareID")
+	instanceID = findBluetoothDeviceInstance(devicePath)
+	store = getDeviceStore()
+	cached = store.get("bluetoothNames", devicePath)
+	if isinstance(cached, dict) and instanceID is not None and cached.get("instanceID") == instanceID and cached.get("hardwareID") == hardwareID and isinstance(cached.get("devName"), str) and cached["devName"].startswith(("Cadence-L", "Cadence-R")):
+		log.info(f"BLUETOOTH (cached) {cached['devName']}")
+		return (cached["devName"], cached["devName"].startswith("Cadence-R"))
+
+	name = findBluetoothDeviceName(devicePath)
+	if name is None:
+		raise Exception("unable to find device for checking if isRight")
+	if name.startswith("Cadence-L"):
+		isRight = False
+	elif name.startswith("Cadence-R"):
+		isRight = True
+	else:
+		raise Exception(f"improper device name {name}")
+	log.info(f"BLUETOOTH {name} {isRight}")
+	if store.set("bluetoothNames", devicePath, {"devName": name, "hardwareID": hardwareID, "instanceID": instanceID}):
+		store.save()
+	return (name, isRight)
+
 # device buttons
 class MiniKey(Enum):
 	DPadUp = 25
@@ -181,81 +272,26 @@ class DevSide(Enum):
 	Left = 0
 	Right = 1
 
-# a position for where the device is
-class DevPosition(Enum):
-	BottomLeft = 0
-	BottomRight = 1
-	TopLeft = 2
-	TopRight = 3
-
 # is a bluetooth device a Cadence device?
 def isDeviceCadence(m):
 	log.info(f"possible cadence device {m} {'Dev_VID&02361f' in m.id}")
 	return "Dev_VID&02361f_PID&52ae" in m.id
 
-def getDevicePosition(side: DevSide, flipped: bool) -> DevPosition:
-	if side == DevSide.Left:
-		if flipped:
-			return DevPosition.TopRight
-		else:
-			return DevPosition.BottomLeft
-	else:
-		if flipped:
-			return DevPosition.TopLeft
-		else:
-			return DevPosition.BottomRight
-
-# braille dot order
-brailleOffsets = [[0,0], [0,1], [0,2], [1,0], [1,1], [1,2], [0,3], [1,3]]
-
-# for debugging purposes
-def debugImage(image: list[list[bool]]) -> str:
-	return "\n".join(["".join(["#" if pix else " " for pix in row]) for row in image])
-
-# boolean 2d array to list of braille codes
-def imageToCells(image: list[list[bool]]) -> list[int]:
-	height = len(image)
-	width = len(image[0])
-	numCols = int(width / 2)
-	numRows = int(height / 4)
-	out: list[int] = []
-	for cellY in range(numRows):
-		for cellX in range(numCols):
-			cellOut = 0
-			for (pixI, offset) in enumerate(brailleOffsets):
-				sourceX = cellX * 2 + offset[0]
-				sourceY = cellY * 4 + offset[1]
-				valBool = image[sourceY][sourceX]
-				if valBool:
-					cellOut += 2**pixI
-			out.append(cellOut)
-	return out
-
-# list of braille codes to boolean 2d array
-def cellsToImage(cells: list[int], numRows: int) -> list[list[bool]]:
-	numCols = int(len(cells) / numRows)
-	height = numRows * 4
-	width = numCols * 2
-	image: list[list[bool]] = [[False for x in range(width)] for y in range(height)]
-	for cellI, cell in enumerate(cells):
-		cellX = cellI % numCols
-		cellY = math.floor(cellI / numCols)
-		for (pixI, offset) in enumerate(brailleOffsets):
-			x = cellX * 2 + offset[0]
-			y = cellY * 4 + offset[1]
-			val = ((cell >> pixI) & 1) == 1
-			image[y][x] = val
-	return image
-
-# join two boolean 2d arrays horizontally
-def joinImagesHorizontally(imageLeft: list[list[bool]], imageRight: list[list[bool]]):
-	return [rowLeft + rowRight for (rowLeft, rowRight) in zip(imageLeft, imageRight)]
-
-# flip boolean 2d array 180 degrees
-def flipImage(image: list[list[bool]]) -> list[list[bool]]:
-	height = len(image)
-	width = len(image[0])
-	return [[image[height - y - 1][width - x - 1] for x in range(width)] for y in range(height)]
+# window message sent when devices are added or removed
+WM_DEVICECHANGE = 0x0219
+DBT_DEVNODES_CHANGED = 0x0007
+# delay before rescanning after a device change (windows sends several messages for one change)
+RESCAN_DELAY = 0.25
+# number of writes used to measure the write latency of a transport
+LATENCY_SAMPLES = 3
+
+# WriteFile result for a write that completes asynchronously
+ERROR_IO_PENDING = 997
+
+# values of the one-handed feature (usage 7 on the braille page)
+ONE_HANDED_USAGE = 7
+ONE_HANDED_PAYLOAD = b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+TWO_HANDED_PAYLOAD = b"\xf4\x50\x4c\x74\xd1\x6e\xca\xa3\x8c\x4f\x5f\x0a\xd1\xa7\x5a\x29"
 
 class HidFeatureReport(hid.HidOutputReport):
 	_reportType = hidpi.HIDP_REPORT_TYPE.FEATURE
@@ -285,7 +321,7 @@ class MiniKeyInputGesture(braille.BrailleDisplayGesture, brailleInput.BrailleInp
 
 # Represents either a single device or a pair of two devices (where the second one is bluetooth connected to the first one)
 # Isn't visible to NVDA, see CadenceDisplayDriver
-class CadenceDeviceDriver(HidBrailleDriver):
+class CadenceDeviceDriver(HidBrailleDriver, TransportLink):
 	name = "CadenceDeviceDriver"
 	description = _("Cadence HID Braille Display")
 
@@ -308,6 +344,16 @@ class CadenceDeviceDriver(HidBrailleDriver):
 		# save properties
 		self.displayDriver = displayDriver
 		self.devIndex = devIndex
+		self.devicePath = port.deviceInfo.get("devicePath")
+		# identifies the tablet in layouts (tablets may share a name), shared by all transports of the tablet (see withFallback)
+		self.tabletID = self.devicePath
+		# cells last written to the device (None if unknown)
+		self.lastCells: bytearray | None = None
+		# set when writing to the device failed, it is dropped on the next rescan
+		self.failed = False
+		# the same tablet through another transport (usb / bluetooth), used if writing to this one fails (see TransportLink)
+		self.fallback: CadenceDeviceDriver | None = None
+		self.primary: CadenceDeviceDriver | None = None
 
 		self.actualNumRows = self.numRows
 		self.actualNumCols = self.numCols
@@ -321,68 +367,146 @@ class CadenceDeviceDriver(HidBrailleDriver):
 		if self.actualNumRows != 4 or not (self.actualNumCols == 12 or self.actualNumCols == 24):
 			raise Exception("unknown screen size")
 
-		self.valueCapsList = (hidpi.HIDP_VALUE_CAPS * self._dev.caps.NumberFeatureValueCaps)()
-		numValueCaps = ctypes.c_long(self._dev.caps.NumberFeatureValueCaps)
-		hid.check_HidP_status(
-			hidDll.HidP_GetValueCaps,
-			hidpi.HIDP_REPORT_TYPE.FEATURE,
-			ctypes.byref(self.valueCapsList),
-			ctypes.byref(numValueCaps),
-			self._dev._pd)
-
-		self.isOneHanded = not self.isTwoDevices()
-
-		# detect left or right
-		if "product" in port.deviceInfo and port.deviceInfo["product"].startswith("Cadence-"):
-			self.isRight = port.deviceInfo["product"].startswith("Cadence-R")
-			self.devName = port.deviceInfo["product"]
-			log.info(f"USB {self.isRight} {self.devName}")
-		else:
-			self.isRight = None
-			for g_hdi, idd, devinfo, buf in hwPortUtils._listDevices(hwPortUtils._hidGuid, True):
-				if idd.DevicePath == port.deviceInfo["devicePath"]:
-					log.info("Found device for isRight")
-
-					parent = getParent(devinfo, g_hdi)
-					parent2 = getParent(parent, g_hdi)
-
-					name = getName(parent2, g_hdi)
-
-					self.devName = name
-
-					if name.startswith("Cadence-L"):
-						self.isRight = False
-					elif name.startswith("Cadence-R"):
-						self.isRight = True
-					else:
-						raise Exception(f"improper device name {name}")
+		self.valueCapsList = self.getValueCaps(hidpi.HIDP_REPORT_TYPE.FEATURE, self._dev.caps.NumberFeatureValueCaps)
+
+		# preallocated buffers for writing cells, so frequent refreshes don't build a new report every time (see writeCells)
+		# cells are routed into nextCells, which the output report is filled from in place
+		self.cellValueCap = None
+		for valueCap in self.getValueCaps(hidpi.HIDP_REPORT_TYPE.OUTPUT, self._dev.caps.NumberOutputValueCaps):
+			if valueCap.LinkUsagePage == HID_USAGE_PAGE_BRAILLE and valueCap.ReportSize == 8 and valueCap.ReportCount == self.numCells:
+				self.cellValueCap = valueCap
+				break
+		self.nextCells = bytearray(self.numCells)
+		self.nextCellsBuffer = (ctypes.c_char * self.numCells).from_buffer(self.nextCells)
+		self.cellReportSize = self._dev.caps.OutputReportByteLength
+		self.cellReport = ctypes.create_string_buffer(self.cellReportSize)
+		if self.cellValueCap is not None:
+			self.cellReport[0] = self.cellValueCap.ReportID
+		self.writtenBytes = ctypes.wintypes.DWORD()
+
+		# value cap of the one-handed feature and prepared feature reports for each state
+		self.oneHandedValueCap = None
+		for valueCap in self.valueCapsList:
+			if valueCap.LinkUsagePage == HID_USAGE_PAGE_BRAILLE and valueCap.u1.NotRange.Usage == ONE_HANDED_USAGE:
+				self.oneHandedValueCap = valueCap
+				break
+		self.oneHandedReports: dict[bool, bytes] = {}
 
-					log.info(f"BLUETOOTH {name} {self.isRight}")
+		# current firmware state, only changes are sent
+		# single tablets are assumed to be one-handed (the driver leaves them one-handed when it exits) rather than being read,
+		# so opening a device takes no round trip and the report is only sent if the layout needs both hands
+		self.isOneHanded: bool | None = not self.isTwoDevices()
 
-			if self.isRight is None:
-				raise Exception("unable to find device for checking if isRight")
+		# detect left or right (usually already done while finding the device)
+		resolved = displayDriver.resolvedNames.get(self.devicePath)
+		self.devName, self.isRight = resolved if resolved is not None else resolveDeviceName(port)
 
 		log.info(f"isRight {self.isRight}")
 
-		# Track flipped state per side (for duet/quartet layouts)
-		self.isFlipped = {side: False for side in self.getSides()}
-
-		# auto-select whether device is flipped based on whether another device is currently in non-flipped position
-		for side in self.getSides():
-			unflippedPos = getDevicePosition(side, False)
-			for otherDevice in self.displayDriver.devices:
-				for otherDeviceSide in otherDevice.getSides():
-					if otherDevice.getPosition(otherDeviceSide) == unflippedPos and not self.isFlipped[side]:
-						if self.devName < getattr(otherDevice, "devName", ""):
-							otherDevice.isFlipped[otherDeviceSide] = True
-						else:
-							self.isFlipped[side] = True
-
 	# received button press (called by superclass)
 	def _hidOnReceive(self, data: bytes):
 		super()._hidOnReceive(data)
+		# a tablet connected through both transports reports its keys on each of them, only the primary's are handled
+		if not self.isActiveTransport():
+			return
 		self.displayDriver._hidOnReceive(data, self.devIndex)
 
+	def getValueCaps(self, reportType: int, count: int):
+		valueCapsList = (hidpi.HIDP_VALUE_CAPS * count)()
+		numValueCaps = ctypes.c_long(count)
+		hid.check_HidP_status(
+			getWinApi().hidDll.HidP_GetValueCaps,
+			reportType,
+			ctypes.byref(valueCapsList),
+			ctypes.byref(numValueCaps),
+			self._dev._pd)
+		return valueCapsList
+
+	# write nextCells to the device and remember them in lastCells
+	def writeCells(self):
+		valueCap = self.cellValueCap
+		if valueCap is None:
+			super().display(bytes(self.nextCells))
+		else:
+			hid.check_HidP_status(
+				getWinApi().hidDll.HidP_SetUsageValueArray,
+				hidpi.HIDP_REPORT_TYPE.OUTPUT,
+				HID_USAGE_PAGE_BRAILLE,
+				valueCap.LinkCollection,
+				valueCap.u1.NotRange.Usage,
+				self.nextCellsBuffer,
+				self.numCells,
+				self._dev._pd,
+				self.cellReport,
+				self.cellReportSize)
+			self.writeReport()
+		if self.lastCells is None:
+			self.lastCells = bytearray(self.nextCells)
+		else:
+			self.lastCells[:] = self.nextCells
+
+	# write the prepared output report directly from its buffer (falls back to the generic write, which copies it)
+	def writeReport(self):
+		writeFile = getattr(self._dev, "_writeFile", None)
+		overlapped = getattr(self._dev, "_writeOl", None)
+		if writeFile is None or overlapped is None:
+			self._dev.write(self.cellReport.raw)
+			return
+		kernel32 = getWinApi().kernel32
+		if not kernel32.WriteFile(writeFile, self.cellReport, self.cellReportSize, None, ctypes.byref(overlapped)):
+			if ctypes.GetLastError() != ERROR_IO_PENDING:
+				raise ctypes.WinError()
+			kernel32.GetOverlappedResult(writeFile, ctypes.byref(overlapped), ctypes.byref(self.writtenBytes), True)
+
+	# display cells (called by NVDA, MainCadenceDisplayDriver writes through nextCells directly)
+	def display(self, cells: list[int]):
+		self.nextCells[:] = bytes(cells[:self.numCells]).ljust(self.numCells, b"\0")
+		self.writeCells()
+
+	# median time taken to write cells to the device
+	def measureWriteLatency(self) -> float:
+		if self.lastCells is not None:
+			self.nextCells[:] = self.lastCells
+		times: list[float] = []
+		for i in range(LATENCY_SAMPLES):
+			start = time.perf_counter()
+			self.writeCells()
+			times.append(time.perf_counter() - start)
+		return sorted(times)[len(times) // 2]
+
+	# use another transport of the same tablet as a fallback, whichever transport writes faster becomes the primary
+	# returns the primary
+	def withFallback(self, other: "CadenceDeviceDriver") -> "CadenceDeviceDriver":
+		try:
+			latency = self.measureWriteLatency()
+		except Exception as e:
+			log.error(f"unable to write to {self.devicePath}: {e}")
+			latency = math.inf
+		try:
+			otherLatency = other.measureWriteLatency()
+		except Exception as e:
+			log.error(f"unable to write to {other.devicePath}: {e}")
+			otherLatency = math.inf
+		primary, fallback = (self, other) if latency <= otherLatency else (other, self)
+		log.info(f"{self.devName}: write latency {latency * 1000:.1f}ms ({self.devicePath}) / {otherLatency * 1000:.1f}ms ({other.devicePath}), using {primary.devicePath}")
+		primary.devIndex = self.devIndex
+		other.tabletID = self.tabletID
+		primary.linkFallback(fallback)
+		fallback.devIndex = primary.devIndex
+		return primary
+
+	# switch output and input to the fallback transport, returns the new primary (None if there is no fallback)
+	def promoteFallback(self) -> "CadenceDeviceDriver | None":
+		fallback = self.fallback
+		if fallback is None or fallback.failed:
+			return None
+		log.info(f"{self.devName}: switching to {fallback.devicePath}")
+		self.swapToFallback()
+		fallback.devIndex = self.devIndex
+		fallback.isOneHanded = self.isOneHanded
+		fallback.lastCells = None
+		return fallback
+
 	# handle button press
 	def _handleKeyRelease(self):
 		pass
@@ -401,10 +525,25 @@ class CadenceDeviceDriver(HidBrailleDriver):
 		else:
 			return [DevSide.Left]
 
-	# get position of device
-	def getPosition(self, side: DevSide) -> DevPosition:
-		flipped = self.isFlipped.get(side, False)
-		return getDevicePosition(side, flipped)
+	# layout units (half-tablets) of this device, identified by tablet so the layout survives reindexing and transport changes
+	def getUnits(self) -> list[tuple[str, DevSide]]:
+		return [(self.tabletID, side) for side in self.getSides()]
+
+	# feature report for a one-handed state (built once per state)
+	def getOneHandedReport(self, oneHanded: bool) -> bytes:
+		report = self.oneHandedReports.get(oneHanded)
+		if report is None:
+			featureReport = HidFeatureReport(self._dev)
+			if self.oneHandedValueCap is not None:
+				featureReport.setUsageValueArray(
+					HID_USAGE_PAGE_BRAILLE,
+					self.oneHandedValueCap.LinkCollection,
+					self.oneHandedValueCap.u1.NotRange.Usage,
+					ONE_HANDED_PAYLOAD if oneHanded else TWO_HANDED_PAYLOAD,
+				)
+			report = featureReport.data
+			self.oneHandedReports[oneHanded] = report
+		return report
 
 	def setOneHanded(self, newOneHanded: bool):
 		if newOneHanded == self.isOneHanded:
@@ -412,22 +551,20 @@ class CadenceDeviceDriver(HidBrailleDriver):
 		if self.isTwoDevices():
 			return
 
-		report = HidFeatureReport(self._dev)
-		for valueCap in self.valueCapsList:
-			if valueCap.LinkUsagePage == HID_USAGE_PAGE_BRAILLE and valueCap.u1.NotRange.Usage == 7:
-				report.setUsageValueArray(
-					HID_USAGE_PAGE_BRAILLE,
-					valueCap.LinkCollection,
-					valueCap.u1.NotRange.Usage,
-					b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00" if newOneHanded else b"\xf4\x50\x4c\x74\xd1\x6e\xca\xa3\x8c\x4f\x5f\x0a\xd1\xa7\x5a\x29",
-				)
-
-		self._dev.setFeature(report.data)
+		self._dev.setFeature(self.getOneHandedReport(newOneHanded))
 		self.isOneHanded = newOneHanded
+		self.lastCells = None
 
 	# cleanup on exit (called by NVDA)
 	def terminate(self):
 		log.info("## MainCadenceDisplayDriver Terminate")
+		fallback = self.fallback
+		if fallback is not None:
+			self.fallback = None
+			try:
+				fallback.terminate()
+			except Exception as e:
+				log.error(e)
 		self.setOneHanded(True)
 		try:
 			super().terminate()
@@ -451,6 +588,14 @@ class MainCadenceDisplayDriver(braille.BrailleDisplayDriver):
 	composedKeys: list[tuple[MiniKey, tuple[int, DevSide]]]
 
 	devices: list[CadenceDeviceDriver]
+	inputTraceRecorder: "InputTraceRecorder | None"
+	frameRecorder: "FrameRecorder | None"
+	latencyTracker: "LatencyTracker | None"
+	regions: list[Region]
+	pendingFrames: dict[str, Frame]
+
+	# minimum time between writes of each source (see Regions.Region)
+	regionMinIntervals: dict[str, float] = {}
 
 	@classmethod
 	def registerAutomaticDetection(cls, driverRegistrar: bdDetect.DriverRegistrar):
@@ -468,82 +613,475 @@ class MainCadenceDisplayDriver(braille.BrailleDisplayDriver):
 	def __init__(self, port):
 		super().__init__()
 		# initialize properties
+		self.initStartTime = time.perf_counter()
+		self.hasDisplayed = False
 		self.prevKeysDown = []
 		self.liveKeys = []
 		self.composedKeys = []
 		self.devices = []
 		self.keyGestureHandled = False
-
-		# check for USB devices
-		for devMatch in self._getTryPorts("usb"):
-			if devMatch.type != bdDetect.DeviceType.HID:
-				continue
-			device = CadenceDeviceDriver(devMatch, self, len(self.devices))
-			self.devices.append(device)
-
-		# if no USB devices, check for bluetooth devices
-		# TODO figure out a way to determine which usb and bluetooth connections are the same device in case we want to connect to a mix of USB and bluetooth devices
-		if len(self.devices) == 0:
-			for devMatch in self._getTryPorts("bluetooth"):
-				if devMatch.type != bdDetect.DeviceType.HID:
-					continue
-				device = CadenceDeviceDriver(devMatch, self, len(self.devices))
-				self.devices.append(device)
+		self.devicesLock = threading.RLock()
+		self.rescanTimer: threading.Timer | None = None
+		# (devName, isRight) of every device path found by the last scan (see findDeviceMatches)
+		self.resolvedNames: dict[str, tuple[str, bool]] = {}
+		self.inputTraceRecorder = None
+		self.frameRecorder = None
+		self.latencyTracker = None
+		# pins raised or lowered on all devices since the counter was reset, only counted once getPinChangeRate was called
+		self.countPinChanges = False
+		self.pinsChanged = 0
+		self.pinsChangedSince = time.perf_counter()
+		# current layout, all layouts possible with the connected devices and the cells of the full screen shown on each device
+		self.layout: TileLayout | None = None
+		self.layoutIndex = 0
+		self.layoutOptions: list[TileLayout] = []
+		self.deviceRoutes: list[list[tuple[int, int, bool]]] = []
+		# the screen is composed of regions showing different sources, composed into the cells of the full screen
+		self.regions = []
+		self.screenCells = bytearray()
+		# frames are built by any thread against the current regions and written by the frame writer thread (see runFrameWriter)
+		# frameLock guards the regions, layoutVersion and pendingFrames, and is never held while writing to devices
+		self.frameLock = threading.Condition()
+		self.layoutVersion = 0
+		self.pendingFrames = {}
+		self.frameWriterRunning = True
+		self.frameWriter: threading.Thread | None = None
+
+		matchGroups = self.findDeviceMatches()
 
 		# if no devices, error
-		if len(self.devices) == 0:
+		if len(matchGroups) == 0:
 			raise RuntimeError("no cadence devices")
 
+		self.devices = self.openDevices(matchGroups)
+		self.chooseLayout()
+
+		# watch for tablets being plugged in or removed
+		core.post_windowMessageReceipt.register(self.handleWindowMessage)
+
 		log.info(f"########################## cadence driver initialized {port} {self.devices}")
 
 		for devI, device in enumerate(self.devices):
-			for side in device.getSides():
-				log.info(f"device: {devI} {side} {device.getPosition(side)}")
+			for unit in device.getUnits():
+				log.info(f"device: {devI} {unit[1]} {self.layout.tiles.get(unit)}")
 
 		# initialize screen size
 		self.updateScreenSize()
 
+		self.frameWriter = threading.Thread(target=self.runFrameWriter, name="CadenceFrameWriter", daemon=True)
+		self.frameWriter.start()
+
+	# find connected devices, grouped by tablet
+	# a tablet connected through both usb and bluetooth is identified by its name and gets both matches
+	# only matches of different transports are paired, tablets sharing a name on the same transport stay separate
+	def findDeviceMatches(self) -> list[list]:
+		groups: list[tuple[str, dict[str, object]]] = []
+		resolvedNames: dict[str, tuple[str, bool]] = {}
+		for transport in ("usb", "bluetooth"):
+			for devMatch in self._getTryPorts(transport):
+				if devMatch.type != bdDetect.DeviceType.HID:
+					continue
+				try:
+					devName, isRight = resolveDeviceName(devMatch)
+				except Exception as e:
+					log.error(f"unable to identify cadence device {devMatch}: {e}")
+					continue
+				resolvedNames[devMatch.deviceInfo.get("devicePath")] = (devName, isRight)
+				group = next((group for groupName, group in groups if groupName == devName and transport not in group), None)
+				if group is None:
+					group = {}
+					groups.append((devName, group))
+				group[transport] = devMatch
+		self.resolvedNames = resolvedNames
+		return [list(group.values()) for devName, group in groups]
+
+	# open devices in parallel, so startup takes as long as the slowest device rather than the sum of all of them
+	# each group of matches is one tablet, the fastest transport is used and the other is kept as a fallback
+	# a tablet fails to open only if none of its transports opened (a fallback that fails is skipped)
+	# if raiseErrors is False, tablets that fail to open are skipped
+	def openDevices(self, matchGroups: list[list], firstIndex: int = 0, raiseErrors: bool = True) -> list[CadenceDeviceDriver]:
+		devMatches = [devMatch for group in matchGroups for devMatch in group]
+		if len(devMatches) == 0:
+			return []
+		from concurrent.futures import ThreadPoolExecutor
+		with ThreadPoolExecutor(max_workers=len(devMatches), thread_name_prefix="CadenceOpen") as executor:
+			futures = [[executor.submit(CadenceDeviceDriver, devMatch, self, firstIndex + groupI) for devMatch in group] for groupI, group in enumerate(matchGroups)]
+		devices: list[CadenceDeviceDriver] = []
+		error: Exception | None = None
+		for groupFutures in futures:
+			groupDevices: list[CadenceDeviceDriver] = []
+			groupError: Exception | None = None
+			for future in groupFutures:
+				try:
+					groupDevices.append(future.result())
+				except Exception as e:
+					log.error(f"unable to open cadence device: {e}")
+					groupError = e
+			if len(groupDevices) == 0:
+				error = error or groupError
+				continue
+			device = groupDevices[0]
+			if len(groupDevices) > 1:
+				device = device.withFallback(groupDevices[1])
+			device.devIndex = firstIndex + len(devices)
+			if device.fallback is not None:
+				device.fallback.devIndex = device.devIndex
+			devices.append(device)
+		if error is not None and raiseErrors:
+			for device in devices:
+				device.terminate()
+			raise error
+		return devices
+
+	# called by NVDA for every window message
+	def handleWindowMessage(self, msg=None, wParam=None):
+		if msg == WM_DEVICECHANGE and wParam == DBT_DEVNODES_CHANGED:
+			self.scheduleRescan()
+
+	# rescan for added or removed devices shortly (repeated calls are merged)
+	def scheduleRescan(self):
+		with self.devicesLock:
+			if self.rescanTimer is not None:
+				self.rescanTimer.cancel()
+			self.rescanTimer = threading.Timer(RESCAN_DELAY, self.rescanDevices)
+			self.rescanTimer.daemon = True
+			self.rescanTimer.start()
+
+	# open devices that were plugged in and drop devices that were removed or failed, without touching the others
+	def rescanDevices(self):
+		try:
+			matchGroups = self.findDeviceMatches()
+		except Exception as e:
+			log.error(f"unable to scan for cadence devices: {e}")
+			return
+		devicePaths = [devMatch.deviceInfo.get("devicePath") for group in matchGroups for devMatch in group]
+		isGone = lambda device: device.failed or device.devicePath not in devicePaths
+		start = time.perf_counter()
+		removedDevices: list[CadenceDeviceDriver] = []
+		with self.devicesLock:
+			# switch to the other transport of tablets whose primary transport is gone, and drop gone fallbacks
+			for devIndex, device in enumerate(self.devices):
+				fallback = device.fallback
+				if fallback is not None and isGone(fallback):
+					device.fallback = None
+					removedDevices.append(fallback)
+				if isGone(device):
+					promoted = device.promoteFallback()
+					if promoted is not None:
+						self.devices[devIndex] = promoted
+						removedDevices.append(device)
+			goneDevices = [device for device in self.devices if isGone(device)]
+			knownPaths = {transport.devicePath: device for device in self.devices for transport in (device, device.fallback) if transport is not None and transport not in removedDevices}
+			firstIndex = len(self.devices)
+		# unknown connections either are another transport of a connected tablet (grouped with its known transport) or a new tablet
+		newGroups: list[list] = []
+		newTransports: list = []
+		for group in matchGroups:
+			newMatches = [devMatch for devMatch in group if devMatch.deviceInfo.get("devicePath") not in knownPaths]
+			if len(newMatches) == 0:
+				continue
+			knownDevices = [knownPaths[devMatch.deviceInfo.get("devicePath")] for devMatch in group if devMatch not in newMatches]
+			knownDevices = [device for device in knownDevices if device not in goneDevices]
+			if len(knownDevices) > 0:
+				newTransports.append((knownDevices[0], newMatches[0]))
+			else:
+				newGroups.append(newMatches)
+		if len(newGroups) == 0 and len(newTransports) == 0 and len(goneDevices) == 0 and len(removedDevices) == 0:
+			return
+		newDevices = self.openDevices(newGroups, firstIndex, raiseErrors=False)
+		for device, devMatch in newTransports:
+			try:
+				other = CadenceDeviceDriver(devMatch, self, device.devIndex)
+			except Exception as e:
+				log.error(f"unable to open cadence device: {e}")
+				continue
+			if device.fallback is not None:
+				other.terminate()
+				continue
+			with self.devicesLock:
+				primary = device.withFallback(other)
+				if primary is not device:
+					self.devices[device.devIndex] = primary
+		self.updateDevices(goneDevices, newDevices)
+		for device in removedDevices:
+			device.devIndex = -1
+			try:
+				device.terminate()
+			except Exception as e:
+				log.error(f"error closing removed device: {e}")
+		log.info(f"devices changed: removed {[device.devName for device in goneDevices + removedDevices]}, added {[device.devName for device in newDevices]} in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+	# replace the set of devices, keeping the layout of devices that stay connected
+	def updateDevices(self, removedDevices: list[CadenceDeviceDriver], newDevices: list[CadenceDeviceDriver]):
+		with self.devicesLock:
+			self.devices = [device for device in self.devices if device not in removedDevices] + newDevices
+			for devIndex, device in enumerate(self.devices):
+				device.devIndex = devIndex
+				if device.fallback is not None:
+					device.fallback.devIndex = devIndex
+			# key state refers to device indexes
+			self.prevKeysDown = []
+			self.liveKeys = []
+			self.composedKeys = []
+			self.chooseLayout()
+			self.afterDevicesChanged()
+		for device in removedDevices:
+			device.devIndex = -1
+			try:
+				device.terminate()
+			except Exception as e:
+				log.error(f"error closing removed device: {e}")
+
+	# key for the saved layout of the current set of devices
+	# layouts are saved by tablet name, so they aren't saved if two tablets share a name (None)
+	def getLayoutKey(self) -> str | None:
+		names = sorted(device.devName for device in self.devices)
+		if len(set(names)) != len(names):
+			return None
+		return "|".join(names)
+
+	# layout unit of a device side
+	def getUnit(self, deviceID: tuple[int, DevSide]) -> tuple[str, DevSide]:
+		return (self.devices[deviceID[0]].tabletID, deviceID[1])
+
+	# find every layout possible with the connected devices (devices are considered in name order, so the result doesn't depend on which device finished opening first)
+	def updateLayoutOptions(self):
+		devices = sorted(self.devices, key=lambda device: (device.devName, device.tabletID))
+		units = [unit for device in devices for unit in sorted(device.getUnits(), key=lambda unit: unit[1].value)]
+		numLefts = len([unit for unit in units if unit[1] == DevSide.Left])
+		numRights = len([unit for unit in units if unit[1] == DevSide.Right])
+		# don't combine two tall duets into a quartet
+		self.layoutOptions = findLayouts(
+			[(unit, unit[1] == DevSide.Right) for unit in units],
+			sameDevice={unit: unit[0] for unit in units},
+			allowSplitDevices=not (numLefts > 2 and numRights > 2),
+		)
+
+	# the layout saved for the current set of devices (None if there is no valid saved layout)
+	def restoreLayout(self) -> TileLayout | None:
+		layoutKey = self.getLayoutKey()
+		if layoutKey is None:
+			return None
+		from brailleDisplayDrivers.lib.DeviceStore import getDeviceStore
+		saved = getDeviceStore().get("layouts", layoutKey)
+		if not isinstance(saved, dict):
+			return None
+		tiles: dict[tuple[str, DevSide], Tile] = {}
+		for device in self.devices:
+			deviceSaved = saved.get(device.devName)
+			if not isinstance(deviceSaved, dict):
+				return None
+			for unit in device.getUnits():
+				tile = deviceSaved.get(unit[1].name)
+				if not isinstance(tile, list) or len(tile) != 3:
+					return None
+				tiles[unit] = Tile(tile[0], tile[1], tile[2])
+		layout = TileLayout(tiles)
+		if layout not in self.layoutOptions:
+			return None
+		log.info(f"restored layout {saved}")
+		return layout
+
+	# save the current layout for the current set of devices
+	def saveLayout(self):
+		layoutKey = self.getLayoutKey()
+		if len(self.devices) == 0 or self.layout is None or layoutKey is None:
+			return
+		layout: dict[str, dict[str, list]] = {}
+		for device in self.devices:
+			for unit in device.getUnits():
+				tile = self.layout.tiles[unit]
+				layout.setdefault(device.devName, {})[unit[1].name] = [tile.x, tile.y, tile.flipped]
+		from brailleDisplayDrivers.lib.DeviceStore import getDeviceStore
+		store = getDeviceStore()
+		if store.set("layouts", layoutKey, layout):
+			store.save()
+
+	# switch to one of the layout options
+	def selectLayout(self, layoutIndex: int):
+		self.layoutIndex = layoutIndex
+		self.layout = self.layoutOptions[layoutIndex]
+
+	# index of the layout option that keeps the most units where they currently are (the first option if nothing matches)
+	def findClosestLayout(self, layoutIndexes: list[int]) -> int:
+		current = self.layout.tiles if self.layout is not None else {}
+		return max(layoutIndexes, key=lambda layoutIndex: len([unit for unit, tile in self.layoutOptions[layoutIndex].tiles.items() if current.get(unit) == tile]))
+
+	# restore the saved layout, otherwise keep devices that stay connected where they are, otherwise use the preferred layout
+	def chooseLayout(self):
+		self.updateLayoutOptions()
+		restored = self.restoreLayout()
+		if restored is not None:
+			self.selectLayout(self.layoutOptions.index(restored))
+		else:
+			self.selectLayout(self.findClosestLayout(list(range(len(self.layoutOptions)))))
+
 	# display on device (called by NVDA or manually in some cases)
+	# NVDA builds the cells for the current size
 	def display(self, cells: list[int]):
-		# log.info(f"display {len(cells)} {self.numRows} {self.numCols}")
-		if len(cells) < self.numRows * self.numCols:
-			cells = [(cells[i] if i < len(cells) else 0) for i in self.numRows * self.numCols]
-		cells = cells[:(self.numRows * self.numCols)]
-		fullImage = cellsToImage(cells, self.numRows)
-		for devI, device in enumerate(self.devices):
-			sides = device.getSides()
-			leftDevPos = device.getPosition(sides[0])
-			# log.info(f"left {devI} {leftDevPos}")
-			image = self.getImage(fullImage, leftDevPos)
-			if len(sides) > 1:
-				rightDevPos = device.getPosition(sides[1])
-				# log.info(f"right {devI} {rightDevPos}")
-				rightSideImage = self.getImage(fullImage, rightDevPos)
-				image = joinImagesHorizontally(image, rightSideImage)
-			devCells = imageToCells(image)
-			device.display(devCells)
-
-	# crop a screen to a device position
-	def getImage(self, fullImage: list[list[bool]], pos: DevPosition) -> list[list[bool]]:
-		xOffset = (24 if (pos == DevPosition.TopRight or pos == DevPosition.BottomRight) else 0) - self.offsetCols * 2
-		yOffset = (16 if (pos == DevPosition.BottomLeft or pos == DevPosition.BottomRight) else 0) - self.offsetRows * 4
-		image = [[fullImage[y + yOffset][x + xOffset] for x in range(24)] for y in range(16)]
-		flipped = pos == DevPosition.TopLeft or pos == DevPosition.TopRight
-		# log.info(f"display {pos} / {xOffset} / {yOffset} / {flipped}")
-		if flipped:
-			image = flipImage(image)
-		return image
-	
+		self.updateRegion("text", cells, self.layoutVersion)
+
+	# sources shown on the screen, top to bottom
+	def getRegionSources(self) -> list[str]:
+		return ["text"]
+
+	def getRegion(self, source: str) -> Region | None:
+		for region in self.regions:
+			if region.source == source:
+				return region
+		return None
+
+	# split the screen of the current layout into regions (their content has to be displayed again)
+	# frames built for the previous regions are dropped
+	def updateRegions(self):
+		with self.devicesLock:
+			regions = splitRegions(self.layout, self.getRegionSources(), self.regionMinIntervals)
+			for region in regions:
+				region.devIndexes = findRegionDevices(region, self.deviceRoutes)
+			with self.frameLock:
+				self.regions = regions
+				self.layoutVersion += 1
+				self.screenCells = bytearray(self.layout.numRows * self.layout.numCols)
+				# NVDA writes text to the text region, or to the whole screen while it isn't shown
+				textRegion = self.getRegion("text")
+				self.numRows = textRegion.numRows if textRegion is not None else self.layout.numRows
+				self.numCols = self.layout.numCols
+			log.info(f"regions {self.regions}")
+
+	# new cells for the region showing a source, ignored if the source isn't shown
+	# layoutVersion is the version the producer read before building the cells (see Regions.Frame)
+	# the cells are handed to the frame writer, so callers never wait for devices
+	# trace is the latency trace of the key report the cells answer, finished once they are written (see LatencyProbe)
+	def updateRegion(self, source: str, cells: list[int], layoutVersion: int, trace: "LatencyTrace | None" = None):
+		with self.frameLock:
+			region = self.getRegion(source)
+			if region is None:
+				return
+			# built for another layout, the producer builds the cells again for the current one
+			if layoutVersion != self.layoutVersion or len(cells) != region.numCells:
+				log.info(f"dropped {source} frame of {len(cells)} cells for layout {layoutVersion} ({region.numCells} cells for layout {self.layoutVersion})")
+				return
+			traces = (trace,) if trace is not None else ()
+			# an unwritten frame of the same source is replaced (the newest frame wins), its latency traces end with the new one
+			pending = self.pendingFrames.get(source)
+			if pending is not None and pending.layoutVersion == self.layoutVersion:
+				traces = pending.traces + traces
+			self.pendingFrames[source] = Frame(source, layoutVersion, bytes(cells), traces)
+			self.frameLock.notify()
+
+	# the only thread writing cells to the devices
+	# takes the newest frame of every source once the minimum interval of its region is over (updates arriving sooner are merged)
+	def runFrameWriter(self):
+		while True:
+			with self.frameLock:
+				while self.frameWriterRunning and len(self.pendingFrames) == 0:
+					self.frameLock.wait()
+				if not self.frameWriterRunning:
+					return
+				now = time.perf_counter()
+				frames: list[Frame] = []
+				wait: float | None = None
+				for source in list(self.pendingFrames):
+					region = self.getRegion(source)
+					remaining = region.lastFlushTime + region.minInterval - now if region is not None else 0
+					if remaining > 0:
+						wait = remaining if wait is None else min(wait, remaining)
+					else:
+						frames.append(self.pendingFrames.pop(source))
+				if len(frames) == 0:
+					self.frameLock.wait(wait)
+					continue
+			try:
+				self.writeFrames(frames)
+			except Exception as e:
+				log.error(f"writing frames failed: {e}")
+
+	# write frames to the devices showing their regions
+	def writeFrames(self, frames: list[Frame]):
+		with self.devicesLock:
+			for frame in frames:
+				region = self.getRegion(frame.source)
+				# the layout changed after the frame was built
+				if region is None or frame.layoutVersion != self.layoutVersion:
+					continue
+				if region.update(frame.cells):
+					region.dirty = False
+					region.lastFlushTime = time.perf_counter()
+					# only the changed cells are copied, and only the devices showing them are written (a blinking cursor touches a single tablet)
+					start = region.start + region.dirtyStart
+					stop = region.start + region.dirtyStop
+					self.screenCells[start:stop] = region.cells[region.dirtyStart:region.dirtyStop]
+					self.writeDevices(findSpanDevices(region.devIndexes, self.deviceRoutes, start, stop), region.source)
+				if self.latencyTracker is not None:
+					for trace in frame.traces:
+						self.latencyTracker.finish(trace)
+
+	# stop the frame writer, frames that weren't written yet are dropped
+	def stopFrameWriter(self):
+		with self.frameLock:
+			self.frameWriterRunning = False
+			self.pendingFrames.clear()
+			self.frameLock.notify()
+		if self.frameWriter is not None and self.frameWriter is not threading.current_thread():
+			self.frameWriter.join(1)
+		self.frameWriter = None
+
+	# write the screen cells to some of the devices
+	def writeDevices(self, devIndexes: list[int], source: str):
+		for devI in devIndexes:
+			device = self.devices[devI]
+			# cut the cells of each unit of the device out of the full screen into the device's buffer, rotating flipped units
+			routeCellsInto(device.nextCells, self.screenCells, self.deviceRoutes[devI])
+			# only write to devices whose cells changed
+			if device.nextCells != device.lastCells and not device.failed:
+				if self.countPinChanges and device.lastCells is not None and len(device.lastCells) == len(device.nextCells):
+					self.pinsChanged += countChangedDots(device.nextCells, device.lastCells)
+				try:
+					device.writeCells()
+				except Exception as e:
+					log.error(f"writing to device {devI} ({device.devName}) failed, dropping it: {e}")
+					device.failed = True
+					self.scheduleRescan()
+					# continue on the other transport if the tablet has one
+					promoted = device.promoteFallback()
+					if promoted is not None:
+						# keep the failed transport as the fallback, so the rescan closes it
+						self.devices[devI] = promoted
+						promoted.linkFallback(device)
+						try:
+							promoted.nextCells[:] = device.nextCells
+							promoted.writeCells()
+						except Exception as e:
+							log.error(f"writing to fallback of device {devI} failed: {e}")
+							promoted.failed = True
+		if self.frameRecorder is not None:
+			self.frameRecorder.record(source, self.getLayoutSignature(), [bytes(device.lastCells) if device.lastCells is not None else bytes(device.numCells) for device in self.devices])
+		if not self.hasDisplayed:
+			self.hasDisplayed = True
+			log.info(f"first braille {(time.perf_counter() - self.initStartTime) * 1000:.0f}ms after driver start")
+
 	# flip keys if necessary due to device position
-	def rotateKey(self, key: MiniKey, pos: DevPosition) -> MiniKey:
-		if pos == DevPosition.TopLeft or pos == DevPosition.TopRight:
+	def rotateKey(self, key: MiniKey, flipped: bool) -> MiniKey:
+		if flipped:
 			if key in upsideDownKeys:
 				return upsideDownKeys[key]
 		return key
 
+	# whether a device side is rotated 180 degrees in the current layout
+	def isUnitFlipped(self, device: tuple[int, DevSide]) -> bool:
+		return self.layout.isFlipped(self.getUnit(device))
+
 	# receive button press from device (called by CadenceDeviceDriver)
 	def _hidOnReceive(self, data: bytes, devIndex: int):
 		# log.info("# data: " + " ".join([f"{b:0>8b}" for b in data]))
+		# ignore reports from devices that are still being opened or were removed
+		if devIndex < 0 or devIndex >= len(self.devices):
+			return
+		if self.inputTraceRecorder is not None:
+			self.inputTraceRecorder.record(data, devIndex, self.getLayoutSignature())
+		latencyTracker = self.latencyTracker
+		if latencyTracker is not None:
+			latencyTracker.begin()
 		if len(data) == 5 or len(data) == 7:
 			keysDown = [key for key in self.prevKeysDown if key[1][0] != devIndex]
 			for byteI, byte in enumerate(data):
@@ -563,7 +1101,7 @@ class MainCadenceDisplayDriver(braille.BrailleDisplayDriver):
 						if len(data) == 5 and devSide == DevSide.Right:
 							if key in mirroredKeys:
 								key = mirroredKeys[key]
-						key = self.rotateKey(key, self.getDevPosition((devIndex, devSide)))
+						key = self.rotateKey(key, self.isUnitFlipped((devIndex, devSide)))
 						if not key in keysDown:
 							keysDown.append((key, (devIndex, devSide)))
 			newKeys = [key for key in keysDown if key not in self.prevKeysDown]
@@ -592,6 +1130,7 @@ class MainCadenceDisplayDriver(braille.BrailleDisplayDriver):
 				composedKeys = [key[0] for key in self.composedKeys]
 				gesture = MiniKeyInputGesture(composedKeys + liveKeys)
 
+			self.markLatency("handleKeys")
 			self.handleKeys(self.liveKeys, self.composedKeys, gesture)
 
 			if gesture is not None:
@@ -602,29 +1141,113 @@ class MainCadenceDisplayDriver(braille.BrailleDisplayDriver):
 
 			self.prevKeysDown = keysDown
 
-	# update screen size based on the current positions of connected devices
-	def updateScreenSize(self):
-		devPositions: list[DevPosition] = []
+		if latencyTracker is not None:
+			latencyTracker.drop()
+
+	# build a raw key report for a device, as if the given keys were held down (inverse of _hidOnReceive)
+	def buildKeyReport(self, devIndex: int, keys: list[tuple[MiniKey, DevSide]]) -> bytes:
+		device = self.devices[devIndex]
+		isTwoDevices = device.isTwoDevices()
+		report = bytearray(7 if isTwoDevices else 5)
+		rightKeyIndexes = {key: index for index, key in rightKeys.items()}
+		for key, side in keys:
+			# the upside-down and mirrored mappings are their own inverses
+			key = self.rotateKey(key, self.isUnitFlipped((devIndex, side)))
+			index = key.value
+			if side == DevSide.Right:
+				if not isTwoDevices and key in mirroredKeys:
+					index = mirroredKeys[key].value
+				index = rightKeyIndexes.get(MiniKey(index), index)
+			report[index // 8] |= 1 << (index % 8)
+		return bytes(report)
+
+	# record a stage of the key-to-pin latency path for the key report being handled (see LatencyProbe)
+	def markLatency(self, stage: str):
+		if self.latencyTracker is not None:
+			self.latencyTracker.mark(stage)
+
+	# start measuring key-to-pin latency of real key presses
+	def startLatencyTracking(self):
+		from brailleDisplayDrivers.lib.LatencyProbe import LatencyTracker
+		self.latencyTracker = LatencyTracker()
+
+	# stop measuring key-to-pin latency, returns the latency report
+	def stopLatencyTracking(self) -> str:
+		tracker = self.latencyTracker
+		self.latencyTracker = None
+		if tracker is None:
+			return ""
+		report = tracker.report()
+		log.info(report)
+		return report
+
+	# pins raised or lowered per second since the last call
+	# writes aren't counted until the first call, which starts counting and returns 0
+	def getPinChangeRate(self) -> float:
+		now = time.perf_counter()
+		rate = self.pinsChanged / max(now - self.pinsChangedSince, 1e-6) if self.countPinChanges else 0.0
+		self.countPinChanges = True
+		self.pinsChanged = 0
+		self.pinsChangedSince = now
+		return rate
+
+	# compact description of the current layout (screen size and the tile of every device side)
+	def getLayoutSignature(self) -> bytes:
+		signature = bytearray(struct.pack("<HH", self.numRows, self.numCols))
 		for device in self.devices:
-			for side in device.getSides():
-				devPositions.append(device.getPosition(side))
-
-		self.offsetCols = 0
-		self.offsetRows = 0
+			for unit in device.getUnits():
+				tile = self.layout.tiles.get(unit, Tile(0, 0, False))
+				signature += bytes([tile.x, tile.y, tile.flipped])
+		return bytes(signature)
+
+	# start recording raw key reports to a trace file (see InputTrace)
+	def startInputTrace(self, path: str):
+		self.stopInputTrace()
+		log.info(f"recording input trace to {path}")
+		from brailleDisplayDrivers.lib.InputTrace import InputTraceRecorder
+		self.inputTraceRecorder = InputTraceRecorder(path)
+
+	# stop recording raw key reports
+	def stopInputTrace(self):
+		recorder = self.inputTraceRecorder
+		if recorder is not None:
+			self.inputTraceRecorder = None
+			recorder.close()
+			log.info(f"input trace {recorder.path} closed after {recorder.numReports} reports")
+
+	# start recording the cells written to every device (see FrameRecorder)
+	def startFrameRecording(self, path: str):
+		self.stopFrameRecording()
+		log.info(f"recording frames to {path}")
+		from brailleDisplayDrivers.lib.FrameRecorder import FrameRecorder
+		self.frameRecorder = FrameRecorder(path)
+
+	# stop recording written cells
+	def stopFrameRecording(self):
+		recorder = self.frameRecorder
+		if recorder is not None:
+			self.frameRecorder = None
+			recorder.close()
+			log.info(f"frame recording {recorder.path} closed after {recorder.numFrames} frames ({recorder.numBytes} bytes)")
 
-		if (DevPosition.BottomLeft in devPositions or DevPosition.TopLeft in devPositions) and (DevPosition.BottomRight in devPositions or DevPosition.TopRight in devPositions):
-			self.numCols = 24
-		else:
-			if DevPosition.BottomRight in devPositions or DevPosition.TopRight in devPositions:
-				self.offsetCols = 12
-			self.numCols = 12
+	# cleanup on exit (called by NVDA)
+	def terminate(self):
+		core.post_windowMessageReceipt.unregister(self.handleWindowMessage)
+		self.stopFrameWriter()
+		with self.devicesLock:
+			if self.rescanTimer is not None:
+				self.rescanTimer.cancel()
+				self.rescanTimer = None
+		try:
+			super().terminate()
+		finally:
+			self.stopInputTrace()
+			self.stopFrameRecording()
 
-		if (DevPosition.BottomLeft in devPositions or DevPosition.BottomRight in devPositions) and (DevPosition.TopLeft in devPositions or DevPosition.TopRight in devPositions):
-			self.numRows = 8
-		else:
-			if DevPosition.BottomLeft in devPositions or DevPosition.BottomRight in devPositions:
-				self.offsetRows = 4
-			self.numRows = 4
+	# update screen size based on the current layout of connected devices
+	def updateScreenSize(self):
+		self.deviceRoutes = [self.layout.getRoute(device.getUnits()) for device in self.devices]
+		self.updateRegions()
 
 		log.info(f"## UPDATED SIZE {self.numRows} {self.numCols} {[device.isTwoDevices() for device in self.devices]}")
 
@@ -641,80 +1264,33 @@ class MainCadenceDisplayDriver(braille.BrailleDisplayDriver):
 		for device in self.devices:
 			device.setOneHanded(newOneHanded)
 
-	# get current device position for a device
-	def getDevPosition(self, device: tuple[int, DevSide]) -> DevPosition:
-		return self.devices[device[0]].getPosition(device[1])
-
 	# run after changing device positions to update screens
 	def afterDevicePositionsChanged(self):
 		self.updateScreenSize()
+		self.saveLayout()
+
+	# run after devices were added or removed to update screens
+	def afterDevicesChanged(self):
+		self.updateScreenSize()
+		self.saveLayout()
 
-	# move current device position by flipping it
+	# move current device position by flipping it, moving other devices as little as possible
 	def flipScreen(self, deviceID: tuple[int, DevSide], flipped: bool):
 		log.info(f"flipScreen {deviceID} {flipped}")
-		device = self.devices[deviceID[0]]
-		device.isFlipped[deviceID[1]] = flipped
-		newPosition = device.getPosition(deviceID[1])
-		for otherDevice in self.devices:
-			if otherDevice != device:
-				for otherDeviceSide in otherDevice.getSides():
-					otherDevicePos = otherDevice.getPosition(otherDeviceSide)
-					if otherDevicePos == newPosition:
-						otherDevice.isFlipped[otherDeviceSide] = not flipped
-		self.afterDevicePositionsChanged()
-
-	# cycle through possible device positions
+		with self.devicesLock:
+			unit = self.getUnit(deviceID)
+			layoutIndexes = [layoutIndex for layoutIndex, option in enumerate(self.layoutOptions) if option.isFlipped(unit) == flipped]
+			if len(layoutIndexes) == 0:
+				return
+			self.selectLayout(self.findClosestLayout(layoutIndexes))
+			self.afterDevicePositionsChanged()
+
+	# cycle through possible device positions (the options are found once when the devices change)
 	def cycleDevPositions(self):
-		# get all individual devices
-		deviceIds = [(devIndex, side) for devIndex, device in enumerate(self.devices) for side in device.getSides()]
-		# get number of lefts and rights
-		numLefts = len([(devIndex, side) for devIndex, side in deviceIds if side == DevSide.Left])
-		numRights = len([(devIndex, side) for devIndex, side in deviceIds if side == DevSide.Right])
-		# determine form factor(s)
-		if numLefts >= 2 and numRights >= 2:
-			forms = [set([DevPosition.BottomLeft, DevPosition.BottomRight, DevPosition.TopLeft, DevPosition.TopRight])]
-		elif numLefts >= 1 and numRights >= 1:
-			forms = [set([DevPosition.BottomLeft, DevPosition.BottomRight]), set([DevPosition.BottomLeft, DevPosition.TopLeft])]
-		elif numLefts >= 1:
-			forms = [set([DevPosition.BottomLeft])]
-		else:
-			forms = [set([DevPosition.BottomRight])]
-		# find all possible options
-		options: list[list[bool]] = []
-		for positions in itertools.product([True, False], repeat=len(deviceIds)):
-			if numLefts > 2 and numRights > 2:
-				# don't combine two tall duets into a quartet
-				devIndexFlipped = {}
-				isTall = False
-				for i in range(len(deviceIds)):
-					devIndex = deviceIds[i][0]
-					flipped = positions[i]
-					if devIndex in devIndexFlipped and devIndexFlipped[devIndex] != flipped:
-						isTall = True
-						break
-					devIndexFlipped[devIndex] = flipped
-				if isTall:
-					continue
-
-			currentForm = set([getDevicePosition(deviceIds[i][1], positions[i]) for i in range(len(deviceIds))])
-			if currentForm in forms:
-				options.append(list(positions))
-		# get current device positions
-		currentPositions = [self.devices[devIndex].isFlipped[side] for devIndex, side in deviceIds]
-		# find index of current device position in options
-		currentPositionI = -1
-		if currentPositions in options:
-			currentPositionI = options.index(currentPositions)
-		log.info(f"{deviceIds}, {numLefts}, {numRights}, {forms}, {options}, {currentPositions}, {currentPositionI}")
-		# get new device positions
-		newPositions = options[0] if currentPositionI + 1 >= len(options) else options[currentPositionI + 1]
-		# set new device positions
-		for i in range(len(deviceIds)):
-			devIndex, side = deviceIds[i]
-			flipped = newPositions[i]
-			self.devices[devIndex].isFlipped[side] = flipped
-		# update
-		self.afterDevicePositionsChanged()
+		with self.devicesLock:
+			self.selectLayout((self.layoutIndex + 1) % len(self.layoutOptions))
+			log.info(f"layout {self.layoutIndex + 1} of {len(self.layoutOptions)}: {self.layout}")
+			self.afterDevicePositionsChanged()
 
 	# handle keys
 	def handleKeys(self, liveKeysWithPosition: list[tuple[MiniKey, tuple[int, DevSide]]], composedKeysWithPosition: list[tuple[MiniKey, tuple[int, DevSide]]], gesture: MiniKeyInputGesture | None):
@@ -0,0 +1,203 @@
+import argparse
+import math
+import time
+from brailleDisplayDrivers.lib.DotImage import DOT_ASPECT_RATIO, dotsToCells
+
+# drawing of simple shapes and text straight into dots, for content that doesn't need to go through the screen
+# a canvas holds one byte per dot row by row (the layout SharedFramebuffer and DotImage.dotsToCells use)
+# coordinates are in dots from the top-left corner, shapes are clipped to the canvas
+
+# 3x5 tactile font, every glyph is 5 rows of 3 bits (leftmost dot is the highest bit)
+FONT_WIDTH = 3
+FONT_HEIGHT = 5
+FONT: dict[str, tuple[int, int, int, int, int]] = {
+	" ": (0b000, 0b000, 0b000, 0b000, 0b000),
+	"0": (0b111, 0b101, 0b101, 0b101, 0b111),
+	"1": (0b010, 0b110, 0b010, 0b010, 0b111),
+	"2": (0b111, 0b001, 0b111, 0b100, 0b111),
+	"3": (0b111, 0b001, 0b011, 0b001, 0b111),
+	"4": (0b101, 0b101, 0b111, 0b001, 0b001),
+	"5": (0b111, 0b100, 0b111, 0b001, 0b111),
+	"6": (0b111, 0b100, 0b111, 0b101, 0b111),
+	"7": (0b111, 0b001, 0b010, 0b010, 0b010),
+	"8": (0b111, 0b101, 0b111, 0b101, 0b111),
+	"9": (0b111, 0b101, 0b111, 0b001, 0b111),
+	"A": (0b010, 0b101, 0b111, 0b101, 0b101),
+	"B": (0b110, 0b101, 0b110, 0b101, 0b110),
+	"C": (0b011, 0b100, 0b100, 0b100, 0b011),
+	"D": (0b110, 0b101, 0b101, 0b101, 0b110),
+	"E": (0b111, 0b100, 0b110, 0b100, 0b111),
+	"F": (0b111, 0b100, 0b110, 0b100, 0b100),
+	"G": (0b011, 0b100, 0b101, 0b101, 0b011),
+	"H": (0b101, 0b101, 0b111, 0b101, 0b101),
+	"I": (0b111, 0b010, 0b010, 0b010, 0b111),
+	"J": (0b001, 0b001, 0b001, 0b101, 0b010),
+	"K": (0b101, 0b101, 0b110, 0b101, 0b101),
+	"L": (0b100, 0b100, 0b100, 0b100, 0b111),
+	"M": (0b101, 0b111, 0b111, 0b101, 0b101),
+	"N": (0b110, 0b101, 0b101, 0b101, 0b101),
+	"O": (0b010, 0b101, 0b101, 0b101, 0b010),
+	"P": (0b110, 0b101, 0b110, 0b100, 0b100),
+	"Q": (0b010, 0b101, 0b101, 0b110, 0b011),
+	"R": (0b110, 0b101, 0b110, 0b101, 0b101),
+	"S": (0b011, 0b100, 0b010, 0b001, 0b110),
+	"T": (0b111, 0b010, 0b010, 0b010, 0b010),
+	"U": (0b101, 0b101, 0b101, 0b101, 0b111),
+	"V": (0b101, 0b101, 0b101, 0b101, 0b010),
+	"W": (0b101, 0b101, 0b111, 0b111, 0b101),
+	"X": (0b101, 0b101, 0b010, 0b101, 0b101),
+	"Y": (0b101, 0b101, 0b010, 0b010, 0b010),
+	"Z": (0b111, 0b001, 0b010, 0b100, 0b111),
+	".": (0b000, 0b000, 0b000, 0b000, 0b010),
+	",": (0b000, 0b000, 0b000, 0b010, 0b100),
+	":": (0b000, 0b010, 0b000, 0b010, 0b000),
+	"-": (0b000, 0b000, 0b111, 0b000, 0b000),
+	"+": (0b000, 0b010, 0b111, 0b010, 0b000),
+	"/": (0b001, 0b001, 0b010, 0b100, 0b100),
+	"(": (0b010, 0b100, 0b100, 0b100, 0b010),
+	")": (0b010, 0b001, 0b001, 0b001, 0b010),
+	"%": (0b101, 0b001, 0b010, 0b100, 0b101),
+	"!": (0b010, 0b010, 0b010, 0b000, 0b010),
+	"?": (0b110, 0b001, 0b010, 0b000, 0b010),
+}
+# shown for characters missing from the font
+MISSING_GLYPH = (0b111, 0b101, 0b101, 0b101, 0b111)
+
+class DotCanvas():
+	def __init__(self, width: int, height: int, correctAspectRatio: bool = True):
+		self.width = width
+		self.height = height
+		self.dots = bytearray(width * height)
+		# vertical dots per horizontal dot of the same physical length, so circles come out round on the tablets
+		self.aspect = DOT_ASPECT_RATIO if correctAspectRatio else 1
+
+	# blank canvas the size of braille cells
+	@classmethod
+	def forCells(cls, numCols: int, numRows: int, correctAspectRatio: bool = True) -> "DotCanvas":
+		return cls(numCols * 2, numRows * 4, correctAspectRatio)
+
+	def clear(self):
+		self.dots[:] = bytes(len(self.dots))
+
+	def setDot(self, x: int, y: int, raised: bool = True):
+		if 0 <= x < self.width and 0 <= y < self.height:
+			self.dots[y * self.width + x] = raised
+
+	def getDot(self, x: int, y: int) -> bool:
+		return 0 <= x < self.width and 0 <= y < self.height and self.dots[y * self.width + x] != 0
+
+	# horizontal run of dots, clipped
+	def hline(self, x0: int, x1: int, y: int, raised: bool = True):
+		if y < 0 or y >= self.height:
+			return
+		x0, x1 = max(0, min(x0, x1)), min(self.width - 1, max(x0, x1))
+		if x0 <= x1:
+			start = y * self.width
+			self.dots[start + x0:start + x1 + 1] = bytes([raised]) * (x1 - x0 + 1)
+
+	def line(self, x0: int, y0: int, x1: int, y1: int, raised: bool = True):
+		if y0 == y1:
+			self.hline(x0, x1, y0, raised)
+			return
+		# Bresenham
+		dx = abs(x1 - x0)
+		dy = -abs(y1 - y0)
+		stepX = 1 if x0 < x1 else -1
+		stepY = 1 if y0 < y1 else -1
+		error = dx + dy
+		while True:
+			self.setDot(x0, y0, raised)
+			if x0 == x1 and y0 == y1:
+				return
+			doubled = 2 * error
+			if doubled >= dy:
+				error += dy
+				x0 += stepX
+			if doubled <= dx:
+				error += dx
+				y0 += stepY
+
+	def polyline(self, points: list[tuple[int, int]], closed: bool = False, raised: bool = True):
+		for (x0, y0), (x1, y1) in zip(points, points[1:]):
+			self.line(x0, y0, x1, y1, raised)
+		if closed and len(points) > 2:
+			self.line(*points[-1], *points[0], raised)
+
+	def rect(self, left: int, top: int, width: int, height: int, fill: bool = False, raised: bool = True):
+		if width <= 0 or height <= 0:
+			return
+		right = left + width - 1
+		bottom = top + height - 1
+		if fill:
+			for y in range(max(0, top), min(self.height, bottom + 1)):
+				self.hline(left, right, y, raised)
+			return
+		self.hline(left, right, top, raised)
+		self.hline(left, right, bottom, raised)
+		self.line(left, top, left, bottom, raised)
+		self.line(right, top, right, bottom, raised)
+
+	# circle of a radius in horizontal dots, stretched vertically by the dot aspect ratio
+	def circle(self, centerX: float, centerY: float, radius: float, fill: bool = False, raised: bool = True):
+		radiusY = radius * self.aspect
+		top = max(0, math.ceil(centerY - radiusY))
+		bottom = min(self.height - 1, math.floor(centerY + radiusY))
+		previous: tuple[int, int] | None = None
+		for y in range(top, bottom + 1):
+			halfWidth = radius * math.sqrt(max(0, 1 - ((y - centerY) / radiusY) ** 2))
+			x0 = round(centerX - halfWidth)
+			x1 = round(centerX + halfWidth)
+			if fill:
+				self.hline(x0, x1, y, raised)
+			else:
+				# join to the previous row so steep parts of the outline have no gaps
+				if previous is None or y == bottom:
+					self.hline(x0, x1, y, raised)
+				else:
+					self.hline(min(x0, previous[0]), max(x0, previous[0]), y, raised)
+					self.hline(min(x1, previous[1]), max(x1, previous[1]), y, raised)
+				previous = (x0, x1)
+
+	# text in the 3x5 font with a blank column between characters, returns the x after the last character
+	def text(self, x: int, y: int, text: str, raised: bool = True) -> int:
+		for char in text.upper():
+			glyph = FONT.get(char, MISSING_GLYPH)
+			for row, bits in enumerate(glyph):
+				for column in range(FONT_WIDTH):
+					if bits & (1 << (FONT_WIDTH - 1 - column)):
+						self.setDot(x + column, y + row, raised)
+			x += FONT_WIDTH + 1
+		return x
+
+	def toCells(self) -> bytes:
+		return dotsToCells(self.dots, self.width, self.height)
+
+	# cells with the raised dots of this canvas added, such as a focus rectangle over a captured image
+	def overlayCells(self, cells) -> bytes:
+		overlay = self.toCells()
+		if len(cells) != len(overlay):
+			raise ValueError(f"canvas has {len(overlay)} cells, got {len(cells)}")
+		return (int.from_bytes(bytes(cells), "little") | int.from_bytes(overlay, "little")).to_bytes(len(overlay), "little")
+
+if __name__ == "__main__":
+	from brailleDisplayDrivers.lib.FrameRecorder import cellsToText
+	parser = argparse.ArgumentParser(description="time redrawing a canvas of shapes and text (run from the add-on root with python -m)")
+	parser.add_argument("--cols", type=int, default=24, help="cells per row (24 for a quartet)")
+	parser.add_argument("--rows", type=int, default=8, help="rows of cells (8 for a quartet)")
+	parser.add_argument("--iterations", type=int, default=200)
+	parser.add_argument("--print", action="store_true", help="print the last frame")
+	args = parser.parse_args()
+	canvas = DotCanvas.forCells(args.cols, args.rows)
+	start = time.perf_counter()
+	for i in range(args.iterations):
+		canvas.clear()
+		canvas.rect(0, 0, canvas.width, canvas.height)
+		canvas.line(2, canvas.height - 3, canvas.width - 3, 2)
+		canvas.circle(canvas.width / 2, canvas.height / 2, canvas.height / 4 + i % 4)
+		canvas.polyline([(4, 4), (10, 12), (16, 6), (22, 14)])
+		canvas.text(3, canvas.height - 8, f"T{i % 100}")
+		cells = canvas.toCells()
+	elapsed = time.perf_counter() - start
+	print(f"{elapsed / args.iterations * 1000:.3f}ms per frame ({args.iterations / elapsed:.0f} frames per second)")
+	if args.print:
+		print(cellsToText(cells, args.cols))
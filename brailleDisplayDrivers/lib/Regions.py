@@ -0,0 +1,82 @@
+from typing import NamedTuple
+from brailleDisplayDrivers.lib.TileLayout import TileLayout, TILE_ROWS
+
+# the screen of a layout is split into horizontal bands of tile rows, each showing one source (see FrameRecorder.FRAME_SOURCES)
+# every region keeps its own cells and is written to the devices it covers independently of the other regions
+class Region():
+	def __init__(self, source: str, top: int, height: int, numCols: int, minInterval: float = 0):
+		self.source = source
+		# first tile row and number of tile rows
+		self.top = top
+		self.height = height
+		self.numRows = height * TILE_ROWS
+		self.numCols = numCols
+		self.numCells = self.numRows * self.numCols
+		# position of the region in the cells of the full screen
+		self.start = top * TILE_ROWS * numCols
+		self.stop = self.start + self.numCells
+		# refresh policy: updates arriving sooner than this after the last write are merged into a single write
+		self.minInterval = minInterval
+		self.cells: bytes | None = None
+		self.dirty = False
+		# cells changed since the last write (start and stop, relative to the region)
+		self.dirtyStart = 0
+		self.dirtyStop = 0
+		self.lastFlushTime = 0.0
+		# indexes of the devices showing part of this region
+		self.devIndexes: list[int] = []
+
+	def __repr__(self):
+		return f"Region({self.source} rows {self.top}-{self.top + self.height - 1})"
+
+	# store new cells (of the size of the region), returns whether they differ from the current ones
+	def update(self, cells: bytes) -> bool:
+		if len(cells) != self.numCells:
+			raise ValueError(f"{self} has {self.numCells} cells, got {len(cells)}")
+		if cells == self.cells:
+			return False
+		start, stop = changedSpan(self.cells, cells) if self.cells is not None else (0, self.numCells)
+		if self.dirty:
+			start = min(start, self.dirtyStart)
+			stop = max(stop, self.dirtyStop)
+		self.cells = cells
+		self.dirty = True
+		self.dirtyStart = start
+		self.dirtyStop = stop
+		return True
+
+# cells for a region, built against one version of the layout and never changed afterwards
+# frames are handed from the threads producing them to the single thread writing them (see MainCadenceDisplayDriver.runFrameWriter)
+# producers note the layout version before they start building, a frame of another version or size is dropped, never fitted
+class Frame(NamedTuple):
+	source: str
+	layoutVersion: int
+	cells: bytes
+	# latency traces of the updates merged into this frame (see LatencyProbe)
+	traces: tuple
+
+# first and last + 1 index where two different cell strings of the same length differ
+# the cells are xor-ed as big integers, so finding a blinking cursor doesn't loop over every cell in python
+def changedSpan(old: bytes, new: bytes) -> tuple[int, int]:
+	difference = int.from_bytes(old, "little") ^ int.from_bytes(new, "little")
+	return (((difference & -difference).bit_length() - 1) // 8, (difference.bit_length() + 7) // 8)
+
+# split a layout into one region per source, top to bottom
+# tile rows are shared out evenly (earlier sources get the remainder), sources that don't get a tile row are left out
+def splitRegions(layout: TileLayout, sources: list[str], minIntervals: dict[str, float] | None = None) -> list[Region]:
+	sources = sources[:layout.heightTiles]
+	regions: list[Region] = []
+	top = 0
+	for i, source in enumerate(sources):
+		height = layout.heightTiles // len(sources) + (1 if i < layout.heightTiles % len(sources) else 0)
+		regions.append(Region(source, top, height, layout.numCols, (minIntervals or {}).get(source, 0)))
+		top += height
+	return regions
+
+# the devices of devIndexes that show any of the screen cells from start to stop
+def findSpanDevices(devIndexes: list[int], deviceRoutes: list[list[tuple[int, int, bool]]], start: int, stop: int) -> list[int]:
+	return [devIndex for devIndex in devIndexes if any(routeStart < stop and start < routeStop for routeStart, routeStop, flipped in deviceRoutes[devIndex])]
+
+# indexes of the devices whose routes (see TileLayout.getRoute) take cells from a region
+def findRegionDevices(region: Region, deviceRoutes: list[list[tuple[int, int, bool]]]) -> list[int]:
+	return [devIndex for devIndex, route in enumerate(deviceRoutes) if any(region.start <= start < region.stop for start, stop, flipped in route)]
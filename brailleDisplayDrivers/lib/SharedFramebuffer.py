@@ -0,0 +1,209 @@
+import argparse
+import ctypes
+import math
+import mmap
+import struct
+import time
+from brailleDisplayDrivers.lib.DotImage import dotsToCells
+
+# a named shared memory framebuffer, so other processes can draw on the image region of the tablets directly
+# the driver owns it (SharedFramebuffer), external programs open it with FramebufferProducer
+# memory layout: header, then one byte per dot (row by row, nonzero is raised) at DOTS_OFFSET
+# signaling goes through two auto-reset events named after the framebuffer:
+#   <name>.frame is set by the producer after publishing a frame
+#   <name>.layout is set by the driver after the size of the image region changed
+# a producer draws the dots, then publishes the layout version it drew for followed by a new frame sequence number
+# frames drawn for an older layout are not shown
+# the dots are guarded by a seqlock: the draw counter is odd while the producer draws and even once it published
+# the driver only keeps cells packed while the counter stayed at the same even value, so it never shows a half drawn frame
+DEFAULT_FRAMEBUFFER_NAME = "Local\\CadenceFramebuffer"
+FRAMEBUFFER_MAGIC = b"CDFB"
+FRAMEBUFFER_VERSION = 2
+
+# magic, version, layout version, width and height in dots, frame sequence number, layout version of the frame, shown sequence number, draw counter
+headerStruct = struct.Struct("<4sIIHHIIII")
+uintStruct = struct.Struct("<I")
+sizeStruct = struct.Struct("<HH")
+LAYOUT_VERSION_OFFSET = 8
+SIZE_OFFSET = 12
+FRAME_SEQ_OFFSET = 16
+FRAME_LAYOUT_VERSION_OFFSET = 20
+SHOWN_SEQ_OFFSET = 24
+DRAW_SEQ_OFFSET = 28
+DOTS_OFFSET = 32
+# times the driver packs a frame again because the producer drew meanwhile, before waiting for the next frame
+MAX_READ_ATTEMPTS = 4
+# largest number of dots, the mapping is allocated once at this size
+MAX_DOTS = 256 * 1024
+
+WAIT_OBJECT_0 = 0
+
+# event handles through kernel32, the event is created if it doesn't exist yet
+def openEvent(name: str) -> int:
+	kernel32 = ctypes.windll.kernel32
+	kernel32.CreateEventW.restype = ctypes.c_void_p
+	handle = kernel32.CreateEventW(None, False, False, name)
+	if not handle:
+		raise ctypes.WinError()
+	return handle
+
+def setEvent(handle: int):
+	ctypes.windll.kernel32.SetEvent(ctypes.c_void_p(handle))
+
+# wait for an event to be set, returns False on timeout
+def waitEvent(handle: int, timeout: float) -> bool:
+	return ctypes.windll.kernel32.WaitForSingleObject(ctypes.c_void_p(handle), int(timeout * 1000)) == WAIT_OBJECT_0
+
+def closeEvent(handle: int):
+	ctypes.windll.kernel32.CloseHandle(ctypes.c_void_p(handle))
+
+# state and signaling shared by both ends
+class FramebufferMapping():
+	def __init__(self, name: str):
+		self.name = name
+		self.memory = mmap.mmap(-1, DOTS_OFFSET + MAX_DOTS, tagname=name)
+		self.frameEvent = openEvent(name + ".frame")
+		self.layoutEvent = openEvent(name + ".layout")
+
+	def readUint(self, offset: int) -> int:
+		return uintStruct.unpack_from(self.memory, offset)[0]
+
+	def writeUint(self, offset: int, value: int):
+		uintStruct.pack_into(self.memory, offset, value & 0xFFFFFFFF)
+
+	# width and height of the image region in dots
+	def getSize(self) -> tuple[int, int]:
+		return sizeStruct.unpack_from(self.memory, SIZE_OFFSET)
+
+	def getLayoutVersion(self) -> int:
+		return self.readUint(LAYOUT_VERSION_OFFSET)
+
+	def close(self):
+		if self.memory is not None:
+			closeEvent(self.frameEvent)
+			closeEvent(self.layoutEvent)
+			self.memory.close()
+			self.memory = None
+
+# the driver's end
+class SharedFramebuffer(FramebufferMapping):
+	def __init__(self, name: str = DEFAULT_FRAMEBUFFER_NAME):
+		super().__init__(name)
+		headerStruct.pack_into(self.memory, 0, FRAMEBUFFER_MAGIC, FRAMEBUFFER_VERSION, 0, 0, 0, 0, 0, 0, 0)
+
+	# report a new size of the image region to the producer
+	def setSize(self, width: int, height: int):
+		if (width, height) == self.getSize():
+			return
+		if width * height > MAX_DOTS:
+			width = 0
+			height = 0
+		sizeStruct.pack_into(self.memory, SIZE_OFFSET, width, height)
+		self.writeUint(LAYOUT_VERSION_OFFSET, self.getLayoutVersion() + 1)
+		setEvent(self.layoutEvent)
+
+	def waitForFrame(self, timeout: float) -> bool:
+		return waitEvent(self.frameEvent, timeout)
+
+	# cells of the newest frame, or None if it was already shown (unless force), was drawn for another layout
+	# or is being drawn over (the producer publishes the next frame when it is done, which signals the frame event again)
+	# packing runs straight from the shared memory, and is repeated if the producer drew meanwhile (the newest frame wins)
+	def readCells(self, force: bool = False) -> bytes | None:
+		for attempt in range(MAX_READ_ATTEMPTS):
+			drawSeq = self.readUint(DRAW_SEQ_OFFSET)
+			if drawSeq % 2 == 1:
+				return None
+			seq = self.readUint(FRAME_SEQ_OFFSET)
+			if seq == 0 or (seq == self.readUint(SHOWN_SEQ_OFFSET) and not force):
+				return None
+			if self.readUint(FRAME_LAYOUT_VERSION_OFFSET) != self.getLayoutVersion():
+				return None
+			width, height = self.getSize()
+			cells = dotsToCells(self.memory, width, height, DOTS_OFFSET)
+			if self.readUint(DRAW_SEQ_OFFSET) == drawSeq:
+				self.writeUint(SHOWN_SEQ_OFFSET, seq)
+				return cells
+		return None
+
+# the end of an external program drawing to the tablets
+class FramebufferProducer(FramebufferMapping):
+	def __init__(self, name: str = DEFAULT_FRAMEBUFFER_NAME):
+		super().__init__(name)
+		magic, version = headerStruct.unpack_from(self.memory, 0)[:2]
+		if magic != FRAMEBUFFER_MAGIC or version != FRAMEBUFFER_VERSION:
+			self.close()
+			raise ValueError(f"no Cadence framebuffer named {name} (start it with display.startFramebuffer())")
+		# layout version the dots are being drawn for
+		self.drawLayoutVersion = self.getLayoutVersion()
+
+	# wait until the driver reports a new size, returns False on timeout
+	def waitForLayoutChange(self, timeout: float) -> bool:
+		return waitEvent(self.layoutEvent, timeout)
+
+	# make the draw counter odd before the first dot of a frame changes
+	def beginDrawing(self):
+		drawSeq = self.readUint(DRAW_SEQ_OFFSET)
+		if drawSeq % 2 == 0:
+			self.writeUint(DRAW_SEQ_OFFSET, drawSeq + 1)
+
+	# replace all dots (one byte per dot, width * height bytes)
+	def setDots(self, dots: bytes):
+		self.drawLayoutVersion = self.getLayoutVersion()
+		width, height = self.getSize()
+		if len(dots) != width * height:
+			raise ValueError(f"expected {width * height} dots for {width}x{height}, got {len(dots)}")
+		self.beginDrawing()
+		self.memory[DOTS_OFFSET:DOTS_OFFSET + len(dots)] = dots
+
+	def setDot(self, x: int, y: int, raised: bool):
+		self.drawLayoutVersion = self.getLayoutVersion()
+		width, height = self.getSize()
+		if 0 <= x < width and 0 <= y < height:
+			self.beginDrawing()
+			self.memory[DOTS_OFFSET + y * width + x] = 1 if raised else 0
+
+	# show the dots drawn so far, returns the sequence number of the frame
+	# the frame fields are written before the draw counter turns even again, so the driver sees them together with the dots
+	def publish(self) -> int:
+		self.writeUint(FRAME_LAYOUT_VERSION_OFFSET, self.drawLayoutVersion)
+		seq = (self.readUint(FRAME_SEQ_OFFSET) + 1) & 0xFFFFFFFF or 1
+		self.writeUint(FRAME_SEQ_OFFSET, seq)
+		drawSeq = self.readUint(DRAW_SEQ_OFFSET)
+		if drawSeq % 2 == 1:
+			self.writeUint(DRAW_SEQ_OFFSET, drawSeq + 1)
+		setEvent(self.frameEvent)
+		return seq
+
+	# whether the driver has shown the newest published frame
+	def isShown(self) -> bool:
+		return self.readUint(SHOWN_SEQ_OFFSET) == self.readUint(FRAME_SEQ_OFFSET)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="draw a moving ball through the framebuffer of a running driver (run from the add-on root with python -m)")
+	parser.add_argument("--name", default=DEFAULT_FRAMEBUFFER_NAME)
+	parser.add_argument("--fps", type=float, default=20)
+	args = parser.parse_args()
+	producer = FramebufferProducer(args.name)
+	start = time.perf_counter()
+	frames = 0
+	try:
+		while True:
+			if producer.waitForLayoutChange(0):
+				print(f"layout changed to {producer.getSize()}")
+			width, height = producer.getSize()
+			t = time.perf_counter() - start
+			ballX = (math.sin(t) + 1) / 2 * width
+			ballY = (math.cos(t * 1.3) + 1) / 2 * height
+			radius = max(2, height / 4)
+			try:
+				producer.setDots(bytes(1 if math.hypot(x - ballX, y - ballY) < radius else 0 for y in range(height) for x in range(width)))
+			except ValueError:
+				# the size changed while drawing
+				continue
+			producer.publish()
+			frames += 1
+			time.sleep(1 / args.fps)
+	except KeyboardInterrupt:
+		print(f"{frames} frames published")
+	finally:
+		producer.close()
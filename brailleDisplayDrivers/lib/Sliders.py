@@ -135,6 +135,25 @@ class Slider():
 
 		self.signal.set(n)
 
+	# move by a fraction of a single increase (negative to decrease), used for continuous motion
+	def step(self, fraction: float):
+		n = self.get()
+
+		if (self.sliderExp):
+			n = n * math.pow(self.getRate(), fraction)
+		elif (self.sliderSCurve):
+			n = self.rateSCurve(n, self.getRate() * fraction, self.min.get(), self.max.get())
+		else:
+			n = n + self.getRateMinQuantize() * fraction
+
+		if (self.strictMinMax):
+			if (n < self.min.get()): n = self.min.get()
+			if (n > self.max.get()): n = self.max.get()
+
+		n = self.roundValue(n)
+
+		self.signal.set(n)
+
 	def reset(self):
 		self.signal.reset()
 		self.rate.reset()
@@ -184,6 +203,10 @@ class CombinedSlider():
 		for slider in self.sliders:
 			slider.decrease()
 
+	def step(self, fraction: float):
+		for slider in self.sliders:
+			slider.step(fraction)
+
 	def increaseRate(self):
 		for slider in self.sliders:
 			slider.increaseRate()
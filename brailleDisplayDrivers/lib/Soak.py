@@ -0,0 +1,262 @@
+import ctypes
+import gc
+import threading
+import time
+import tracemalloc
+import queueHandler
+from logHandler import log
+from brailleDisplayDrivers.lib.CadenceDisplayDriverWithImage import CadenceDisplayDriverWithImage
+from brailleDisplayDrivers.lib.Capture import SyntheticCaptureBackend, generatePattern
+from brailleDisplayDrivers.lib.MainCadenceDisplayDriver import DevSide
+
+# long running stress test of image mode, for finding leaks that only show after hours of use
+# a driver with stand-in tablets refreshes a synthetic screen as fast as it can while image mode is toggled
+# and the layout is cycled, and memory, threads, objects and GDI handles are sampled over time
+# run from the NVDA Python console (it needs NVDA's main thread to be free, so it runs on its own thread):
+#   from brailleDisplayDrivers.lib import Soak; Soak.startSoak(hours=4)
+
+# seconds between image refreshes, image mode toggles, layout changes, screen changes and samples
+SOAK_TICK = 0.02
+SOAK_TOGGLE_INTERVAL = 5
+SOAK_LAYOUT_INTERVAL = 7
+SOAK_SCREEN_INTERVAL = 1
+SOAK_SAMPLE_INTERVAL = 60
+# caches (image cache, frame history, located objects) fill up during the warmup, growth is measured from its end
+SOAK_WARMUP = 120
+SOAK_SCREEN_SIZE = (1920, 1080)
+# how long a write to a stand-in tablet takes, about as long as a HID write
+STAND_IN_WRITE_DELAY = 0.002
+# main thread calls that take longer than this are counted as stalls
+MAIN_THREAD_TIMEOUT = 5
+
+# largest allowed growth between the end of the warmup and the end of the run
+DEFAULT_BUDGETS = {
+	"heapBytes": 8 * 1024 * 1024,
+	"threads": 2,
+	"objects": 50000,
+	"gdiHandles": 20,
+}
+
+GR_GDIOBJECTS = 0
+
+# a tablet half that only remembers what was written to it
+class StandInDevice():
+	def __init__(self, devName: str, isRight: bool, devIndex: int, writeDelay: float = STAND_IN_WRITE_DELAY):
+		self.devName = devName
+		self.isRight = isRight
+		self.devIndex = devIndex
+		self.devicePath = f"stand-in:{devName}"
+		self.tabletID = self.devicePath
+		self.writeDelay = writeDelay
+		self.numCells = 48
+		self.nextCells = bytearray(self.numCells)
+		self.lastCells: bytearray | None = None
+		self.failed = False
+		self.fallback = None
+		self.primary = None
+		self.isOneHanded: bool | None = None
+		self.numWrites = 0
+
+	def writeCells(self):
+		if self.writeDelay > 0:
+			time.sleep(self.writeDelay)
+		if self.lastCells is None:
+			self.lastCells = bytearray(self.nextCells)
+		else:
+			self.lastCells[:] = self.nextCells
+		self.numWrites += 1
+
+	def display(self, cells: list[int]):
+		self.nextCells[:] = bytes(cells[:self.numCells]).ljust(self.numCells, b"\0")
+		self.writeCells()
+
+	def isTwoDevices(self):
+		return False
+
+	def getSides(self) -> list[DevSide]:
+		return [DevSide.Right if self.isRight else DevSide.Left]
+
+	def getUnits(self) -> list[tuple[str, DevSide]]:
+		return [(self.tabletID, side) for side in self.getSides()]
+
+	def setOneHanded(self, newOneHanded: bool):
+		self.isOneHanded = newOneHanded
+
+	def promoteFallback(self):
+		return None
+
+	def terminate(self):
+		pass
+
+# image mode driver on stand-in tablets (lefts and rights alternate, so four of them make a quartet)
+class SoakDisplayDriver(CadenceDisplayDriverWithImage):
+	def __init__(self, numDevices: int = 4):
+		self.numStandIns = numDevices
+		super().__init__(None)
+
+	def findDeviceMatches(self) -> list[list]:
+		return [[f"soak{i}"] for i in range(self.numStandIns)]
+
+	def openDevices(self, matchGroups: list[list], firstIndex: int = 0, raiseErrors: bool = True) -> list[StandInDevice]:
+		return [StandInDevice(group[0], i % 2 == 1, firstIndex + i) for i, group in enumerate(matchGroups)]
+
+	# layouts of stand-in tablets aren't worth remembering
+	def saveLayout(self):
+		pass
+
+# resource usage at one point of the run
+class SoakSample():
+	def __init__(self, t: float):
+		gc.collect()
+		self.time = t
+		self.heapBytes = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+		self.threads = threading.active_count()
+		self.objects = len(gc.get_objects())
+		self.gdiHandles = getGdiHandleCount()
+
+	def __repr__(self):
+		return f"{self.time:.0f}s: heap {self.heapBytes / 1024:.0f}KB, {self.threads} threads, {self.objects} objects, {self.gdiHandles} GDI handles"
+
+# GDI objects of this process (None where they can't be counted)
+def getGdiHandleCount() -> int | None:
+	try:
+		return ctypes.windll.user32.GetGuiResources(ctypes.windll.kernel32.GetCurrentProcess(), GR_GDIOBJECTS)
+	except (AttributeError, OSError):
+		return None
+
+class SoakResult():
+	def __init__(self, samples: list[SoakSample], baseline: SoakSample, final: SoakSample, afterTerminate: SoakSample, start: SoakSample, budgets: dict[str, float], stats: dict[str, float]):
+		self.samples = samples
+		self.stats = stats
+		self.growth: dict[str, float] = {}
+		self.failures: list[str] = []
+		for name, budget in budgets.items():
+			before = getattr(baseline, name)
+			after = getattr(final, name)
+			if before is None or after is None:
+				continue
+			self.growth[name] = after - before
+			if after - before > budget:
+				self.failures.append(f"{name} grew by {after - before} (budget {budget})")
+		# everything the driver started has to be gone once it is terminated
+		if afterTerminate.threads > start.threads:
+			self.failures.append(f"{afterTerminate.threads - start.threads} threads left after terminate")
+		self.afterTerminate = afterTerminate
+
+	def report(self) -> str:
+		lines = ["soak " + ("failed" if len(self.failures) > 0 else "passed")]
+		lines += [f"  {sample}" for sample in self.samples]
+		lines.append(f"  after terminate: {self.afterTerminate}")
+		lines += [f"  {name} growth: {value}" for name, value in self.growth.items()]
+		lines += [f"  {name}: {value}" for name, value in self.stats.items()]
+		lines += [f"  FAIL {failure}" for failure in self.failures]
+		return "\n".join(lines)
+
+# run func on NVDA's main thread and wait for it, returns False if it didn't finish in time
+def callOnMainThread(func, timeout: float = MAIN_THREAD_TIMEOUT) -> bool:
+	done = threading.Event()
+	def run():
+		try:
+			func()
+		finally:
+			done.set()
+	queueHandler.queueFunction(queueHandler.eventQueue, run, _immediate=True)
+	return done.wait(timeout)
+
+# drive a SoakDisplayDriver for a while, raises RuntimeError if resource usage grew past the budgets
+# growth is measured from the end of the warmup, so the run has to last longer than it
+def runSoak(duration: float, numDevices: int = 4, budgets: dict[str, float] | None = None, warmup: float = SOAK_WARMUP, sampleInterval: float = SOAK_SAMPLE_INTERVAL) -> SoakResult:
+	if duration <= warmup:
+		raise ValueError(f"soak of {duration}s doesn't last past its warmup of {warmup}s")
+	budgets = DEFAULT_BUDGETS | (budgets or {})
+	startedTracing = not tracemalloc.is_tracing()
+	if startedTracing:
+		tracemalloc.start()
+	screens = [generatePattern(pattern, *SOAK_SCREEN_SIZE) for pattern in ("circles", "checkerboard")]
+	try:
+		start = SoakSample(0)
+		driver = SoakDisplayDriver(numDevices)
+		stats = {"refreshes": 0, "toggles": 0, "layoutChanges": 0, "mainThreadStalls": 0}
+		try:
+			backend = SyntheticCaptureBackend(*SOAK_SCREEN_SIZE, screens[0])
+			driver.setCaptureBackend(backend)
+			driver.ensureImageState()
+			driver.followFocus = False
+			driver.reset(0, 0, *SOAK_SCREEN_SIZE)
+			callOnMainThread(driver.doToggleImage)
+			# text keeps arriving from NVDA while the image refreshes (NVDA writes as many cells as the driver has)
+			def refresh(text: bytes):
+				numCells = driver.numRows * driver.numCols
+				driver.display(list((text * (numCells // len(text) + 1))[:numCells]))
+				driver.actuallyDisplayImage()
+			startTime = time.perf_counter()
+			samples: list[SoakSample] = []
+			baseline: SoakSample | None = None
+			nextSample = startTime + warmup
+			nextToggle = startTime + SOAK_TOGGLE_INTERVAL
+			nextLayout = startTime + SOAK_LAYOUT_INTERVAL
+			nextScreen = startTime + SOAK_SCREEN_INTERVAL
+			screenI = 0
+			text = bytes(range(1, 49))
+			while True:
+				now = time.perf_counter()
+				if now - startTime >= duration:
+					break
+				if now >= nextScreen:
+					screenI = (screenI + 1) % len(screens)
+					backend.setScreen(*SOAK_SCREEN_SIZE, screens[screenI])
+					nextScreen = now + SOAK_SCREEN_INTERVAL
+				if now >= nextToggle:
+					# image mode has to be left on for the rest of the run, so toggle twice
+					for i in range(2):
+						if not callOnMainThread(driver.doToggleImage):
+							stats["mainThreadStalls"] += 1
+					stats["toggles"] += 1
+					nextToggle = now + SOAK_TOGGLE_INTERVAL
+				if now >= nextLayout:
+					if not callOnMainThread(driver.cycleDevPositions):
+						stats["mainThreadStalls"] += 1
+					stats["layoutChanges"] += 1
+					nextLayout = now + SOAK_LAYOUT_INTERVAL
+				if now >= nextSample:
+					sample = SoakSample(now - startTime)
+					samples.append(sample)
+					log.info(f"soak {sample}")
+					if baseline is None:
+						baseline = sample
+					nextSample = now + sampleInterval
+				text = text[1:] + text[:1]
+				if not callOnMainThread(lambda: refresh(text)):
+					stats["mainThreadStalls"] += 1
+				stats["refreshes"] += 1
+				time.sleep(SOAK_TICK)
+			final = SoakSample(time.perf_counter() - startTime)
+			samples.append(final)
+			stats["deviceWrites"] = sum(device.numWrites for device in driver.devices)
+		finally:
+			callOnMainThread(driver.terminate)
+		# timers and threads of the driver may take a moment to finish
+		time.sleep(1)
+		afterTerminate = SoakSample(time.perf_counter() - startTime)
+		# a stalled main thread can keep the loop from ever sampling the end of the warmup
+		if baseline is None:
+			raise RuntimeError(f"soak ended before the end of its warmup was sampled ({stats})")
+		result = SoakResult(samples, baseline, final, afterTerminate, start, budgets, stats)
+	finally:
+		if startedTracing:
+			tracemalloc.stop()
+	log.info(result.report())
+	if len(result.failures) > 0:
+		raise RuntimeError(result.report())
+	return result
+
+# run a soak in the background, the result is logged
+def startSoak(hours: float = 1, numDevices: int = 4, budgets: dict[str, float] | None = None) -> threading.Thread:
+	def run():
+		try:
+			runSoak(hours * 3600, numDevices, budgets)
+		except Exception as e:
+			log.error(f"soak: {e}")
+	thread = threading.Thread(target=run, name="CadenceSoak", daemon=True)
+	thread.start()
+	return thread
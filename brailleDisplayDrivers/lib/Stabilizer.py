@@ -0,0 +1,44 @@
+# temporal hysteresis for image mode: keeps dots near the black and white threshold from flickering between refreshes
+# every flicker is a pin actuation, so stable dots mean fewer and faster writes (unchanged cells are never written)
+# deadBand: values this close to the threshold keep the previous state
+# minFrames: a dot only changes after its new state was seen in this many consecutive frames
+class DotStabilizer():
+	def __init__(self, deadBand: float = 0, minFrames: int = 1):
+		self.deadBand = deadBand
+		self.minFrames = minFrames
+		self.key: tuple | None = None
+		self.state = bytearray()
+		self.pending = bytearray()
+		# no previous state to compare with yet
+		self.fresh = True
+
+	def isActive(self) -> bool:
+		return self.deadBand > 0 or self.minFrames > 1
+
+	# start over if the frame doesn't show the same view as the previous one (the key identifies the view)
+	def begin(self, key: tuple, numDots: int):
+		if key != self.key or len(self.state) != numDots:
+			self.key = key
+			self.state = bytearray(numDots)
+			self.pending = bytearray(numDots)
+			self.fresh = True
+		else:
+			self.fresh = False
+
+	# stable state of a dot, given its value and whether it is above / below the threshold in this frame
+	def decide(self, index: int, value: float, threshold: float, isOn: bool) -> bool:
+		if self.fresh:
+			self.state[index] = isOn
+			return isOn
+		previous = self.state[index] == 1
+		if isOn != previous and abs(value - threshold) <= self.deadBand:
+			isOn = previous
+		if isOn == previous:
+			self.pending[index] = 0
+			return previous
+		self.pending[index] = min(255, self.pending[index] + 1)
+		if self.pending[index] < self.minFrames:
+			return previous
+		self.pending[index] = 0
+		self.state[index] = isOn
+		return isOn
@@ -0,0 +1,126 @@
+import itertools
+import math
+from typing import Hashable, NamedTuple
+from brailleDisplayDrivers.lib.DotImage import ROTATED_CELLS
+
+# layout of any number of half-tablets (12x4 cells each) in a grid
+# every half-tablet (a "unit") is a tile at a grid position, either upright or rotated 180 degrees
+TILE_COLS = 12
+TILE_ROWS = 4
+
+# layouts with proportions closest to this (width / height in dots) are offered first, like the wide duet and the quartet
+PREFERRED_ASPECT = 2
+# maximum number of arrangements generated per grid shape (walls of many tablets have too many to cycle through anyway)
+MAX_OPTIONS_PER_SHAPE = 256
+
+# position of a unit in the grid
+class Tile(NamedTuple):
+	x: int
+	y: int
+	flipped: bool
+
+# whether a unit may sit at a grid position
+# the bottom row is upright and rows alternate going up; upright left units sit in even columns and right units in odd columns
+# rotating a unit 180 degrees swaps which columns it fits in
+def tileFlipped(y: int, height: int) -> bool:
+	return (height - 1 - y) % 2 == 1
+
+def tileFits(isRight: bool, x: int, flipped: bool) -> bool:
+	return (x % 2 == 1) == (isRight != flipped)
+
+class TileLayout():
+	def __init__(self, tiles: dict[Hashable, Tile]):
+		# move the layout to the top-left corner
+		minX = min((tile.x for tile in tiles.values()), default=0)
+		minY = min((tile.y for tile in tiles.values()), default=0)
+		self.tiles = {unit: Tile(tile.x - minX, tile.y - minY, tile.flipped) for unit, tile in tiles.items()}
+		self.widthTiles = max((tile.x + 1 for tile in self.tiles.values()), default=1)
+		self.heightTiles = max((tile.y + 1 for tile in self.tiles.values()), default=1)
+		self.numCols = self.widthTiles * TILE_COLS
+		self.numRows = self.heightTiles * TILE_ROWS
+		self.key = frozenset(self.tiles.items())
+
+	def __eq__(self, other):
+		return isinstance(other, TileLayout) and self.key == other.key
+
+	def __hash__(self):
+		return hash(self.key)
+
+	def __repr__(self):
+		return f"TileLayout({self.widthTiles}x{self.heightTiles} {self.tiles})"
+
+	def isFlipped(self, unit: Hashable) -> bool:
+		tile = self.tiles.get(unit)
+		return tile is not None and tile.flipped
+
+	# slices of the full cells (row-major, numCols wide) making up a device with the given units side by side
+	# returns (start, stop, flipped) for every row of every unit, in the order the device expects its cells
+	def getRoute(self, units: list[Hashable]) -> list[tuple[int, int, bool]]:
+		route: list[tuple[int, int, bool]] = []
+		for row in range(TILE_ROWS):
+			for unit in units:
+				tile = self.tiles[unit]
+				sourceRow = tile.y * TILE_ROWS + (TILE_ROWS - 1 - row if tile.flipped else row)
+				start = sourceRow * self.numCols + tile.x * TILE_COLS
+				route.append((start, start + TILE_COLS, tile.flipped))
+		return route
+
+# cells for a device from the full cells, following a route from TileLayout.getRoute
+def routeCells(cells: bytes, route: list[tuple[int, int, bool]]) -> bytes:
+	return b"".join(cells[start:stop][::-1].translate(ROTATED_CELLS) if flipped else cells[start:stop] for start, stop, flipped in route)
+
+# same as routeCells, but writes into an existing buffer
+def routeCellsInto(out: bytearray, cells: bytes, route: list[tuple[int, int, bool]]):
+	position = 0
+	for start, stop, flipped in route:
+		if flipped:
+			out[position:position + stop - start] = cells[start:stop][::-1].translate(ROTATED_CELLS)
+		else:
+			out[position:position + stop - start] = cells[start:stop]
+		position += stop - start
+
+# every pairing of an arrangement of the left slots with one of the right slots, generated as they are needed
+def arrangeSlots(leftSlots: list[Tile], rightSlots: list[Tile]):
+	for leftArrangement in itertools.permutations(leftSlots):
+		for rightArrangement in itertools.permutations(rightSlots):
+			yield (leftArrangement, rightArrangement)
+
+# all valid layouts for a list of (unit, isRight)
+# single rows and columns are only offered if no grid of at least two rows and two columns fits (so a quartet is always 2x2)
+# units that belong to the same device (sameDevice) are only split across orientations if allowSplitDevices
+def findLayouts(units: list[tuple[Hashable, bool]], sameDevice: dict[Hashable, Hashable] | None = None, allowSplitDevices: bool = True) -> list[TileLayout]:
+	n = len(units)
+	if n == 0:
+		return [TileLayout({})]
+	lefts = [unit for unit, isRight in units if not isRight]
+	rights = [unit for unit, isRight in units if isRight]
+	shapes = [(width, n // width) for width in range(n, 0, -1) if n % width == 0]
+	grids = [(width, height) for width, height in shapes if width > 1 and height > 1]
+	if len(grids) > 0:
+		shapes = grids
+	shapes.sort(key=lambda shape: abs(math.log(shape[0] * TILE_COLS * 2 / (shape[1] * TILE_ROWS * 4) / PREFERRED_ASPECT)))
+	layouts: list[TileLayout] = []
+	for width, height in shapes:
+		# shift by one column if the units don't fit otherwise (such as a single right unit)
+		for xOffset in (0, 1):
+			leftSlots: list[Tile] = []
+			rightSlots: list[Tile] = []
+			# bottom row first, so the first arrangement puts the first units at the bottom left
+			for y in range(height - 1, -1, -1):
+				flipped = tileFlipped(y, height)
+				for x in range(xOffset, width + xOffset):
+					(rightSlots if tileFits(True, x, flipped) else leftSlots).append(Tile(x, y, flipped))
+			if len(leftSlots) != len(lefts) or len(rightSlots) != len(rights):
+				continue
+			for leftArrangement, rightArrangement in itertools.islice(arrangeSlots(leftSlots, rightSlots), MAX_OPTIONS_PER_SHAPE):
+				tiles = dict(zip(lefts, leftArrangement)) | dict(zip(rights, rightArrangement))
+				if not allowSplitDevices and sameDevice is not None:
+					deviceFlipped: dict[Hashable, bool] = {}
+					if any(deviceFlipped.setdefault(sameDevice[unit], tile.flipped) != tile.flipped for unit, tile in tiles.items()):
+						continue
+				layouts.append(TileLayout(tiles))
+			break
+	if len(layouts) == 0:
+		# no grid fits, put everything in a single upright row
+		layouts.append(TileLayout({unit: Tile(x, 0, False) for x, (unit, isRight) in enumerate(units)}))
+	return layouts
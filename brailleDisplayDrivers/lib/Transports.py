@@ -0,0 +1,31 @@
+# a tablet connected through both usb and bluetooth is opened on each transport
+# the transports are linked: the primary is written to and read from, the fallback is kept until the primary fails
+# both transports report every key, so reports of a fallback are ignored rather than matched against the primary's
+# (a copy arriving late or after the primary's next report would otherwise be handled twice)
+class TransportLink():
+	# the same tablet through another transport, used if this one fails
+	fallback: "TransportLink | None" = None
+	# the transport this one is the fallback of (None for the primary)
+	primary: "TransportLink | None" = None
+
+	# whether reports received through this transport are handled
+	def isActiveTransport(self) -> bool:
+		return self.primary is None
+
+	# keep another transport as the fallback of this one
+	def linkFallback(self, fallback: "TransportLink"):
+		self.fallback = fallback
+		self.primary = None
+		fallback.primary = self
+		fallback.fallback = None
+
+	# make the fallback the primary, returns it (None if there is no fallback)
+	# this transport stops being handled, but isn't kept as the fallback of the new primary
+	def swapToFallback(self) -> "TransportLink | None":
+		fallback = self.fallback
+		if fallback is None:
+			return None
+		self.fallback = None
+		self.primary = fallback
+		fallback.primary = None
+		return fallback
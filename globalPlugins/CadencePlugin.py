@@ -1,24 +1,36 @@
+import sys
 import globalPluginHandler
 from logHandler import log
 import braille
-from brailleDisplayDrivers.lib.CadenceDisplayDriverWithImage import CadenceDisplayDriverWithImage
 
-# taken keys: NVDA + inrq81[]m7spu5243adflbtc6k
-# remaining keys: NVDA + eghjovwxyz
+# the current display if it is a Cadence display
+# the driver module is only looked up (not imported), as it can't be in use before NVDA has loaded it
+def getCadenceDisplay():
+	display = braille.handler.display
+	driverModule = sys.modules.get("brailleDisplayDrivers.lib.CadenceDisplayDriverWithImage")
+	if driverModule is not None and isinstance(display, driverModule.CadenceDisplayDriverWithImage):
+		return display
+	return None
+
+# taken keys: NVDA + inrq81[]m7spu5243adflbtc6koweghj
+# remaining keys: NVDA + vxyz
+
+# image mode bookmark of each bookmark key
+bookmarkNames = {"g": "1", "h": "2", "j": "3"}
 
 class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 	def script_doToggleImage(self, gesture):
 		"""Toggle image mode (Cadence)"""
-		display = braille.handler.display
-		if isinstance(display, CadenceDisplayDriverWithImage):
+		display = getCadenceDisplay()
+		if display is not None:
 			display.doToggleImage()			
 		else:
 			log.error("doToggleImage without CadenceDisplayDriver")
 
 	def script_cycleCadenceLayout(self, gesture):
 		"""Cycle Cadence duet layout (wide / tall / other valid forms)"""
-		display = braille.handler.display
-		if isinstance(display, CadenceDisplayDriverWithImage):
+		display = getCadenceDisplay()
+		if display is not None:
 			try:
 				display.cycleDevPositions()
 			except Exception as e:
@@ -26,8 +38,82 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
 		else:
 			log.error("cycleCadenceLayout without CadenceDisplayDriver")
 
+	def script_toggleSplitView(self, gesture):
+		"""Toggle showing image and text at the same time (Cadence)"""
+		display = getCadenceDisplay()
+		if display is not None:
+			display.toggleSplitView()
+		else:
+			log.error("toggleSplitView without CadenceDisplayDriver")
+
+	def script_toggleAutoCrop(self, gesture):
+		"""Toggle fitting image mode to the content of objects (Cadence)"""
+		display = getCadenceDisplay()
+		if display is not None:
+			display.toggleAutoCrop()
+		else:
+			log.error("toggleAutoCrop without CadenceDisplayDriver")
+
+	def script_nextBookmark(self, gesture):
+		"""Jump to the next image mode bookmark (Cadence)"""
+		display = getCadenceDisplay()
+		if display is not None:
+			display.nextBookmark()
+		else:
+			log.error("nextBookmark without CadenceDisplayDriver")
+
+	def script_gotoBookmark(self, gesture):
+		"""Jump to image mode bookmark 1, 2 or 3 (Cadence)"""
+		display = getCadenceDisplay()
+		if display is not None:
+			display.gotoBookmark(bookmarkNames[gesture.mainKeyName])
+		else:
+			log.error("gotoBookmark without CadenceDisplayDriver")
+
+	def script_setBookmark(self, gesture):
+		"""Bookmark the image mode view as 1, 2 or 3 (Cadence)"""
+		display = getCadenceDisplay()
+		if display is not None:
+			display.setBookmark(bookmarkNames[gesture.mainKeyName])
+		else:
+			log.error("setBookmark without CadenceDisplayDriver")
+
+	# image mode caches the location of the navigator object until one of these happens
+	def event_gainFocus(self, obj, nextHandler):
+		display = getCadenceDisplay()
+		if display is not None:
+			display.invalidateNavigatorCache()
+		nextHandler()
+
+	def event_becomeNavigatorObject(self, obj, nextHandler, isFocus=False):
+		display = getCadenceDisplay()
+		if display is not None:
+			display.invalidateNavigatorCache()
+		nextHandler()
+
+	def event_foreground(self, obj, nextHandler):
+		display = getCadenceDisplay()
+		if display is not None:
+			display.invalidateNavigatorCache()
+		nextHandler()
+
+	def event_locationChange(self, obj, nextHandler):
+		display = getCadenceDisplay()
+		if display is not None:
+			display.invalidateNavigatorCache(obj)
+		nextHandler()
+
 	__gestures = {
 		"kb:NVDA+I": "doToggleImage",
 		"br(hidBrailleStandard):space+dot2+dot4": "doToggleImage",
 		"kb:NVDA+shift+I": "cycleCadenceLayout",
+		"kb:NVDA+O": "toggleSplitView",
+		"kb:NVDA+W": "toggleAutoCrop",
+		"kb:NVDA+E": "nextBookmark",
+		"kb:NVDA+G": "gotoBookmark",
+		"kb:NVDA+H": "gotoBookmark",
+		"kb:NVDA+J": "gotoBookmark",
+		"kb:NVDA+shift+G": "setBookmark",
+		"kb:NVDA+shift+H": "setBookmark",
+		"kb:NVDA+shift+J": "setBookmark",
 	}
@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+import unittest
+from brailleDisplayDrivers.lib.DeviceStore import DeviceStore, STORE_VERSION, MAX_SECTION_ENTRIES
+
+class DeviceStoreTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, "store.json")
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def testSaveAndLoad(self):
+		store = DeviceStore(self.path)
+		self.assertIsNone(store.get("layouts", "Cadence-L1"))
+		self.assertTrue(store.set("layouts", "Cadence-L1", {"Left": [0, 0, False]}))
+		# setting the same value again changes nothing, so callers can skip saving
+		self.assertFalse(store.set("layouts", "Cadence-L1", {"Left": [0, 0, False]}))
+		store.save()
+		self.assertFalse(os.path.exists(self.path + ".tmp"))
+		self.assertEqual(DeviceStore(self.path).get("layouts", "Cadence-L1"), {"Left": [0, 0, False]})
+
+	def testRemove(self):
+		store = DeviceStore(self.path)
+		store.set("bluetoothNames", "path", "Cadence-R1")
+		self.assertTrue(store.remove("bluetoothNames", "path"))
+		self.assertFalse(store.remove("bluetoothNames", "path"))
+		self.assertFalse(store.remove("unknown", "path"))
+
+	def testOldestEntriesAreDropped(self):
+		store = DeviceStore(self.path)
+		for i in range(MAX_SECTION_ENTRIES + 2):
+			store.set("layouts", str(i), i)
+		# setting an entry again makes it the newest
+		store.set("layouts", "2", -2)
+		store.set("layouts", "extra", 0)
+		self.assertIsNone(store.get("layouts", "0"))
+		self.assertIsNone(store.get("layouts", "1"))
+		self.assertIsNone(store.get("layouts", "3"))
+		self.assertEqual(store.get("layouts", "2"), -2)
+		self.assertEqual(len(store.sections["layouts"]), MAX_SECTION_ENTRIES)
+
+	def testInvalidSectionsAreIgnored(self):
+		with open(self.path, "w", encoding="utf-8") as f:
+			json.dump({"version": STORE_VERSION, "sections": {"layouts": {"key": 1}, "broken": []}}, f)
+		store = DeviceStore(self.path)
+		self.assertEqual(store.get("layouts", "key"), 1)
+		self.assertNotIn("broken", store.sections)
+
+if __name__ == "__main__":
+	unittest.main()
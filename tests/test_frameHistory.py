@@ -0,0 +1,47 @@
+import unittest
+from brailleDisplayDrivers.lib.FrameHistory import FrameHistory, frameHeaderStruct
+
+VIEW = (1.0, 2.0, 3.0, 4.0)
+
+class FrameHistoryTest(unittest.TestCase):
+	def testRecord(self):
+		history = FrameHistory()
+		self.assertIsNone(history.latest())
+		self.assertTrue(history.record(b"\1\2", 2, 1, VIEW))
+		# the same cells as the newest frame aren't recorded again
+		self.assertFalse(history.record(b"\1\2", 2, 1, VIEW))
+		latest = history.latest()
+		self.assertEqual((latest.seq, latest.cells, latest.numCols, latest.numRows), (0, b"\1\2", 2, 1))
+		self.assertEqual((latest.centerX, latest.centerY, latest.zoomX, latest.zoomY), VIEW)
+
+	def testOldestFramesAreDropped(self):
+		frameSize = frameHeaderStruct.size + 4
+		history = FrameHistory(frameSize * 3)
+		for i in range(5):
+			history.record(bytes([i]) * 4, 2, 2, VIEW)
+		self.assertEqual(len(history), 3)
+		self.assertEqual(history.numBytes, frameSize * 3)
+		self.assertIsNone(history.before(2, 2, 2))
+		self.assertEqual(history.before(3, 2, 2).cells, b"\2" * 4)
+
+	def testNewestFrameIsKeptOverTheCap(self):
+		history = FrameHistory(1)
+		history.record(b"\1" * 8, 4, 2, VIEW)
+		history.record(b"\2" * 8, 4, 2, VIEW)
+		self.assertEqual(len(history), 1)
+		self.assertEqual(history.latest().cells, b"\2" * 8)
+
+	def testStepSkipsOtherSizes(self):
+		history = FrameHistory()
+		history.record(b"\1" * 4, 2, 2, VIEW)
+		history.record(b"\2" * 8, 4, 2, VIEW)
+		history.record(b"\3" * 4, 2, 2, VIEW)
+		self.assertEqual(history.before(2, 2, 2).seq, 0)
+		self.assertEqual(history.after(0, 2, 2).seq, 2)
+		self.assertEqual(history.before(2, 4, 2).seq, 1)
+		self.assertIsNone(history.after(2, 2, 2))
+		history.clear()
+		self.assertEqual((len(history), history.numBytes), (0, 0))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+from brailleDisplayDrivers.lib.InputTrace import InputTraceRecorder, readInputTrace, replayInputTrace, headerStruct, TRACE_MAGIC
+
+# records reports and gestures like MainCadenceDisplayDriver, without devices (every report with a key down is a gesture)
+class TraceDriver():
+	def __init__(self):
+		self.devices = [None, None]
+		self.inputTraceRecorder = None
+		self.layout = b"layout"
+		self.reports: list[tuple[bytes, int]] = []
+
+	def getLayoutSignature(self) -> bytes:
+		return self.layout
+
+	def _hidOnReceive(self, data: bytes, devIndex: int):
+		self.reports.append((data, devIndex))
+		gesture = type("Gesture", (), {"id": data.hex()}) if any(data) else None
+		self.handleKeys([], [], gesture)
+
+	def handleKeys(self, liveKeys, composedKeys, gesture):
+		pass
+
+class InputTraceTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, "input.trace")
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def record(self, reports: list[tuple[bytes, int, bytes]]):
+		recorder = InputTraceRecorder(self.path)
+		for data, devIndex, layout in reports:
+			recorder.record(data, devIndex, layout)
+		recorder.close()
+		# closed recorders ignore late reports
+		recorder.record(b"\1", 0, b"layout")
+		self.assertEqual(recorder.numReports, len(reports))
+
+	def testRoundTrip(self):
+		reports = [(b"\1\0\0\0\0", 0, b"one"), (b"\0\0\0\0\0", 0, b"one"), (b"\0\2\0\0\0\0\0", 1, b"two")]
+		self.record(reports)
+		records = readInputTrace(self.path)
+		# layouts are only written when they change
+		self.assertEqual([record.layout for record in records if not record.isReport()], [b"one", b"two"])
+		self.assertEqual([(record.data, record.devIndex) for record in records if record.isReport()], [(data, devIndex) for data, devIndex, layout in reports])
+		times = [record.time for record in records]
+		self.assertEqual(times, sorted(times))
+
+	def testNotATrace(self):
+		with open(self.path, "wb") as f:
+			f.write(b"nope!")
+		with self.assertRaises(ValueError):
+			readInputTrace(self.path)
+		with open(self.path, "wb") as f:
+			f.write(headerStruct.pack(TRACE_MAGIC, 1) + b"\x09\0\0\0\0")
+		with self.assertRaises(ValueError):
+			readInputTrace(self.path)
+
+	def testReplay(self):
+		self.record([(b"\1", 0, b"layout"), (b"\0", 0, b"layout"), (b"\4", 5, b"other"), (b"\2", 1, b"other")])
+		driver = TraceDriver()
+		result = replayInputTrace(driver, self.path)
+		self.assertEqual(driver.reports, [(b"\1", 0), (b"\0", 0), (b"\2", 1)])
+		self.assertEqual([gestureId for time, gestureId in result.gestures], ["01", "02"])
+		self.assertEqual(result.skippedReports, 1)
+		self.assertEqual(result.layoutMismatches, 1)
+		self.assertEqual(len(result.decodeTimes), 3)
+		# the driver's own key handling is back, and nothing was left on the instance
+		self.assertNotIn("handleKeys", driver.__dict__)
+		self.assertIsNone(driver.inputTraceRecorder)
+
+	def testReplayKeepsInstanceHandleKeys(self):
+		self.record([(b"\1", 0, b"layout")])
+		driver = TraceDriver()
+		handled = []
+		driver.handleKeys = lambda liveKeys, composedKeys, gesture: handled.append(gesture)
+		handleKeys = driver.handleKeys
+		result = replayInputTrace(driver, self.path, dispatch=True)
+		self.assertEqual(len(result.gestures), 1)
+		self.assertEqual(len(handled), 1)
+		self.assertIs(driver.handleKeys, handleKeys)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+import unittest
+
+# end to end recording of an input trace and a frame recording on a driver with stand-in tablets
+# the driver needs NVDA's modules, run it from the NVDA Python console with the add-on installed:
+#   import unittest, sys; sys.path.append(r"<add-on source>\tests"); unittest.main(module="test_recording", exit=False)
+try:
+	from brailleDisplayDrivers.lib.MainCadenceDisplayDriver import MiniKey, DevSide
+	from brailleDisplayDrivers.lib.InputTrace import readInputTrace, replayInputTrace
+	from brailleDisplayDrivers.lib.FrameRecorder import readFrames
+	from brailleDisplayDrivers.lib.Soak import SoakDisplayDriver
+except ImportError as e:
+	raise unittest.SkipTest(f"needs NVDA: {e}")
+
+# how long to wait for the frame writer thread
+WRITE_TIMEOUT = 2
+
+class RecordingTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.driver = SoakDisplayDriver(4)
+		# key handling is not under test, gestures are only collected
+		self.gestures = []
+		self.driver.handleKeys = lambda liveKeys, composedKeys, gesture: self.gestures.append(gesture) if gesture is not None else None
+
+	def tearDown(self):
+		self.driver.terminate()
+		self.directory.cleanup()
+
+	def path(self, name: str) -> str:
+		return os.path.join(self.directory.name, name)
+
+	def waitForFrames(self, numFrames: int):
+		deadline = time.perf_counter() + WRITE_TIMEOUT
+		while self.driver.frameRecorder.numFrames < numFrames:
+			self.assertLess(time.perf_counter(), deadline, "frames were not written")
+			time.sleep(0.01)
+
+	def testInputTrace(self):
+		path = self.path("input.trace")
+		self.driver.startInputTrace(path)
+		down = self.driver.buildKeyReport(0, [(MiniKey.DPadCenter, DevSide.Left)])
+		up = self.driver.buildKeyReport(0, [])
+		self.driver._hidOnReceive(down, 0)
+		self.driver._hidOnReceive(up, 0)
+		self.driver.stopInputTrace()
+		self.assertEqual(len(self.gestures), 1)
+
+		records = readInputTrace(path)
+		self.assertEqual([record.layout for record in records if not record.isReport()], [self.driver.getLayoutSignature()])
+		self.assertEqual([(record.devIndex, record.data) for record in records if record.isReport()], [(0, down), (0, up)])
+
+		self.gestures.clear()
+		result = replayInputTrace(self.driver, path)
+		self.assertEqual(result.layoutMismatches, 0)
+		self.assertEqual(len(result.gestures), 1)
+
+	def testFrameRecording(self):
+		path = self.path("frames.rec")
+		self.driver.startFrameRecording(path)
+		numCols = self.driver.numCols
+		numCells = self.driver.numRows * numCols
+		self.driver.display([0xFF] * numCols + [0] * (numCells - numCols))
+		self.waitForFrames(1)
+		self.driver.display([0] * numCells)
+		self.waitForFrames(2)
+		self.driver.stopFrameRecording()
+
+		frames = readFrames(path)
+		self.assertEqual(len(frames), 2)
+		for frame in frames:
+			self.assertEqual(frame.source, "text")
+			self.assertEqual(frame.layout, self.driver.getLayoutSignature())
+		# the first row of the screen is raised, then lowered again (flipped tablets show it rotated, which keeps full cells full)
+		self.assertEqual(sum(cells.count(0xFF) for cells in frames[0].devCells), numCols)
+		self.assertEqual(sum(cells.count(0xFF) for cells in frames[1].devCells), 0)
+		self.assertEqual(frames[1].changedCells, numCols)
+		self.assertEqual(frames[1].devCells, [bytes(device.lastCells) if device.lastCells is not None else bytes(device.numCells) for device in self.driver.devices])
+
+if __name__ == "__main__":
+	unittest.main()
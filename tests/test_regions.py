@@ -0,0 +1,71 @@
+import unittest
+from brailleDisplayDrivers.lib.Regions import Region, Frame, changedSpan, splitRegions, findRegionDevices, findSpanDevices
+from brailleDisplayDrivers.lib.TileLayout import TileLayout, Tile, TILE_COLS, TILE_ROWS
+
+# a quartet: two tile rows of two tiles
+QUARTET = TileLayout({"a": Tile(0, 1, False), "b": Tile(1, 1, False), "c": Tile(0, 0, True), "d": Tile(1, 0, True)})
+
+class RegionTest(unittest.TestCase):
+	def testUpdateTracksChangedSpan(self):
+		region = Region("text", 0, 1, TILE_COLS * 2)
+		self.assertTrue(region.update(bytes(region.numCells)))
+		self.assertEqual((region.dirtyStart, region.dirtyStop), (0, region.numCells))
+		region.dirty = False
+		cells = bytearray(region.numCells)
+		cells[5] = 1
+		self.assertTrue(region.update(bytes(cells)))
+		self.assertEqual((region.dirtyStart, region.dirtyStop), (5, 6))
+		# unchanged cells aren't written again
+		self.assertFalse(region.update(bytes(cells)))
+
+	def testDirtySpansMerge(self):
+		region = Region("text", 0, 1, TILE_COLS)
+		region.update(bytes(region.numCells))
+		region.dirty = False
+		cells = bytearray(region.numCells)
+		cells[2] = 1
+		region.update(bytes(cells))
+		cells[9] = 1
+		region.update(bytes(cells))
+		self.assertEqual((region.dirtyStart, region.dirtyStop), (2, 10))
+
+	def testCellsOfAnotherSizeAreRejected(self):
+		# frames built for another layout are dropped before they get here, they are never cut or padded to fit
+		region = Region("image", 0, 1, TILE_COLS)
+		for numCells in (region.numCells - 1, region.numCells + 1, 0):
+			with self.assertRaises(ValueError):
+				region.update(bytes(numCells))
+		self.assertIsNone(region.cells)
+
+	def testFramesAreImmutable(self):
+		frame = Frame("text", 3, bytes(4), ())
+		with self.assertRaises(AttributeError):
+			frame.cells = bytes(8)
+
+	def testChangedSpan(self):
+		self.assertEqual(changedSpan(b"\0\0\0\0", b"\0\1\0\0"), (1, 2))
+		self.assertEqual(changedSpan(b"\1\0\0\1", b"\0\0\0\0"), (0, 4))
+
+class SplitRegionsTest(unittest.TestCase):
+	def testSplit(self):
+		regions = splitRegions(QUARTET, ["image", "text"], {"image": 0.1})
+		self.assertEqual([(region.source, region.top, region.height) for region in regions], [("image", 0, 1), ("text", 1, 1)])
+		self.assertEqual(regions[0].minInterval, 0.1)
+		self.assertEqual(regions[1].start, TILE_ROWS * QUARTET.numCols)
+		self.assertEqual(regions[1].stop, QUARTET.numRows * QUARTET.numCols)
+
+	def testSourcesWithoutRowsAreLeftOut(self):
+		duet = TileLayout({"a": Tile(0, 0, False), "b": Tile(1, 0, False)})
+		self.assertEqual([region.source for region in splitRegions(duet, ["image", "text"])], ["image"])
+
+	def testRegionDevices(self):
+		routes = [QUARTET.getRoute(["a", "b"]), QUARTET.getRoute(["c", "d"])]
+		image, text = splitRegions(QUARTET, ["image", "text"])
+		self.assertEqual(findRegionDevices(image, routes), [1])
+		self.assertEqual(findRegionDevices(text, routes), [0])
+		# a change in the left half of the top row only touches the device showing it
+		self.assertEqual(findSpanDevices([0, 1], routes, 0, 1), [1])
+		self.assertEqual(findSpanDevices([0, 1], routes, 0, QUARTET.numRows * QUARTET.numCols), [0, 1])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,92 @@
+import mmap
+import unittest
+from unittest import mock
+from brailleDisplayDrivers.lib import SharedFramebuffer
+from brailleDisplayDrivers.lib.SharedFramebuffer import FramebufferProducer, MAX_READ_ATTEMPTS
+
+realMmap = mmap.mmap
+
+# both ends in one process: named mappings are shared by name, events are left out (they only wake up the other end)
+class FramebufferTest(unittest.TestCase):
+	def setUp(self):
+		mappings: dict[str, mmap.mmap] = {}
+		def namedMmap(fileno, length, tagname):
+			if tagname not in mappings:
+				mappings[tagname] = realMmap(fileno, length)
+			return mappings[tagname]
+		for patch in (
+			mock.patch.object(SharedFramebuffer.mmap, "mmap", namedMmap),
+			mock.patch.object(SharedFramebuffer, "openEvent", lambda name: 0),
+			mock.patch.object(SharedFramebuffer, "setEvent", lambda handle: None),
+			mock.patch.object(SharedFramebuffer, "closeEvent", lambda handle: None),
+		):
+			patch.start()
+			self.addCleanup(patch.stop)
+		self.driver = SharedFramebuffer.SharedFramebuffer("test")
+		self.driver.setSize(4, 4)
+		self.producer = FramebufferProducer("test")
+
+	def testPublishedFrameIsShownOnce(self):
+		self.assertIsNone(self.driver.readCells())
+		self.producer.setDots(b"\1" * 16)
+		self.producer.publish()
+		self.assertFalse(self.producer.isShown())
+		self.assertEqual(self.driver.readCells(), b"\xff\xff")
+		self.assertTrue(self.producer.isShown())
+		self.assertIsNone(self.driver.readCells())
+		self.assertEqual(self.driver.readCells(force=True), b"\xff\xff")
+
+	def testFrameBeingDrawnIsNotShown(self):
+		self.producer.setDots(b"\1" * 16)
+		self.producer.publish()
+		# the next frame is half drawn, the published one can't be read from the same dots any more
+		self.producer.setDot(0, 0, False)
+		self.assertIsNone(self.driver.readCells(force=True))
+		self.producer.publish()
+		self.assertEqual(self.driver.readCells(), b"\xfe\xff")
+
+	def testDrawingDuringPackingIsRetried(self):
+		self.producer.setDots(b"\1" * 16)
+		self.producer.publish()
+		realDotsToCells = SharedFramebuffer.dotsToCells
+		calls = []
+		# the producer draws and publishes the next frame while the first attempt packs
+		def drawWhilePacking(*args):
+			cells = realDotsToCells(*args)
+			if len(calls) == 0:
+				self.producer.setDots(b"\0" * 16)
+				self.producer.publish()
+			calls.append(cells)
+			return cells
+		with mock.patch.object(SharedFramebuffer, "dotsToCells", drawWhilePacking):
+			self.assertEqual(self.driver.readCells(), b"\0\0")
+		self.assertEqual(len(calls), 2)
+		self.assertTrue(self.producer.isShown())
+
+	def testDrawingThroughEveryAttemptShowsNothing(self):
+		self.producer.setDots(b"\1" * 16)
+		self.producer.publish()
+		realDotsToCells = SharedFramebuffer.dotsToCells
+		calls = []
+		def drawWhilePacking(*args):
+			calls.append(args)
+			self.producer.setDots(b"\1" * 16)
+			self.producer.publish()
+			return realDotsToCells(*args)
+		with mock.patch.object(SharedFramebuffer, "dotsToCells", drawWhilePacking):
+			self.assertIsNone(self.driver.readCells())
+		self.assertEqual(len(calls), MAX_READ_ATTEMPTS)
+
+	def testFrameForAnotherLayoutIsDropped(self):
+		self.producer.setDots(b"\1" * 16)
+		self.driver.setSize(2, 4)
+		self.producer.publish()
+		self.assertIsNone(self.driver.readCells(force=True))
+		with self.assertRaises(ValueError):
+			self.producer.setDots(b"\1" * 16)
+		self.producer.setDots(b"\1" * 8)
+		self.producer.publish()
+		self.assertEqual(self.driver.readCells(), b"\xff")
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from brailleDisplayDrivers.lib.Stabilizer import DotStabilizer
+
+THRESHOLD = 128
+
+class DotStabilizerTest(unittest.TestCase):
+	# the stable state of a single dot over a series of values
+	def decideAll(self, stabilizer: DotStabilizer, values: list[float], key: tuple = ("view",)) -> list[bool]:
+		states = []
+		for value in values:
+			stabilizer.begin(key, 1)
+			states.append(stabilizer.decide(0, value, THRESHOLD, value > THRESHOLD))
+		return states
+
+	def testOffByDefault(self):
+		stabilizer = DotStabilizer()
+		self.assertFalse(stabilizer.isActive())
+		self.assertTrue(DotStabilizer(2).isActive())
+		self.assertTrue(DotStabilizer(0, 2).isActive())
+
+	def testDeadBand(self):
+		stabilizer = DotStabilizer(deadBand=5)
+		# changes within the dead band keep the dot, changes past it flip it at once
+		self.assertEqual(self.decideAll(stabilizer, [140, 126, 130, 120, 131, 135]), [True, True, True, False, False, True])
+
+	def testMinFrames(self):
+		stabilizer = DotStabilizer(minFrames=3)
+		# a dot only flips once its new state was seen in 3 consecutive frames
+		self.assertEqual(self.decideAll(stabilizer, [200, 0, 0, 200, 0, 0, 0, 0]), [True, True, True, True, True, True, False, False])
+
+	def testNewViewStartsOver(self):
+		stabilizer = DotStabilizer(deadBand=50, minFrames=4)
+		self.assertEqual(self.decideAll(stabilizer, [200, 100]), [True, True])
+		self.assertEqual(self.decideAll(stabilizer, [100], ("other view",)), [False])
+
+if __name__ == "__main__":
+	unittest.main()
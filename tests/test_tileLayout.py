@@ -0,0 +1,92 @@
+import time
+import unittest
+from brailleDisplayDrivers.lib.DotImage import ROTATED_CELLS
+from brailleDisplayDrivers.lib.TileLayout import TileLayout, Tile, findLayouts, routeCells, routeCellsInto, tileFits, MAX_OPTIONS_PER_SHAPE, TILE_COLS, TILE_ROWS
+
+# a left and a right half of every tablet, like findDeviceMatches sees them
+def makeUnits(numTablets: int) -> list[tuple[tuple[str, bool], bool]]:
+	return [((f"tablet{i // 2}", i % 2 == 1), i % 2 == 1) for i in range(numTablets * 2)]
+
+class FindLayoutsTest(unittest.TestCase):
+	def assertValid(self, layout: TileLayout, units: list):
+		self.assertEqual(set(layout.tiles), {unit for unit, isRight in units})
+		self.assertEqual(len(set((tile.x, tile.y) for tile in layout.tiles.values())), len(units), "units share a tile")
+		for unit, isRight in units:
+			tile = layout.tiles[unit]
+			self.assertTrue(tileFits(isRight, tile.x, tile.flipped), f"{unit} doesn't fit at {tile}")
+
+	def testNoUnits(self):
+		self.assertEqual(findLayouts([]), [TileLayout({})])
+
+	def testSingleUnit(self):
+		for isRight in (False, True):
+			layouts = findLayouts([("unit", isRight)])
+			self.assertEqual(layouts, [TileLayout({"unit": Tile(0, 0, False)})])
+
+	def testDuetIsWideFirst(self):
+		units = makeUnits(1)
+		layouts = findLayouts(units)
+		# side by side, then stacked with the right half rotated on top
+		self.assertEqual([(layout.widthTiles, layout.heightTiles) for layout in layouts], [(2, 1), (1, 2)])
+		for layout in layouts:
+			self.assertValid(layout, units)
+
+	def testQuartetIsAlways2x2(self):
+		units = makeUnits(2)
+		layouts = findLayouts(units)
+		self.assertEqual(len(layouts), 4)
+		self.assertEqual(len(set(layouts)), len(layouts))
+		for layout in layouts:
+			self.assertEqual((layout.widthTiles, layout.heightTiles), (2, 2))
+			self.assertValid(layout, units)
+			# the top row is rotated to face the bottom row
+			self.assertEqual({tile.flipped for tile in layout.tiles.values() if tile.y == 0}, {True})
+
+	def testUnsplitDevices(self):
+		units = makeUnits(2)
+		sameDevice = {unit: unit[0] for unit, isRight in units}
+		for layout in findLayouts(units, sameDevice, allowSplitDevices=False):
+			for device in ("tablet0", "tablet1"):
+				self.assertEqual(len({tile.flipped for unit, tile in layout.tiles.items() if unit[0] == device}), 1)
+
+	def testManyUnitsAreCapped(self):
+		units = makeUnits(10)
+		start = time.perf_counter()
+		layouts = findLayouts(units)
+		self.assertLess(time.perf_counter() - start, 2)
+		shapes = {(layout.widthTiles, layout.heightTiles) for layout in layouts}
+		self.assertLessEqual(len(layouts), len(shapes) * MAX_OPTIONS_PER_SHAPE)
+		for layout in layouts:
+			self.assertValid(layout, units)
+
+class RouteTest(unittest.TestCase):
+	def testRoute(self):
+		layout = TileLayout({"left": Tile(0, 0, False), "right": Tile(1, 0, False), "top": Tile(0, 1, True)})
+		cells = bytes(range(layout.numRows * layout.numCols))
+		route = layout.getRoute(["left", "right"])
+		self.assertEqual(len(route), TILE_ROWS * 2)
+		self.assertEqual(route[0], (0, TILE_COLS, False))
+		self.assertEqual(route[1], (TILE_COLS, TILE_COLS * 2, False))
+		# a flipped unit takes its rows bottom to top, each reversed with rotated cells
+		flippedRoute = layout.getRoute(["top"])
+		lastRow = (TILE_ROWS * 2 - 1) * layout.numCols
+		self.assertEqual(flippedRoute[0], (lastRow, lastRow + TILE_COLS, True))
+		self.assertEqual(routeCells(cells, flippedRoute)[:TILE_COLS], cells[lastRow:lastRow + TILE_COLS][::-1].translate(ROTATED_CELLS))
+
+	def testRouteInto(self):
+		layout = TileLayout({"left": Tile(0, 0, True), "right": Tile(1, 0, False)})
+		cells = bytes(range(layout.numRows * layout.numCols))
+		route = layout.getRoute(["left", "right"])
+		out = bytearray(TILE_ROWS * TILE_COLS * 2)
+		routeCellsInto(out, cells, route)
+		self.assertEqual(bytes(out), routeCells(cells, route))
+
+	def testRotatedCells(self):
+		# rotating twice gives the original cell, a full cell stays full
+		self.assertEqual(bytes(range(256)).translate(ROTATED_CELLS).translate(ROTATED_CELLS), bytes(range(256)))
+		self.assertEqual(ROTATED_CELLS[0xFF], 0xFF)
+		# dot 1 (top left) becomes dot 8 (bottom right)
+		self.assertEqual(ROTATED_CELLS[0x01], 0x80)
+
+if __name__ == "__main__":
+	unittest.main()
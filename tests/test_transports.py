@@ -0,0 +1,63 @@
+import unittest
+from brailleDisplayDrivers.lib.Transports import TransportLink
+
+# a transport handing its reports on like CadenceDeviceDriver._hidOnReceive
+class Transport(TransportLink):
+	def __init__(self, name: str, handled: list[tuple[str, bytes]]):
+		self.name = name
+		self.handled = handled
+
+	def receive(self, data: bytes):
+		if not self.isActiveTransport():
+			return
+		self.handled.append((self.name, data))
+
+KEY_DOWN = b"\1\0\0\0\0"
+KEY_UP = b"\0\0\0\0\0"
+
+class TransportLinkTest(unittest.TestCase):
+	def setUp(self):
+		self.handled: list[tuple[str, bytes]] = []
+		self.usb = Transport("usb", self.handled)
+		self.bluetooth = Transport("bluetooth", self.handled)
+		self.usb.linkFallback(self.bluetooth)
+
+	def testLink(self):
+		self.assertIs(self.usb.fallback, self.bluetooth)
+		self.assertIs(self.bluetooth.primary, self.usb)
+		self.assertTrue(self.usb.isActiveTransport())
+		self.assertFalse(self.bluetooth.isActiveTransport())
+
+	def testLateCopiesOfTheFallbackAreIgnored(self):
+		# a quick tap arrives through usb, then bluetooth delivers its copies late
+		self.usb.receive(KEY_DOWN)
+		self.usb.receive(KEY_UP)
+		self.bluetooth.receive(KEY_DOWN)
+		self.bluetooth.receive(KEY_UP)
+		self.assertEqual(self.handled, [("usb", KEY_DOWN), ("usb", KEY_UP)])
+
+	def testRepeatedReportsOfThePrimaryAreHandled(self):
+		# the same report twice from the primary is a real second press, not a copy
+		for data in (KEY_DOWN, KEY_UP, KEY_DOWN, KEY_UP):
+			self.usb.receive(data)
+		self.assertEqual(len(self.handled), 4)
+
+	def testSwapToFallback(self):
+		self.assertIs(self.usb.swapToFallback(), self.bluetooth)
+		self.assertIsNone(self.usb.fallback)
+		self.assertIsNone(self.bluetooth.fallback)
+		self.assertTrue(self.bluetooth.isActiveTransport())
+		# the failed transport is no longer handled, even before it is closed
+		self.usb.receive(KEY_DOWN)
+		self.bluetooth.receive(KEY_DOWN)
+		self.assertEqual(self.handled, [("bluetooth", KEY_DOWN)])
+		self.assertIsNone(self.bluetooth.swapToFallback())
+
+	def testFailedPrimaryKeptAsFallback(self):
+		self.usb.swapToFallback()
+		self.bluetooth.linkFallback(self.usb)
+		self.assertIs(self.bluetooth.fallback, self.usb)
+		self.assertFalse(self.usb.isActiveTransport())
+
+if __name__ == "__main__":
+	unittest.main()